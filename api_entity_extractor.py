@@ -46,6 +46,21 @@ def resolve_reference(ref, spec):
     return None
 
 
+def spec_field_type(definition):
+    """
+    Type of a property definition, refined by its format for dates ("string" + "date-time" -> "date-time").
+
+    Args:
+        definition (dict): Property (or referenced) definition.
+
+    Returns:
+        str: The type to store with the field.
+    """
+    if definition.get("format") in ("date", "date-time"):
+        return definition["format"]
+    return definition.get("type")
+
+
 def extract_entities_from_spec(spec):
     """
     Extract entities from OpenAPI/Swagger specifications.
@@ -85,16 +100,18 @@ def extract_entities_from_spec(spec):
                         fields.append({
                             "name": prop_name,
                             "description": ref_definition.get("description", ""),
-                            "type": ref_type,
-                            "enum": ref_definition.get("enum")
+                            "type": spec_field_type(ref_definition),
+                            "enum": ref_definition.get("enum"),
+                            "nullable": ref_definition.get("nullable")
                         })
             elif prop_type in ["string", "number", "boolean", "integer"] or "enum" in prop_info:
                 has_primitive = True
                 fields.append({
                     "name": prop_name,
                     "description": prop_info.get("description", ""),
-                    "type": prop_type or "enum",
-                    "enum": prop_info.get("enum")
+                    "type": spec_field_type(prop_info) or "enum",
+                    "enum": prop_info.get("enum"),
+                    "nullable": prop_info.get("nullable")
                 })
 
         if has_primitive:
@@ -217,7 +234,9 @@ if __name__ == "__main__":
     schema_name = sys.argv[2]
     schema_description = sys.argv[3]
 
-    from main import app
+    from app.factory import create_app
+
+    app = create_app()
 
     with app.app_context():
         process_sources(input_file, schema_name, schema_description)
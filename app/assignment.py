@@ -0,0 +1,248 @@
+"""
+One-to-one (or capacity-constrained) assignment of source fields to target fields.
+
+`match_fields` ranks targets independently per source field, so several source fields can share their best target.
+Assignment mode scores every source field against every target field at once and picks a global assignment, either
+optimally with the Hungarian algorithm (`scipy.optimize.linear_sum_assignment`) or with a greedy approximation that
+only looks at each source field's best candidates. Large inputs use a sparse top-k score matrix from the regular
+search instead of the full matrix.
+"""
+import numpy as np
+
+from app.match import _match_entry, get_model_config, load_entity_embeddings, match_fields
+from app.metrics import timed
+from app.reduction import get_projection
+from app.type_compat import compatibility_mask
+
+ASSIGNMENT_METHODS = ("auto", "hungarian", "greedy")
+
+# Largest source x target x capacity matrix that is scored densely and solved with the Hungarian algorithm.
+DENSE_LIMIT = 4_000_000
+
+# Candidates per source field considered by the greedy solver and kept in sparse score matrices.
+CANDIDATES = 32
+
+
+def _hungarian_solver():
+    """`scipy.optimize.linear_sum_assignment`, imported on first use, or None when scipy is not installed."""
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:  # scipy is optional; assignment falls back to the greedy solver
+        return None
+    return linear_sum_assignment
+
+
+def dense_score_matrix(queries, targets):
+    """
+    Score every query against every target in one vectorized pass.
+
+    Returns:
+        np.ndarray: (len(queries), len(targets)) float32 matrix of 1 - squared L2 distance, the same scores as the
+                    FAISS search in `match_fields`.
+    """
+    queries = np.asarray(queries, dtype="float32")
+    targets = np.asarray(targets, dtype="float32")
+    squared_distances = ((queries * queries).sum(axis=1)[:, None] + (targets * targets).sum(axis=1)[None, :]
+                         - 2.0 * queries @ targets.T)
+    return 1.0 - np.maximum(squared_distances, 0.0)
+
+
+def _top_candidates(scores, count):
+    """Column indices of the `count` best scores of every row, best first."""
+    count = min(count, scores.shape[1])
+    top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _greedy(rows, cols, values, capacity):
+    """
+    Pick (row, col, value) candidates best value first while the row is free and the column has capacity.
+
+    Returns:
+        list: Positions of the picked candidates.
+    """
+    assigned_rows = set()
+    used = {}
+    picked = []
+    for position in np.argsort(-np.asarray(values), kind="stable"):
+        row, col = rows[position], cols[position]
+        if row in assigned_rows or used.get(col, 0) >= capacity:
+            continue
+        assigned_rows.add(row)
+        used[col] = used.get(col, 0) + 1
+        picked.append(int(position))
+    return picked
+
+
+def solve_assignment(scores, capacity=1, method="auto", candidates=CANDIDATES):
+    """
+    Assign rows (source fields) to columns (target fields), each column taking at most `capacity` rows.
+
+    Args:
+        scores (np.ndarray): Dense (rows x cols) score matrix; `-inf` marks pairs that must not be assigned.
+        capacity (int): Maximum number of rows per column.
+        method (str): "hungarian" (optimal, needs scipy), "greedy" (best pairs first among each row's top
+            `candidates` columns) or "auto" (Hungarian when scipy is installed and the matrix is below `DENSE_LIMIT`).
+        candidates (int): Columns per row considered by the greedy solver.
+
+    Returns:
+        list: (row, col) pairs; rows that could not be assigned are omitted.
+    """
+    if method not in ASSIGNMENT_METHODS:
+        raise ValueError(f"Unknown assignment method: {method}")
+    if capacity < 1:
+        raise ValueError("capacity must be at least 1.")
+    scores = np.asarray(scores, dtype="float32")
+    if not scores.size:
+        return []
+
+    linear_sum_assignment = _hungarian_solver() if method != "greedy" else None
+    if method == "auto":
+        dense = linear_sum_assignment is not None and scores.size * capacity <= DENSE_LIMIT
+        method = "hungarian" if dense else "greedy"
+
+    if method == "hungarian":
+        if linear_sum_assignment is None:
+            raise ValueError("The hungarian assignment method requires scipy.")
+        # Each column is repeated `capacity` times so that it can take that many rows.
+        expanded = np.repeat(scores, capacity, axis=1)
+        finite = np.isfinite(expanded)
+        floor = expanded[finite].min() - 1.0 if finite.any() else 0.0
+        row_indices, col_indices = linear_sum_assignment(np.where(finite, expanded, floor), maximize=True)
+        return [(int(row), int(col) // capacity) for row, col in zip(row_indices, col_indices)
+                if finite[row, col]]
+
+    top = _top_candidates(scores, candidates)
+    rows = np.repeat(np.arange(scores.shape[0]), top.shape[1])
+    cols = top.ravel()
+    values = scores[rows, cols]
+    keep = np.isfinite(values)
+    rows, cols = rows[keep], cols[keep]
+    return [(int(rows[position]), int(cols[position])) for position in _greedy(rows, cols, values[keep], capacity)]
+
+
+def _apply_assignment(source_names, alternatives, assigned, min_score, k):
+    """Put each source field's assigned target first (flagged "assigned") followed by its other alternatives."""
+    field_mappings = {}
+    for source_name in source_names:
+        matches = alternatives.get(source_name, [])
+        assigned_match = assigned.get(source_name)
+        if assigned_match is not None and min_score is not None and assigned_match["score"] < min_score:
+            assigned_match = None
+        others = [match for match in matches
+                  if assigned_match is None or match["target_field_id"] != assigned_match["target_field_id"]]
+        if assigned_match is None:
+            field_mappings[source_name] = others[:k]
+        else:
+            field_mappings[source_name] = [{**assigned_match, "assigned": True}] + others[:k - 1]
+    return field_mappings
+
+
+def assign_fields(source_entity, target_entities, model_name, k=5, capacity=1, method="auto", min_score=None,
+                  type_filter=True, **match_options):
+    """
+    Match fields and pick a one-to-one (or capacity-constrained) assignment.
+
+    Small inputs without extra match options are scored densely (every source field against every target field, in
+    the model's reduced space if it has a projection, like `match_fields`); otherwise the candidates come from
+    `match_fields` with `CANDIDATES` results per source field and are assigned greedily, so entities with thousands of
+    fields never materialize the full matrix. The Hungarian method needs the dense path and is refused otherwise.
+
+    Args:
+        source_entity (dict): Source entity.
+        target_entities (list): Entities to map to.
+        model_name (str): Name of model to use.
+        k (int): Number of ranked alternatives returned per source field.
+        capacity (int): Maximum number of source fields assigned to one target field.
+        method (str): See `solve_assignment`; "hungarian" raises ValueError when the input is too large to score
+            densely or extra match options are given.
+        min_score (float): Leave source fields unassigned when their assigned score is below this value.
+        type_filter (bool): Never pair fields with incompatible types (see `app.type_compat`).
+        **match_options: Passed on to `match_fields` (e.g. hybrid=True); forces the sparse path.
+
+    Returns:
+        dict: Field mappings as returned by `match_fields`, where the assigned target (if any) comes first and has
+              `"assigned": True`.
+    """
+    if method not in ASSIGNMENT_METHODS:
+        raise ValueError(f"Unknown assignment method: {method}")
+    if capacity < 1:
+        raise ValueError("capacity must be at least 1.")
+    model = get_model_config(model_name)
+    if not model:
+        raise ValueError(f"Unknown model: {model_name}")
+
+    source_names = [field["name"] for field in source_entity["fields"]]
+    target_field_count = sum(len(entity["fields"]) for entity in target_entities)
+    too_large = len(source_names) * target_field_count * capacity > DENSE_LIMIT
+    options = sorted(name for name, value in match_options.items() if value)
+    if method == "hungarian" and options:
+        raise ValueError(f"The hungarian assignment method cannot be combined with {', '.join(options)}.")
+    if method == "hungarian" and too_large:
+        raise ValueError(f"The hungarian assignment method is limited to {DENSE_LIMIT} source x target x capacity "
+                         "field pairs.")
+    dense = not options and method != "greedy" and not too_large
+
+    if dense:
+        source_embeddings = load_entity_embeddings(model, source_entity)
+        target_embeddings = [embedding for entity in target_entities
+                             for embedding in load_entity_embeddings(model, entity)]
+        if not source_embeddings or not target_embeddings:
+            return {}
+        queries = np.array([item["embedding"] for item in source_embeddings], dtype="float32")
+        targets = np.array([item["embedding"] for item in target_embeddings], dtype="float32")
+        # Scored in the same (optionally reduced) space as `match_fields`, see app/reduction.py.
+        projection = get_projection(model)
+        if projection:
+            with timed("reduce_vectors"):
+                queries, targets = projection.apply(queries), projection.apply(targets)
+        with timed("assignment_scores"):
+            scores = dense_score_matrix(queries, targets)
+            if type_filter:
+                # Incompatible pairs are forbidden (-inf) like any other pair the solvers must not pick.
+                scores[~compatibility_mask([item["field"] for item in source_embeddings],
+                                           [item["field"] for item in target_embeddings])] = -np.inf
+        with timed("assignment_solve"):
+            pairs = solve_assignment(scores, capacity, method)
+        top = _top_candidates(scores, k).tolist()
+        row_scores = np.take_along_axis(scores, np.asarray(top, dtype="int64"), axis=1).tolist()
+
+        def entry(col, score):
+            return _match_entry(target_embeddings[col]["entity_id"], target_embeddings[col]["field"], score)
+
+        alternatives = {
+            source_embeddings[row]["field"]["name"]: [entry(col, score) for col, score in zip(cols, values)
+                                                      if np.isfinite(score)]
+            for row, (cols, values) in enumerate(zip(top, row_scores))
+        }
+        assigned = {source_embeddings[row]["field"]["name"]: entry(col, float(scores[row, col]))
+                    for row, col in pairs}
+        return _apply_assignment(source_names, alternatives, assigned, min_score, k)
+
+    alternatives = match_fields(source_entity, target_entities, model_name, k=max(k, CANDIDATES),
+                                type_filter=type_filter, **match_options)
+    # Sparse score matrix: one (source field, target field, score) candidate per returned match.
+    with timed("assignment_solve"):
+        rows, cols, candidates = [], [], []
+        for source_name, matches in alternatives.items():
+            for match in matches:
+                rows.append(source_name)
+                cols.append(match["target_field_id"])
+                candidates.append(match)
+        picked = _greedy(rows, cols, [match["score"] for match in candidates], capacity)
+    assigned = {rows[position]: candidates[position] for position in picked}
+    return _apply_assignment(source_names, alternatives, assigned, min_score, k)
+
+
+def assignment_from_mappings(field_mappings):
+    """
+    Extract the assignment from field mappings returned by `assign_fields`.
+
+    Returns:
+        dict: {source_field_name: assigned match or None}
+    """
+    return {
+        source_name: next((match for match in matches if match.get("assigned")), None)
+        for source_name, matches in field_mappings.items()
+    }
@@ -0,0 +1,157 @@
+"""
+Entity-level blocking for whole-schema matching.
+
+Instead of searching every source field against every target field of a schema, each entity gets one vector (its
+name/description embedding combined with the mean of its field embeddings), the top-M target entities are found per
+source entity, and field matching then runs only inside those candidates. Entity vectors are cached in the
+entity_embeddings table together with the schema version they were built at, so repeated requests against an unchanged
+schema do not load any field embeddings. The field search space per source entity is
+M entities instead of the whole target schema, so whole-schema matching grows linearly with the number of entities.
+"""
+import numpy as np
+
+from app.database import fetch_entity_level_embeddings, get_schema_versions, store_entity_embedding
+from app.encoders import embedding_model_name
+from app.field_text import build_field_text, text_hash
+from app.match import build_index, embed_texts, get_model_config, load_entity_embeddings, match_fields
+from app.metrics import increment, timed
+
+DEFAULT_TOP_ENTITIES = 3
+
+# Weight of the name/description embedding in the entity vector; the rest goes to the mean field embedding.
+NAME_WEIGHT = 0.5
+
+
+def entity_text(model_config, entity):
+    """Text embedded for an entity's name and description, rendered with the model's field text template."""
+    return build_field_text(model_config, {"name": entity["name"], "description": entity.get("description")}, entity)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def load_entity_vectors(model_config, entities, name_weight=NAME_WEIGHT):
+    """
+    Build one unit vector per entity from its name/description embedding and its field embeddings.
+
+    Name/description embeddings and the resulting entity vectors are cached in the entity_embeddings table. A cached
+    entity vector is used while its schema is still at the version it was built at and the entity text is unchanged;
+    otherwise the field embeddings are loaded (or generated) with `load_entity_embeddings` and the vector is rebuilt.
+    Entity vectors are only cached for the default `name_weight`.
+
+    Args:
+        model_config (dict): Model config as returned by `get_model_config`.
+        entities (list): Entity dicts with id, schema_id, name, description and fields.
+        name_weight (float): Weight of the name/description embedding.
+
+    Returns:
+        np.ndarray: 2D float32 array, one row per entity in the order of `entities`.
+    """
+    model_name = model_config["name"]
+    stored_name = embedding_model_name(model_config)
+    cache_pooled = name_weight == NAME_WEIGHT
+    with timed("fetch_entity_embeddings"):
+        cached = fetch_entity_level_embeddings([entity["id"] for entity in entities], stored_name)
+        schema_versions = dict(get_schema_versions())
+    texts = {entity["id"]: entity_text(model_config, entity) for entity in entities}
+    missing = [entity for entity in entities
+               if entity["id"] not in cached or cached[entity["id"]]["text_hash"] != text_hash(texts[entity["id"]])]
+    missing_ids = {entity["id"] for entity in missing}
+    if missing:
+        increment("embedding_cache_misses_total", len(missing), model=model_name)
+        with timed("generate_embeddings"):
+            name_vectors = embed_texts(model_config, [texts[entity["id"]] for entity in missing])
+        for entity, name_vector in zip(missing, name_vectors):
+            cached[entity["id"]] = {"embedding": name_vector, "text_hash": text_hash(texts[entity["id"]]),
+                                    "pooled": None, "schema_version": None}
+
+    vectors = []
+    for entity in entities:
+        entry = cached[entity["id"]]
+        schema_version = schema_versions.get(entity.get("schema_id"))
+        cacheable = cache_pooled and schema_version is not None
+        if cacheable and entry["pooled"] is not None and entry["schema_version"] == schema_version:
+            vectors.append(entry["pooled"])
+            continue
+        name_vector = _normalize(entry["embedding"])
+        field_embeddings = load_entity_embeddings(model_config, entity)
+        if field_embeddings:
+            field_vector = _normalize(_normalize([item["embedding"] for item in field_embeddings]).mean(axis=0))
+            vector = _normalize(name_weight * name_vector + (1 - name_weight) * field_vector)
+        else:
+            vector = name_vector
+        vectors.append(vector)
+        if cacheable or entity["id"] in missing_ids:
+            with timed("store_embedding"):
+                store_entity_embedding(entity["id"], stored_name, entry["embedding"], entry["text_hash"],
+                                       pooled=vector if cacheable else None, schema_version=schema_version)
+    return _normalize(vectors)
+
+
+def block_entities(source_entities, target_entities, model_name, top_entities=DEFAULT_TOP_ENTITIES):
+    """
+    Find the most similar target entities of every source entity.
+
+    Args:
+        source_entities (list): Source entity dicts.
+        target_entities (list): Candidate target entity dicts.
+        model_name (str): Name of model to use.
+        top_entities (int): Number of candidate target entities (M) per source entity.
+
+    Returns:
+        dict: {source_entity_id: [(target_entity, score), ...]} best first, with score = 1 - squared L2 distance
+              between the unit entity vectors.
+    """
+    model = get_model_config(model_name)
+    if not model:
+        raise ValueError(f"Unknown model: {model_name}")
+    if not source_entities:
+        return {}
+    if not target_entities:
+        return {entity["id"]: [] for entity in source_entities}
+
+    target_vectors = load_entity_vectors(model, target_entities)
+    source_vectors = load_entity_vectors(model, source_entities)
+    with timed("entity_blocking"):
+        distances, indices = build_index(target_vectors).search(source_vectors, min(top_entities, len(target_entities)))
+
+    return {
+        source_entity["id"]: [(target_entities[idx], score)
+                              for idx, score in zip(row_indices, row_scores) if idx != -1]
+        for source_entity, row_indices, row_scores in zip(source_entities, indices.tolist(), (1 - distances).tolist())
+    }
+
+
+def match_schema(source_entities, target_entities, model_name, top_entities=DEFAULT_TOP_ENTITIES, k=5,
+                 **match_options):
+    """
+    Match every source entity against its top target entities, then match fields within those entities.
+
+    Args:
+        source_entities (list): Source entity dicts.
+        target_entities (list): Target entity dicts, typically a whole schema.
+        model_name (str): Name of model to use.
+        top_entities (int): Number of candidate target entities per source entity.
+        k (int): Number of field matches per source field.
+        **match_options: Passed on to `match_fields` (e.g. hybrid=True).
+
+    Returns:
+        dict: {source_entity_id: {"candidate_entities": [{"target_entity_id", "target_entity_name", "score"}],
+               "field_mappings": field mappings as returned by `match_fields`}}
+    """
+    candidates = block_entities(source_entities, target_entities, model_name, top_entities)
+    results = {}
+    for source_entity in source_entities:
+        entity_candidates = candidates[source_entity["id"]]
+        results[source_entity["id"]] = {
+            "candidate_entities": [
+                {"target_entity_id": entity["id"], "target_entity_name": entity["name"], "score": score}
+                for entity, score in entity_candidates
+            ],
+            "field_mappings": match_fields(source_entity, [entity for entity, _ in entity_candidates], model_name,
+                                           k=k, **match_options),
+        }
+    return results
@@ -0,0 +1,181 @@
+"""
+Typeahead search over schema, entity and field names.
+
+Pickers query this instead of downloading every schema with all its entities and fields. Each schema gets an in-memory
+index of its entity and field names and descriptions: a sorted word list for prefix lookups and trigram postings over
+the names for substring and typo-tolerant lookups. Indexes are kept per process and rebuilt only for schemas whose
+version (see `Schema.version`) changed since they were built, so every worker sees writes made by the others.
+
+Names are ranked by how they match the query: exactly, as a prefix, every query word prefixing one of their words, as a
+substring, or by trigram similarity. Documents whose description words are prefixed by the query words come last.
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+from app.database import Entity, Field, Schema, db, get_schema_versions
+from app.lexical import split_identifier
+
+KINDS = ("schema", "entity", "field")
+
+# Score of each way a document can match the query (similar names get SUBSTRING_SCORE times their similarity).
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+WORD_PREFIX_SCORE = 0.6
+SUBSTRING_SCORE = 0.4
+DESCRIPTION_SCORE = 0.1
+# Names sharing fewer trigrams with the query than this (Jaccard) are not returned as similar.
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def _trigrams(compact):
+    padded = f"  {compact} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    """
+    Prefix and trigram index over documents (dicts with kind, id, name and description plus context keys).
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.compact_names = ["".join(split_identifier(document["name"])) for document in documents]
+        self.name_trigrams = [_trigrams(compact) for compact in self.compact_names]
+        words = set()
+        for i, document in enumerate(documents):
+            words.update((word, i, True) for word in split_identifier(document["name"]))
+            words.update((word, i, False) for word in split_identifier(document.get("description")))
+        self.words = sorted(words)
+        self.trigram_postings = defaultdict(set)
+        for i, trigrams in enumerate(self.name_trigrams):
+            for trigram in trigrams:
+                self.trigram_postings[trigram].add(i)
+
+    def _prefix_matches(self, prefix):
+        """{document index: matched a name word (else only a description word)} for words starting with `prefix`."""
+        matches = {}
+        # Walk from the first word >= prefix by index; slicing would copy the rest of the word list per term.
+        for position in range(bisect.bisect_left(self.words, (prefix,)), len(self.words)):
+            word, i, in_name = self.words[position]
+            if not word.startswith(prefix):
+                break
+            matches[i] = matches.get(i, False) or in_name
+        return matches
+
+    def search(self, query, kinds=KINDS):
+        """
+        Score the documents matching `query`.
+
+        Returns:
+            list: (score, document) pairs, unsorted. An empty query matches every document with score 0.
+        """
+        terms = split_identifier(query)
+        if not terms:
+            return [(0.0, document) for document in self.documents if document["kind"] in kinds]
+        compact = "".join(terms)
+
+        # Every query term must prefix a name or description word, unless the name is similar as a whole.
+        term_matches = [self._prefix_matches(term) for term in terms]
+        candidates = set.intersection(*(set(matches) for matches in term_matches))
+        similar = {}
+        if len(compact) >= 3:
+            trigrams = _trigrams(compact)
+            counts = defaultdict(int)
+            for trigram in trigrams:
+                for i in self.trigram_postings.get(trigram, ()):
+                    counts[i] += 1
+            for i, shared in counts.items():
+                similarity = shared / len(trigrams | self.name_trigrams[i])
+                if similarity >= MIN_TRIGRAM_SIMILARITY or compact in self.compact_names[i]:
+                    similar[i] = similarity
+
+        results = []
+        for i in candidates | set(similar):
+            document = self.documents[i]
+            if document["kind"] not in kinds:
+                continue
+            name = self.compact_names[i]
+            if name == compact:
+                score = EXACT_SCORE
+            elif name.startswith(compact):
+                score = PREFIX_SCORE
+            elif i in candidates and all(matches[i] for matches in term_matches):
+                score = WORD_PREFIX_SCORE
+            elif compact in name:
+                score = SUBSTRING_SCORE
+            else:
+                # Similar names, or names that do not match but whose description does.
+                score = max(SUBSTRING_SCORE * similar.get(i, 0.0), DESCRIPTION_SCORE if i in candidates else 0.0)
+            results.append((score, document))
+        return results
+
+
+def _schema_documents(schema_id):
+    schema = db.session.get(Schema, schema_id)
+    documents = [{"kind": "schema", "id": schema.id, "name": schema.name, "description": schema.description,
+                  "schema_id": schema.id, "schema_name": schema.name}]
+    entities = Entity.query.filter_by(schema_id=schema_id).all()
+    entity_names = {entity.id: entity.name for entity in entities}
+    documents += [{"kind": "entity", "id": entity.id, "name": entity.name, "description": entity.description,
+                   "schema_id": schema.id, "schema_name": schema.name} for entity in entities]
+    fields = (Field.query.join(Entity, Entity.id == Field.entity_id)
+              .filter(Entity.schema_id == schema_id).all())
+    documents += [{"kind": "field", "id": field.id, "name": field.name, "description": field.description,
+                   "schema_id": schema.id, "schema_name": schema.name, "entity_id": field.entity_id,
+                   "entity_name": entity_names[field.entity_id]} for field in fields]
+    return documents
+
+
+class CatalogSearch:
+    """Per-schema `CatalogIndex`es, rebuilt when their schema's version changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}  # schema id -> (version, CatalogIndex)
+
+    def indexes(self, schema_ids=None):
+        """Up-to-date indexes of the given schemas (all by default)."""
+        versions = dict(get_schema_versions())
+        with self._lock:
+            for schema_id in [schema_id for schema_id in self._indexes if schema_id not in versions]:
+                del self._indexes[schema_id]
+            wanted = versions if schema_ids is None else [schema_id for schema_id in schema_ids if schema_id in versions]
+            for schema_id in wanted:
+                built = self._indexes.get(schema_id)
+                if built is None or built[0] != versions[schema_id]:
+                    self._indexes[schema_id] = (versions[schema_id], CatalogIndex(_schema_documents(schema_id)))
+            return [self._indexes[schema_id][1] for schema_id in wanted]
+
+    def search(self, query, kinds=KINDS, schema_ids=None, page=1, per_page=20):
+        """
+        Rank schema, entity and field names matching `query`.
+
+        Args:
+            query (str): Text typed so far; empty lists everything of the given kinds by name.
+            kinds (tuple): Document kinds to return, from `KINDS`.
+            schema_ids (list): Only search these schemas.
+            page (int): 1-based page number.
+            per_page (int): Results per page.
+
+        Returns:
+            dict: "total" matches and the "results" of the page, best first, each with its kind, id, name,
+                  description, schema id and name (and entity id and name for fields) and "score".
+        """
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Unknown kinds: {', '.join(sorted(unknown))}")
+        if page < 1 or per_page < 1:
+            raise ValueError("page and per_page must be positive.")
+        results = [result for index in self.indexes(schema_ids) for result in index.search(query, kinds)]
+        results.sort(key=lambda result: (-result[0], result[1]["name"].lower(), len(result[1]["name"]),
+                                         KINDS.index(result[1]["kind"]), result[1]["id"]))
+        start = (page - 1) * per_page
+        return {
+            "total": len(results),
+            "results": [{**document, "score": round(score, 4)}
+                        for score, document in results[start:start + per_page]],
+        }
+
+
+catalog_search = CatalogSearch()
@@ -0,0 +1,191 @@
+"""
+Near-duplicate field clustering.
+
+Catalogs hold many fields that are the same concept under different names (`cust_email`, `customerEmail`,
+`email_address`). `cluster_fields` finds them for one model from the field embeddings: a FAISS range search, run in
+batches over a flat index, returns every pair scoring at least `threshold` (1 - squared L2 distance, the score used
+for matching), and the connected components of that graph become clusters. The member with the most near-duplicates
+represents its cluster.
+
+Stored clusters (field_clusters) serve two purposes: a dedup report for data governance, and clustered matching
+(`match_fields(..., clustered=True)`), which indexes only one representative per cluster and expands the
+representatives it finds to their members.
+"""
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+
+from app.database import Schema, get_entities_by_schema, get_field_clusters, replace_field_clusters
+from app.encoders import embedding_model_name
+from app.metrics import timed
+
+DEFAULT_THRESHOLD = 0.9
+
+
+def _components(count, pairs):
+    """Connected components of the graph over `count` nodes with the given edges, as lists of node indices."""
+    parents = list(range(count))
+
+    def find(node):
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for first, second in pairs:
+        root_first, root_second = find(first), find(second)
+        if root_first != root_second:
+            parents[max(root_first, root_second)] = min(root_first, root_second)
+    components = defaultdict(list)
+    for node in range(count):
+        components[find(node)].append(node)
+    return list(components.values())
+
+
+def near_duplicate_pairs(vectors, threshold=DEFAULT_THRESHOLD, batch_size=1024):
+    """
+    Pairs of vectors scoring at least `threshold`, found with a batched FAISS range search.
+
+    Returns:
+        list: (i, j, score) with i < j.
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    radius = 1.0 - threshold
+    pairs = []
+    for start in range(0, len(vectors), batch_size):
+        lims, distances, labels = index.range_search(vectors[start:start + batch_size], radius)
+        for row in range(len(lims) - 1):
+            query = start + row
+            for label, distance in zip(labels[lims[row]:lims[row + 1]].tolist(),
+                                       distances[lims[row]:lims[row + 1]].tolist()):
+                if label > query:
+                    pairs.append((query, label, 1.0 - distance))
+    return pairs
+
+
+def cluster_vectors(vectors, threshold=DEFAULT_THRESHOLD, batch_size=1024):
+    """
+    Cluster near-duplicate vectors.
+
+    Returns:
+        list: Clusters of at least two vector indices, each as (representative index, [member indices]).
+    """
+    pairs = near_duplicate_pairs(vectors, threshold, batch_size)
+    degrees = defaultdict(int)
+    for first, second, _ in pairs:
+        degrees[first] += 1
+        degrees[second] += 1
+    clusters = []
+    for members in _components(len(vectors), [(first, second) for first, second, _ in pairs]):
+        if len(members) > 1:
+            clusters.append((max(members, key=lambda member: (degrees[member], -member)), members))
+    return clusters
+
+
+def cluster_fields(model_name, schema_ids=None, threshold=DEFAULT_THRESHOLD, batch_size=1024):
+    """
+    Cluster the near-duplicate fields of the given schemas (all by default) and store the clusters.
+
+    Missing and stale embeddings are generated first (like matching does). Previous clusters of the covered fields
+    are replaced.
+
+    Returns:
+        dict: Dedup report: "fields" covered, "clustered_fields", and "clusters" (largest first), each with its
+              "cluster_id", "size", "schemas" count and "members" (representative first) with field, entity and
+              schema names and their "similarity" to the representative.
+    """
+    # Deferred: app.match uses `representative_groups` for clustered matching.
+    from app.match import get_model_config, load_entity_embeddings
+
+    model_config = get_model_config(model_name)
+    if model_config is None:
+        raise ValueError(f"Unknown model: {model_name}")
+    schemas = Schema.query.order_by(Schema.id)
+    if schema_ids:
+        schemas = schemas.filter(Schema.id.in_(schema_ids))
+
+    fields, vectors = [], []
+    with timed("cluster_load_embeddings"):
+        for schema in schemas.all():
+            for entity in get_entities_by_schema(schema.id):
+                for embedding in load_entity_embeddings(model_config, entity):
+                    fields.append({"field_id": embedding["field"]["id"], "field_name": embedding["field"]["name"],
+                                   "entity_id": entity["id"], "entity_name": entity["name"],
+                                   "schema_id": schema.id, "schema_name": schema.name})
+                    vectors.append(embedding["embedding"])
+    if not fields:
+        replace_field_clusters(embedding_model_name(model_config), [], [])
+        return {"fields": 0, "clustered_fields": 0, "clusters": []}
+
+    vectors = np.asarray(vectors, dtype="float32")
+    with timed("cluster_range_search"):
+        clusters = cluster_vectors(vectors, threshold, batch_size)
+
+    report, memberships = [], []
+    for representative, members in clusters:
+        members = [representative] + sorted(member for member in members if member != representative)
+        similarities = 1.0 - ((vectors[members] - vectors[representative]) ** 2).sum(axis=1)
+        cluster_id = fields[representative]["field_id"]
+        memberships += [(fields[member]["field_id"], cluster_id, similarity)
+                        for member, similarity in zip(members, similarities.tolist())]
+        report.append({
+            "cluster_id": cluster_id,
+            "size": len(members),
+            "schemas": len({fields[member]["schema_id"] for member in members}),
+            "members": [{**fields[member], "similarity": round(similarity, 4)}
+                        for member, similarity in zip(members, similarities.tolist())],
+        })
+    replace_field_clusters(embedding_model_name(model_config), [field["field_id"] for field in fields], memberships)
+    report.sort(key=lambda cluster: (-cluster["size"], cluster["cluster_id"]))
+    return {"fields": len(fields), "clustered_fields": len(memberships), "clusters": report}
+
+
+def clusters_key(model_name, field_ids):
+    """
+    Fingerprint of the stored clusters of the given fields, for the cache keys of clustered matches.
+
+    Clustered results change whenever the clusters of their targets do (a new clustering run, or an edit dropping a
+    field's cluster), so they are cached under this key.
+    """
+    # Deferred: app.match uses `representative_groups` for clustered matching.
+    from app.match import config
+
+    model_config = next((model for model in config["models"] if model["name"] == model_name), None)
+    stored_name = embedding_model_name(model_config) if model_config else model_name
+    clusters = sorted(get_field_clusters(stored_name, list(field_ids)).items())
+    return hashlib.sha1(repr(clusters).encode("utf-8")).hexdigest()
+
+
+def representative_groups(field_ids, clusters, categories=None):
+    """
+    Group target fields by stored cluster, so that only one of each group has to be searched.
+
+    With `categories`, fields of different type categories are never grouped, so a type-filtered search never
+    reaches a member through a representative of another category. A cluster whose representative is not among `field_ids`
+    is represented by its first member that is.
+
+    Args:
+        field_ids (list): Target field ids, in index order.
+        clusters (dict): {field_id: cluster_id} as returned by `app.database.get_field_clusters`.
+        categories (np.ndarray): Type category index of each field (see `app.type_compat.category_indices`).
+
+    Returns:
+        dict: {representative position: [member positions, representative first]}
+    """
+    groups = {}
+    for position, field_id in enumerate(field_ids):
+        cluster_id = clusters.get(field_id)
+        key = (cluster_id if cluster_id is not None else ("field", field_id),
+               None if categories is None else int(categories[position]))
+        groups.setdefault(key, []).append(position)
+    result = {}
+    for positions in groups.values():
+        representative = next((position for position in positions if field_ids[position] == clusters.get(
+            field_ids[position])), positions[0])
+        result[representative] = [representative] + [position for position in positions if position != representative]
+    return result
@@ -0,0 +1,64 @@
+"""
+Confirmed field mappings.
+
+Users accept or reject suggested matches per (source field, target schema); the decisions are stored in the
+confirmed_mappings table. `field_decisions` resolves the decisions about one source entity against the target entities
+being matched, and `match_fields(..., confirmed=decisions)` then answers fields with an accepted mapping without
+embedding or searching them, and drops rejected targets from the candidates of the others. As a project matures most
+fields are decided, so matching becomes mostly a lookup.
+"""
+import hashlib
+
+from app.database import get_confirmed_mappings
+
+
+def field_decisions(source_entity, target_entities):
+    """
+    Decisions about the fields of `source_entity` that point at one of `target_entities`.
+
+    Args:
+        source_entity (dict): Source entity with "name" and "schema_id".
+        target_entities (list): Entity dicts with "name", "schema_id" and "fields".
+
+    Returns:
+        dict: {source field name: {"accepted": [(target entity id, target field dict)], "rejected": set of target
+              field ids}}, only for source fields with at least one decision.
+    """
+    targets = {
+        (entity["schema_id"], entity["name"], field["name"]): (entity["id"], field)
+        for entity in target_entities
+        for field in entity["fields"]
+    }
+    schema_ids = sorted({entity["schema_id"] for entity in target_entities})
+    if not targets:
+        return {}
+
+    decisions = {}
+    for mapping in get_confirmed_mappings(source_entity["schema_id"], schema_ids, source_entity["name"]):
+        target = targets.get((mapping["target_schema_id"], mapping["target_entity_name"], mapping["target_field_name"]))
+        if target is None:
+            continue
+        decision = decisions.setdefault(mapping["source_field_name"], {"accepted": [], "rejected": set()})
+        if mapping["status"] == "accepted":
+            decision["accepted"].append(target)
+        else:
+            decision["rejected"].add(target[1]["id"])
+    return decisions
+
+
+def decisions_key(decisions):
+    """
+    Fingerprint of resolved decisions, for match cache keys; None when there are none.
+    """
+    if not decisions:
+        return None
+    parts = sorted(
+        f"{name}:{sorted(field['id'] for _, field in decision['accepted'])}:{sorted(decision['rejected'])}"
+        for name, decision in decisions.items()
+    )
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def resolved_fields(source_entity, decisions):
+    """Names of the source fields that have an accepted mapping and need no search."""
+    return {field["name"] for field in source_entity["fields"] if decisions.get(field["name"], {}).get("accepted")}
@@ -1,57 +1,263 @@
+import hashlib
+import json
+import time
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 import numpy as np
 
+from app.storage import create_vector_index, embedding_vectors, upsert_vectors, vector_search_enabled
+
 db = SQLAlchemy()
 
+# Deleting a schema, entity or field removes everything that hangs off it (entities, fields, embeddings and cached
+# matches) through ON DELETE CASCADE; the relationships use passive_deletes so the ORM leaves that to the database.
+
 class Schema(db.Model):
     __tablename__ = 'schemas'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255))
-    entities = db.relationship('Entity', backref='schema', lazy=True)
+    # Incremented by every write to the schema, its entities or their fields; read endpoints use it as their ETag.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    entities = db.relationship('Entity', backref='schema', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('name', name='unique_schema_name'),
+    )
 
 class Entity(db.Model):
     __tablename__ = 'entities'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255))
-    schema_id = db.Column(db.Integer, db.ForeignKey('schemas.id'), nullable=False)
-    fields = db.relationship('Field', backref='entity', lazy=True)
+    schema_id = db.Column(db.Integer, db.ForeignKey('schemas.id', ondelete='CASCADE'), nullable=False)
+    fields = db.relationship('Field', backref='entity', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        # Also serves lookups by schema_id alone (leading column).
+        db.UniqueConstraint('schema_id', 'name', name='unique_entity_name'),
+    )
 
 class Field(db.Model):
     __tablename__ = 'fields'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255))
-    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False, index=True)
+    # Raw type and allowed values as extracted from the schema source; see `app.type_compat`.
+    type = db.Column(db.String(50), nullable=True)
+    enum = db.Column(db.JSON, nullable=True)
+    nullable = db.Column(db.Boolean, nullable=True)
 
 class FieldMatch(db.Model):
     __tablename__ = 'field_matches'
     
     id = db.Column(db.Integer, primary_key=True)
-    source_entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
+    source_entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False)
     model_name = db.Column(db.String, nullable=False)
+    # Identifies the target entities and match options the mappings were computed for (see `match_cache_key`).
+    cache_key = db.Column(db.String(40), nullable=False, default='', server_default='')
     field_mappings = db.Column(db.JSON, nullable=False)
+    # Options the mappings were computed with (the cache key only holds their hash), so they can be refreshed.
+    match_options = db.Column(db.JSON, nullable=True)
+    # Set when a field the mappings depend on changed; dirty results are not served until refreshed (app/refresh.py).
+    dirty = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # What changed since the mappings were computed: {"leave": [target field ids whose entries are outdated],
+    # "enter": [target field ids that may now rank], "sources": [source field names to recompute], "marks": number of
+    # changes, so that a refresh can tell whether the row changed again while it ran}.
+    pending_changes = db.Column(db.JSON, nullable=True)
+    targets = db.relationship('FieldMatchTarget', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
     __table_args__ = (
         db.UniqueConstraint(
             'source_entity_id',
+            'model_name',
+            'cache_key',
             name='unique_field_match'
         ),
     )
 
+class FieldMatchTarget(db.Model):
+    """A target entity whose fields a cached field match was searched against (its dependencies)."""
+    __tablename__ = 'field_match_targets'
+    id = db.Column(db.Integer, primary_key=True)
+    field_match_id = db.Column(db.Integer, db.ForeignKey('field_matches.id', ondelete='CASCADE'), nullable=False)
+    target_entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False,
+                                 index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('field_match_id', 'target_entity_id', name='unique_field_match_target'),
+    )
+
 class Embedding(db.Model):
     __tablename__ = 'embeddings'
     id = db.Column(db.Integer, primary_key=True)
-    field_id = db.Column(db.Integer, db.ForeignKey('fields.id'), nullable=False)
+    field_id = db.Column(db.Integer, db.ForeignKey('fields.id', ondelete='CASCADE'), nullable=False)
     model_name = db.Column(db.String, nullable=False)
     embedding = db.Column(db.LargeBinary, nullable=False)
+    # Hash of the text that was embedded (see `app.field_text`); a different hash means the embedding is stale.
+    text_hash = db.Column(db.String(40), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('field_id', 'model_name', name='unique_field_embedding'),
+    )
+
+class EntityEmbedding(db.Model):
+    """
+    Embedding of an entity's name and description, used to block candidate entities before field matching.
+
+    `pooled` caches the entity vector built from this embedding and the entity's field embeddings; it is valid while
+    the schema is still at `schema_version`.
+    """
+    __tablename__ = 'entity_embeddings'
+    id = db.Column(db.Integer, primary_key=True)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False)
+    model_name = db.Column(db.String, nullable=False)
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    text_hash = db.Column(db.String(40), nullable=True)
+    pooled = db.Column(db.LargeBinary, nullable=True)
+    schema_version = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('entity_id', 'model_name', name='unique_entity_embedding'),
+    )
+
+class EmbeddingProjection(db.Model):
+    """
+    A dimensionality reduction fitted on one model's stored embeddings (see `app.reduction`).
+
+    Versions are numbered per model; matching uses the newest version with the configured method and dimensions.
+    """
+    __tablename__ = 'embedding_projections'
+    id = db.Column(db.Integer, primary_key=True)
+    model_name = db.Column(db.String, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    method = db.Column(db.String(20), nullable=False)
+    input_dimension = db.Column(db.Integer, nullable=False)
+    output_dimension = db.Column(db.Integer, nullable=False)
+    mean = db.Column(db.LargeBinary, nullable=False)
+    components = db.Column(db.LargeBinary, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False)
+    # Recall@k of the reduced search against full-dimension search on the fitting corpus.
+    recall = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('model_name', 'version', name='unique_embedding_projection'),
+    )
+
+class ConfirmedMapping(db.Model):
+    """
+    A user decision about a suggested field mapping: "accepted" or "rejected".
+
+    Like gold mappings, fields are referenced by schema id and entity/field name so that decisions survive re-imports.
+    Matching answers source fields with an accepted mapping without searching and never suggests a rejected target.
+    """
+    __tablename__ = 'confirmed_mappings'
+    id = db.Column(db.Integer, primary_key=True)
+    source_schema_id = db.Column(db.Integer, db.ForeignKey('schemas.id', ondelete='CASCADE'), nullable=False)
+    source_entity_name = db.Column(db.String(100), nullable=False)
+    source_field_name = db.Column(db.String(100), nullable=False)
+    target_schema_id = db.Column(db.Integer, db.ForeignKey('schemas.id', ondelete='CASCADE'), nullable=False)
+    target_entity_name = db.Column(db.String(100), nullable=False)
+    target_field_name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(10), nullable=False)
+
+    __table_args__ = (
+        # Also serves the lookups by source entity done when matching (leading columns).
+        db.UniqueConstraint(
+            'source_schema_id', 'source_entity_name', 'source_field_name',
+            'target_schema_id', 'target_entity_name', 'target_field_name',
+            name='unique_confirmed_mapping'
+        ),
+    )
+
+class GoldMapping(db.Model):
+    """
+    A known-correct field mapping used to evaluate match quality.
+
+    Fields are referenced by schema id and entity/field name rather than field id because re-importing an entity
+    recreates its fields.
+    """
+    __tablename__ = 'gold_mappings'
+    id = db.Column(db.Integer, primary_key=True)
+    source_schema_id = db.Column(db.Integer, db.ForeignKey('schemas.id', ondelete='CASCADE'), nullable=False)
+    source_entity_name = db.Column(db.String(100), nullable=False)
+    source_field_name = db.Column(db.String(100), nullable=False)
+    target_schema_id = db.Column(db.Integer, db.ForeignKey('schemas.id', ondelete='CASCADE'), nullable=False)
+    target_entity_name = db.Column(db.String(100), nullable=False)
+    target_field_name = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'source_schema_id', 'source_entity_name', 'source_field_name',
+            'target_schema_id', 'target_entity_name', 'target_field_name',
+            name='unique_gold_mapping'
+        ),
+    )
+
+class FieldCluster(db.Model):
+    """
+    Membership of a field in a cluster of near-duplicate fields for one model (see `app.clustering`).
+
+    A cluster is identified by its representative field's id; fields that are not near-duplicates of any other field
+    have no row.
+    """
+    __tablename__ = 'field_clusters'
+    id = db.Column(db.Integer, primary_key=True)
+    model_name = db.Column(db.String, nullable=False)
+    field_id = db.Column(db.Integer, db.ForeignKey('fields.id', ondelete='CASCADE'), nullable=False)
+    cluster_id = db.Column(db.Integer, nullable=False)
+    # Similarity (1 - squared L2 distance) of the field to the cluster's representative.
+    similarity = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('model_name', 'field_id', name='unique_field_cluster'),
+    )
+
+class WorkLock(db.Model):
+    """
+    A lease on a unit of work (e.g. computing one match result) shared by all worker processes (see
+    `app.singleflight.work_lock`). The primary key makes acquiring it an atomic insert.
+    """
+    __tablename__ = 'work_locks'
+    key = db.Column(db.String(200), primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)
+    # Unix time after which the lease is considered abandoned (its holder crashed) and may be taken over.
+    expires_at = db.Column(db.Float, nullable=False)
+
+def field_dict(field):
+    """Serialize a field (with its type metadata) the way every getter below returns it."""
+    return {"id": field.id, "name": field.name, "description": field.description, "type": field.type,
+            "enum": field.enum, "nullable": field.nullable}
+
+def bump_schema_version(schema_id):
+    """Increment a schema's version in the current transaction (committed together with the change)."""
+    Schema.query.filter_by(id=schema_id).update({Schema.version: Schema.version + 1}, synchronize_session=False)
+
+def get_schema_version(schema_id):
+    return db.session.query(Schema.version).filter(Schema.id == schema_id).scalar()
+
+def get_schema_versions():
+    """(id, version) of every schema, by id."""
+    return [tuple(row) for row in db.session.query(Schema.id, Schema.version).order_by(Schema.id)]
+
+def get_entity_schema_version(entity_id):
+    """(schema id, schema version) of an entity, or None if it does not exist."""
+    row = (db.session.query(Schema.id, Schema.version)
+           .join(Entity, Entity.schema_id == Schema.id)
+           .filter(Entity.id == entity_id)
+           .first())
+    return tuple(row) if row else None
 
 def insert_or_update_schema(schema_name, schema_description=None):
     schema = Schema.query.filter_by(name=schema_name).first()
 
     if schema:
-        schema.description = schema_description
+        if schema.description != schema_description:
+            schema.description = schema_description
+            bump_schema_version(schema.id)
     else:
         schema = Schema(name=schema_name, description=schema_description)
         db.session.add(schema)
@@ -59,26 +265,108 @@ def insert_or_update_schema(schema_name, schema_description=None):
     db.session.commit()
     return schema
 
+FIELD_ATTRIBUTES = ('description', 'type', 'enum', 'nullable')
+
+def _field_values(field_data):
+    return {
+        'description': field_data.get('description'),
+        'type': field_data.get('type'),
+        'enum': field_data.get('enum') or None,
+        'nullable': field_data.get('nullable'),
+    }
+
+def _add_fields(entity, fields_data):
+    """Add new fields to an entity and return them (with ids)."""
+    fields = [Field(name=field_data.get('name'), entity_id=entity.id, **_field_values(field_data))
+              for field_data in fields_data]
+    db.session.add_all(fields)
+    db.session.flush()
+    return fields
+
+def mark_matches_dirty(entity_id, leave=(), enter=(), source_fields=()):
+    """
+    Mark the cached field matches affected by a change to an entity's fields as dirty, recording what changed.
+
+    Args:
+        entity_id (int): The changed entity.
+        leave (list): Ids of its fields that were removed or changed; their entries in cached matches are outdated.
+        enter (list): Ids of its fields that were added or changed and may now rank in cached matches.
+        source_fields (list): Names of its added, changed or removed fields, for matches where it is the source.
+
+    Returns:
+        int: Number of cached matches marked dirty.
+    """
+    changes = []
+    if leave or enter:
+        dependents = (FieldMatch.query
+                      .join(FieldMatchTarget, FieldMatchTarget.field_match_id == FieldMatch.id)
+                      .filter(FieldMatchTarget.target_entity_id == entity_id))
+        changes += [(field_match, {"leave": list(leave), "enter": list(enter)}) for field_match in dependents]
+    if source_fields:
+        changes += [(field_match, {"sources": list(source_fields)})
+                    for field_match in FieldMatch.query.filter_by(source_entity_id=entity_id)]
+
+    for field_match, change in changes:
+        pending = dict(field_match.pending_changes or {})
+        for key, values in change.items():
+            pending[key] = sorted(set(pending.get(key, [])) | set(values), key=str)
+        pending["marks"] = pending.get("marks", 0) + 1
+        field_match.pending_changes = pending
+        field_match.dirty = True
+    return len({field_match.id for field_match, _ in changes})
+
 def insert_or_update_entity(schema_id, entity_name, entity_description=None, fields_data=None):
+    """
+    Insert an entity or replace its fields with `fields_data`.
+
+    Fields are diffed by name: unchanged fields keep their id (and embeddings), changed ones are updated in place and
+    missing ones are deleted. Cached matches that depend on the changed fields are marked dirty.
+    """
     entity = Entity.query.filter_by(name=entity_name, schema_id=schema_id).first()
 
-    if entity:
-        entity.description = entity_description
-        Field.query.filter_by(entity_id=entity.id).delete()
-    else:
+    if not entity:
         entity = Entity(name=entity_name, description=entity_description, schema_id=schema_id)
         db.session.add(entity)
+        db.session.flush()
+        _add_fields(entity, fields_data or [])
+        bump_schema_version(schema_id)
         db.session.commit()
+        return entity
 
-    if fields_data:
-        for field_data in fields_data:
-            field = Field(
-                name=field_data.get('name'),
-                description=field_data.get('description'),
-                entity_id=entity.id
-            )
-            db.session.add(field)
+    existing = {field.name: field for field in Field.query.filter_by(entity_id=entity.id)}
+    changed, unchanged, new_fields_data = [], [], []
+    for field_data in fields_data or []:
+        field = existing.pop(field_data.get('name'), None)
+        if field is None:
+            new_fields_data.append(field_data)
+            continue
+        values = _field_values(field_data)
+        if any(getattr(field, key) != values[key] for key in FIELD_ATTRIBUTES):
+            for key in FIELD_ATTRIBUTES:
+                setattr(field, key, values[key])
+            changed.append(field)
+        else:
+            unchanged.append(field)
+    removed = list(existing.values())
+    for field in removed:
+        db.session.delete(field)
+    added = _add_fields(entity, new_fields_data)
 
+    if entity.description != entity_description:
+        # The entity description can be part of every field's embedded text (see `app.field_text`).
+        entity.description = entity_description
+        changed += unchanged
+    if changed or removed or added:
+        EntityEmbedding.query.filter_by(entity_id=entity.id).delete()
+        bump_schema_version(schema_id)
+    if changed or removed:
+        drop_field_clusters([field.id for field in changed + removed])
+    mark_matches_dirty(
+        entity.id,
+        leave=[field.id for field in changed + removed],
+        enter=[field.id for field in changed + added],
+        source_fields=[field.name for field in changed + removed + added],
+    )
     db.session.commit()
     return entity
 
@@ -88,25 +376,34 @@ def add_field(schema_id, entity_name, entity_description, fields_data=None):
     if not entity:
         entity = Entity(name=entity_name, description=entity_description, schema_id=schema_id)
         db.session.add(entity)
-        db.session.commit()
+        db.session.flush()
+        bump_schema_version(schema_id)
+    elif fields_data:
+        bump_schema_version(schema_id)
 
     if fields_data:
-        for field_data in fields_data:
-            field = Field(
-                name=field_data.get('name'),
-                description=field_data.get('description'),
-                entity_id=entity.id
-            )
-            db.session.add(field)
+        added = _add_fields(entity, fields_data)
+        mark_matches_dirty(entity.id, enter=[field.id for field in added],
+                           source_fields=[field.name for field in added])
 
     db.session.commit()
     return entity
 
 def delete_entity(entity_id):
+    """
+    Delete an entity with its fields.
+
+    Cached matches that searched it are deleted too: their cache key names the deleted entity, so they can never be
+    served again.
+    """
     entity = Entity.query.get(entity_id)
     if not entity:
         return False
 
+    dependents = (db.session.query(FieldMatchTarget.field_match_id)
+                  .filter(FieldMatchTarget.target_entity_id == entity_id))
+    FieldMatch.query.filter(FieldMatch.id.in_(dependents)).delete(synchronize_session=False)
+    bump_schema_version(entity.schema_id)
     db.session.delete(entity)
     db.session.commit()
     return True
@@ -117,7 +414,7 @@ def get_all_schemas():
     for schema in schemas:
         entities = []
         for entity in schema.entities:
-            fields = [{"id": field.id, "name": field.name, "description": field.description} for field in entity.fields]
+            fields = [field_dict(field) for field in entity.fields]
             entities.append({
                 "id": entity.id,
                 "name": entity.name,
@@ -139,7 +436,7 @@ def get_schema_by_id(schema_id):
 
     entities = []
     for entity in schema.entities:
-        fields = [{"id": field.id, "name": field.name, "description": field.description} for field in entity.fields]
+        fields = [field_dict(field) for field in entity.fields]
         entities.append({
             "id": entity.id,
             "name": entity.name,
@@ -162,7 +459,7 @@ def get_schema_entities(schema_id):
     
     entities = {}
     for entity in schema.entities:
-        fields = [{"id": field.id, "name": field.name, "description": field.description} for field in entity.fields]
+        fields = [field_dict(field) for field in entity.fields]
         entities[entity.name] = {"id": entity.id, "description": entity.description, "fields": fields}
     
     return entities
@@ -172,7 +469,7 @@ def get_entity_by_id(entity_id):
     if not entity:
         return None
 
-    fields = [{"id": field.id, "name": field.name, "description": field.description} for field in entity.fields]
+    fields = [field_dict(field) for field in entity.fields]
     return {
         "id": entity.id,
         "name": entity.name,
@@ -189,8 +486,7 @@ def get_entities_by_ids(entity_ids):
         "name": entity.name,
         "description": entity.description,
         "schema_id": entity.schema_id,
-        "fields": [{"id": field.id, "name": field.name, "description": field.description}
-                   for field in entity.fields]
+        "fields": [field_dict(field) for field in entity.fields]
     } for entity in entities]
 
 def get_entity_by_name(schema_id, entity_name):
@@ -202,7 +498,7 @@ def get_entity_by_name(schema_id, entity_name):
     if not entity:
         return None
     else:
-        fields = [{"id": field.id, "name": field.name, "description": field.description} for field in entity.fields]
+        fields = [field_dict(field) for field in entity.fields]
         return {
             "id": entity.id,
             "name": entity.name,
@@ -223,30 +519,75 @@ def get_entities_by_names(schema_id, entity_names):
         "name": entity.name,
         "description": entity.description,
         "schema_id": entity.schema_id,
-        "fields": [{"id": field.id, "name": field.name, "description": field.description}
-                   for field in entity.fields]
+        "fields": [field_dict(field) for field in entity.fields]
+    } for entity in entities]
+
+def get_entities_by_schema(schema_id):
+    """All entities of a schema (with their fields), ordered by id."""
+    entities = Entity.query.filter(Entity.schema_id == schema_id).order_by(Entity.id).all()
+
+    return [{
+        "id": entity.id,
+        "name": entity.name,
+        "description": entity.description,
+        "schema_id": entity.schema_id,
+        "fields": [field_dict(field) for field in entity.fields]
     } for entity in entities]
 
-def store_matching_data_in_db(source_entity, model_name, field_mappings):
+def match_cache_key(target_entity_ids, **options):
+    """
+    Key cached field matches by the target entities and match options they were computed for.
+
+    Args:
+        target_entity_ids (list): Ids of the target entities.
+        **options: Match options that change the result (e.g. hybrid=True).
+
+    Returns:
+        str: SHA-1 hex digest, stable across the order of `target_entity_ids`.
+    """
+    payload = json.dumps({"targets": sorted(target_entity_ids), "options": options}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def store_matching_data_in_db(source_entity, model_name, field_mappings, cache_key='', target_entity_ids=None,
+                              match_options=None):
+    """
+    Store (or replace) cached field mappings.
+
+    Args:
+        target_entity_ids (list): Entities the mappings were searched against; changes to their fields mark the
+            stored mappings dirty (see `mark_matches_dirty`).
+        match_options (dict): Options the mappings were computed with, used to refresh them.
+    """
     try:
         # Check if the record already exists
         field_match = FieldMatch.query.filter_by(
             source_entity_id=source_entity["id"],
             model_name=model_name,
+            cache_key=cache_key,
         ).first()
 
         if field_match:
             # Update the existing record
             field_match.field_mappings = field_mappings
+            field_match.match_options = match_options
+            field_match.dirty = False
+            field_match.pending_changes = None
         else:
             # Insert a new record
             field_match = FieldMatch(
                 source_entity_id=source_entity["id"],
                 model_name=model_name,
-                field_mappings=field_mappings
+                cache_key=cache_key,
+                field_mappings=field_mappings,
+                match_options=match_options
             )
             db.session.add(field_match)
 
+        if target_entity_ids is not None:
+            field_match.targets = [FieldMatchTarget(target_entity_id=entity_id)
+                                   for entity_id in sorted(set(target_entity_ids))]
+
         db.session.commit()
 
     except Exception as e:
@@ -254,11 +595,14 @@ def store_matching_data_in_db(source_entity, model_name, field_mappings):
         raise RuntimeError(f"Error storing matching data in the database: {e}")
 
 
-def get_matching_data_from_db(source_entity, model_name):
+def get_matching_data_from_db(source_entity, model_name, cache_key=''):
     try:
+        # Dirty mappings are waiting for a refresh and count as a miss.
         field_match = FieldMatch.query.filter_by(
             source_entity_id=source_entity["id"],
-            model_name=model_name
+            model_name=model_name,
+            cache_key=cache_key,
+            dirty=False
         ).first()
 
         if field_match:
@@ -268,7 +612,29 @@ def get_matching_data_from_db(source_entity, model_name):
     except Exception as e:
         raise RuntimeError(f"Error retrieving matching data from the database: {e}")
 
-def store_embedding(field_id, model_name, embedding):
+def get_stored_field_mappings(source_entity_ids, model_name):
+    """
+    All stored match results of the given source entities for a model, whatever targets and options they were
+    computed for.
+
+    Returns:
+        dict: {source_entity_id: [field_mappings, ...]}, newest result first.
+    """
+    try:
+        field_matches = (
+            FieldMatch.query
+            .filter(FieldMatch.source_entity_id.in_(source_entity_ids), FieldMatch.model_name == model_name,
+                    FieldMatch.dirty.is_(False))
+            .order_by(FieldMatch.id.desc())
+        )
+        stored = {}
+        for field_match in field_matches:
+            stored.setdefault(field_match.source_entity_id, []).append(field_match.field_mappings)
+        return stored
+    except Exception as e:
+        raise RuntimeError(f"Error retrieving matching data from the database: {e}")
+
+def store_embedding(field_id, model_name, embedding, text_hash=None):
     """
     Store an embedding in the database.
     """
@@ -277,15 +643,70 @@ def store_embedding(field_id, model_name, embedding):
     ).first()
     if existing:
         existing.embedding = np.array(embedding, dtype="float32").tobytes()
+        existing.text_hash = text_hash
     else:
         new_embedding = Embedding(
             field_id=field_id,
             model_name=model_name,
             embedding=np.array(embedding, dtype="float32").tobytes(),
+            text_hash=text_hash,
         )
         db.session.add(new_embedding)
+    if vector_search_enabled(current_app):
+        field = db.session.get(Field, field_id)
+        upsert_vectors(db.session, [{
+            "field_id": field_id,
+            "model_name": model_name,
+            "entity_id": field.entity_id,
+            "vector": np.array(embedding, dtype="float32"),
+        }])
     db.session.commit()
 
+def store_embeddings(model_name, fields, embeddings, text_hashes=None):
+    """
+    Store the embeddings of many fields in one statement, replacing existing ones.
+
+    Args:
+        model_name (str): Model the embeddings were produced with.
+        fields (list): Field dicts with id and entity_id.
+        embeddings (list): One vector per field; fields whose vector is None are skipped.
+        text_hashes (list): Hash of the text embedded for each field (see `app.field_text.text_hash`).
+    """
+    text_hashes = text_hashes or [None] * len(fields)
+    rows = [{"field_id": field["id"], "model_name": model_name,
+             "embedding": np.asarray(embedding, dtype="float32").tobytes(), "text_hash": hash_}
+            for field, embedding, hash_ in zip(fields, embeddings, text_hashes) if embedding is not None]
+    if not rows:
+        return
+    try:
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            for row in rows:
+                store_embedding(row["field_id"], model_name, np.frombuffer(row["embedding"], dtype="float32"),
+                                row["text_hash"])
+            return
+
+        statement = insert(Embedding).values(rows)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['field_id', 'model_name'],
+            set_={'embedding': statement.excluded.embedding, 'text_hash': statement.excluded.text_hash},
+        ))
+        if vector_search_enabled(current_app):
+            upsert_vectors(db.session, [{
+                "field_id": field["id"],
+                "model_name": model_name,
+                "entity_id": field["entity_id"],
+                "vector": np.asarray(embedding, dtype="float32"),
+            } for field, embedding in zip(fields, embeddings) if embedding is not None])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise RuntimeError(f"Error storing embeddings in the database: {e}")
+
 def fetch_embedding(field_id, model_name):
     """
     Fetch an embedding from the database.
@@ -312,8 +733,356 @@ def fetch_entity_embeddings(entity_ids, model_name):
     for field, embedding in fields:
         embeddings.append({
             "embedding": np.frombuffer(embedding.embedding, dtype="float32"),
-            "field": {"id": field.id, "name": field.name, "description": field.description},
+            "field": field_dict(field),
             "entity_id": field.entity_id,
             "model_name": embedding.model_name,
+            "text_hash": embedding.text_hash,
         })
     return embeddings
+
+def store_entity_embedding(entity_id, model_name, embedding, text_hash=None, pooled=None, schema_version=None):
+    """
+    Store the name/description embedding of an entity, and optionally its pooled entity vector.
+
+    Args:
+        entity_id (int): Entity the embedding belongs to.
+        model_name (str): Model that made the embedding.
+        embedding (np.ndarray): Name/description embedding.
+        text_hash (str): Hash of the embedded text (see `app.field_text.text_hash`).
+        pooled (np.ndarray): Entity vector combining the embedding with the field embeddings, or None.
+        schema_version (int): Version of the entity's schema the pooled vector was built at.
+    """
+    existing = EntityEmbedding.query.filter_by(entity_id=entity_id, model_name=model_name).first()
+    if not existing:
+        existing = EntityEmbedding(entity_id=entity_id, model_name=model_name)
+        db.session.add(existing)
+    existing.embedding = np.array(embedding, dtype="float32").tobytes()
+    existing.text_hash = text_hash
+    existing.pooled = np.array(pooled, dtype="float32").tobytes() if pooled is not None else None
+    existing.schema_version = schema_version if pooled is not None else None
+    db.session.commit()
+
+def fetch_entity_level_embeddings(entity_ids, model_name):
+    """
+    Fetch the name/description embeddings of entities.
+
+    Returns:
+        dict: {entity_id: {"embedding", "text_hash", "pooled", "schema_version"}} for the entities that have one;
+              `pooled` is None if no entity vector is cached.
+    """
+    rows = EntityEmbedding.query.filter(
+        EntityEmbedding.entity_id.in_(entity_ids),
+        EntityEmbedding.model_name == model_name
+    ).all()
+    return {
+        row.entity_id: {
+            "embedding": np.frombuffer(row.embedding, dtype="float32"),
+            "text_hash": row.text_hash,
+            "pooled": np.frombuffer(row.pooled, dtype="float32") if row.pooled is not None else None,
+            "schema_version": row.schema_version,
+        }
+        for row in rows
+    }
+
+def store_projection(model_name, method, mean, components, sample_count, recall=None):
+    """
+    Store a new version of a model's projection.
+
+    Args:
+        model_name (str): Model whose embeddings were reduced.
+        method (str): Reduction method, e.g. "pca".
+        mean (np.ndarray): Mean subtracted before projecting (input_dimension,).
+        components (np.ndarray): Projection matrix (input_dimension, output_dimension).
+        sample_count (int): Number of embeddings the projection was fitted on.
+        recall (float): Recall@k of the reduced search against full-dimension search.
+
+    Returns:
+        int: The new version number.
+    """
+    try:
+        version = (db.session.query(db.func.max(EmbeddingProjection.version))
+                   .filter(EmbeddingProjection.model_name == model_name).scalar() or 0) + 1
+        components = np.asarray(components, dtype="float32")
+        db.session.add(EmbeddingProjection(
+            model_name=model_name,
+            version=version,
+            method=method,
+            input_dimension=components.shape[0],
+            output_dimension=components.shape[1],
+            mean=np.asarray(mean, dtype="float32").tobytes(),
+            components=components.tobytes(),
+            sample_count=sample_count,
+            recall=recall,
+        ))
+        db.session.commit()
+        return version
+    except Exception as e:
+        db.session.rollback()
+        raise RuntimeError(f"Error storing the projection in the database: {e}")
+
+def get_projection_version(model_name, method, output_dimension):
+    """
+    Newest version of a model's projection with the given method and output dimension, or None.
+    """
+    return (db.session.query(db.func.max(EmbeddingProjection.version))
+            .filter_by(model_name=model_name, method=method, output_dimension=output_dimension).scalar())
+
+def fetch_projection(model_name, method, output_dimension):
+    """
+    Fetch the newest projection of a model with the given method and output dimension.
+
+    Returns:
+        dict: version, method, mean, components, sample_count and recall, or None if there is none.
+    """
+    projection = EmbeddingProjection.query.filter_by(
+        model_name=model_name, method=method, output_dimension=output_dimension
+    ).order_by(EmbeddingProjection.version.desc()).first()
+    if not projection:
+        return None
+    return {
+        "version": projection.version,
+        "method": projection.method,
+        "mean": np.frombuffer(projection.mean, dtype="float32"),
+        "components": np.frombuffer(projection.components, dtype="float32").reshape(
+            projection.input_dimension, projection.output_dimension),
+        "sample_count": projection.sample_count,
+        "recall": projection.recall,
+    }
+
+def add_gold_mapping(source_schema_id, source_entity_name, source_field_name,
+                     target_schema_id, target_entity_name, target_field_name):
+    """
+    Record a correct source field -> target field mapping. Adding an existing mapping is a no-op.
+    """
+    values = dict(
+        source_schema_id=source_schema_id,
+        source_entity_name=source_entity_name,
+        source_field_name=source_field_name,
+        target_schema_id=target_schema_id,
+        target_entity_name=target_entity_name,
+        target_field_name=target_field_name,
+    )
+    gold_mapping = GoldMapping.query.filter_by(**values).first()
+    if not gold_mapping:
+        gold_mapping = GoldMapping(**values)
+        db.session.add(gold_mapping)
+        db.session.commit()
+    return gold_mapping
+
+def get_gold_mappings(source_schema_id, target_schema_id):
+    """
+    Get the gold mappings between two schemas.
+    """
+    gold_mappings = GoldMapping.query.filter_by(
+        source_schema_id=source_schema_id,
+        target_schema_id=target_schema_id
+    ).order_by(GoldMapping.id).all()
+
+    return [{
+        "id": gold_mapping.id,
+        "source_schema_id": gold_mapping.source_schema_id,
+        "source_entity_name": gold_mapping.source_entity_name,
+        "source_field_name": gold_mapping.source_field_name,
+        "target_schema_id": gold_mapping.target_schema_id,
+        "target_entity_name": gold_mapping.target_entity_name,
+        "target_field_name": gold_mapping.target_field_name,
+    } for gold_mapping in gold_mappings]
+
+MAPPING_STATUSES = ("accepted", "rejected")
+
+def confirm_mapping(source_schema_id, source_entity_name, source_field_name,
+                    target_schema_id, target_entity_name, target_field_name, status):
+    """
+    Record (or change) the decision about a source field -> target field mapping.
+
+    Args:
+        status (str): "accepted" or "rejected".
+
+    Returns:
+        ConfirmedMapping: The stored decision.
+    """
+    if status not in MAPPING_STATUSES:
+        raise ValueError(f"Unknown mapping status: {status}")
+    values = dict(
+        source_schema_id=source_schema_id,
+        source_entity_name=source_entity_name,
+        source_field_name=source_field_name,
+        target_schema_id=target_schema_id,
+        target_entity_name=target_entity_name,
+        target_field_name=target_field_name,
+    )
+    confirmed_mapping = ConfirmedMapping.query.filter_by(**values).first()
+    if confirmed_mapping:
+        confirmed_mapping.status = status
+    else:
+        confirmed_mapping = ConfirmedMapping(status=status, **values)
+        db.session.add(confirmed_mapping)
+    db.session.commit()
+    return confirmed_mapping
+
+def delete_confirmed_mapping(mapping_id):
+    confirmed_mapping = db.session.get(ConfirmedMapping, mapping_id)
+    if not confirmed_mapping:
+        return False
+
+    db.session.delete(confirmed_mapping)
+    db.session.commit()
+    return True
+
+def get_confirmed_mappings(source_schema_id, target_schema_ids=None, source_entity_name=None):
+    """
+    Get the decisions about mappings from a source schema (or one of its entities), optionally only towards the given
+    target schemas.
+    """
+    query = ConfirmedMapping.query.filter_by(source_schema_id=source_schema_id)
+    if target_schema_ids is not None:
+        query = query.filter(ConfirmedMapping.target_schema_id.in_(target_schema_ids))
+    if source_entity_name is not None:
+        query = query.filter_by(source_entity_name=source_entity_name)
+
+    return [{
+        "id": confirmed_mapping.id,
+        "source_schema_id": confirmed_mapping.source_schema_id,
+        "source_entity_name": confirmed_mapping.source_entity_name,
+        "source_field_name": confirmed_mapping.source_field_name,
+        "target_schema_id": confirmed_mapping.target_schema_id,
+        "target_entity_name": confirmed_mapping.target_entity_name,
+        "target_field_name": confirmed_mapping.target_field_name,
+        "status": confirmed_mapping.status,
+    } for confirmed_mapping in query.order_by(ConfirmedMapping.id)]
+
+def get_fields_with_embedding_hashes(entity_ids, model_name):
+    """
+    Get the fields of the given entities with their entity context and the text hash of their stored embedding.
+
+    Fields without an embedding for the model have a text_hash of None.
+    """
+    rows = (
+        db.session.query(Field, Entity.name, Entity.description, Embedding.text_hash)
+        .join(Entity, Entity.id == Field.entity_id)
+        .outerjoin(Embedding, (Embedding.field_id == Field.id) & (Embedding.model_name == model_name))
+        .filter(Field.entity_id.in_(entity_ids))
+        .all()
+    )
+    return [dict(field_dict(field), entity_id=field.entity_id, entity_name=entity_name,
+                 entity_description=entity_description, text_hash=text_hash)
+            for field, entity_name, entity_description, text_hash in rows]
+
+def sync_embedding_vectors(model_name=None, batch_size=1000):
+    """
+    Mirror stored embeddings into the pgvector table (e.g. after switching an existing database to pgvector).
+
+    Returns:
+        int: Number of vectors written.
+    """
+    synced_ids = {
+        (field_id, synced_model)
+        for field_id, synced_model in db.session.execute(
+            db.select(embedding_vectors.c.field_id, embedding_vectors.c.model_name)
+        )
+    }
+    query = db.session.query(Embedding, Field.entity_id).join(Field, Field.id == Embedding.field_id)
+    if model_name:
+        query = query.filter(Embedding.model_name == model_name)
+
+    rows = []
+    written = 0
+    for embedding, entity_id in query.yield_per(batch_size):
+        if (embedding.field_id, embedding.model_name) in synced_ids:
+            continue
+        rows.append({
+            "field_id": embedding.field_id,
+            "model_name": embedding.model_name,
+            "entity_id": entity_id,
+            "vector": np.frombuffer(embedding.embedding, dtype="float32"),
+        })
+        if len(rows) >= batch_size:
+            upsert_vectors(db.session, rows)
+            written += len(rows)
+            rows = []
+    upsert_vectors(db.session, rows)
+    written += len(rows)
+    db.session.commit()
+    return written
+
+def sync_vector_search(model_name):
+    """
+    Prepare in-database search for one model: mirror its missing vectors into pgvector and create its HNSW index.
+
+    Without this, a database switched to pgvector has an empty `embedding_vectors` table while every embedding looks
+    current, so in-database searches find nothing.
+
+    Returns:
+        int: Number of vectors written.
+    """
+    written = sync_embedding_vectors(model_name)
+    embedding = Embedding.query.filter_by(model_name=model_name).first()
+    if embedding is not None:
+        create_vector_index(db.session, model_name, np.frombuffer(embedding.embedding, dtype="float32").size)
+    return written
+
+def acquire_work_lock(key, owner, ttl):
+    """
+    Take the lease `key` for `ttl` seconds unless another owner holds an unexpired one.
+
+    Returns:
+        bool: True if `owner` now holds the lease.
+    """
+    now = time.time()
+    try:
+        WorkLock.query.filter(WorkLock.key == key, WorkLock.expires_at < now).delete(synchronize_session=False)
+        db.session.add(WorkLock(key=key, owner=owner, expires_at=now + ttl))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def release_work_lock(key, owner):
+    try:
+        WorkLock.query.filter_by(key=key, owner=owner).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise RuntimeError(f"Error releasing work lock {key}: {str(e)}")
+
+def replace_field_clusters(model_name, field_ids, clusters):
+    """
+    Replace the stored clusters of the given fields.
+
+    Args:
+        model_name (str): Model the clusters were computed with.
+        field_ids (list): Every field the clustering covered; their previous memberships are removed.
+        clusters (list): (field_id, cluster_id, similarity) memberships.
+    """
+    try:
+        for start in range(0, len(field_ids), 1000):
+            FieldCluster.query.filter(
+                FieldCluster.model_name == model_name, FieldCluster.field_id.in_(field_ids[start:start + 1000])
+            ).delete(synchronize_session=False)
+        db.session.add_all([FieldCluster(model_name=model_name, field_id=field_id, cluster_id=cluster_id,
+                                         similarity=similarity) for field_id, cluster_id, similarity in clusters])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise RuntimeError(f"Error storing field clusters: {str(e)}")
+
+def drop_field_clusters(field_ids):
+    """
+    Forget the clusters of changed or removed fields, for every model, along with the clusters they represent.
+
+    A changed field may no longer resemble its cluster, and the members of a cluster were only grouped because they
+    resembled its representative; the affected fields are clustered again the next time clustering runs.
+    """
+    for start in range(0, len(field_ids), 1000):
+        chunk = field_ids[start:start + 1000]
+        FieldCluster.query.filter(
+            FieldCluster.field_id.in_(chunk) | FieldCluster.cluster_id.in_(chunk)
+        ).delete(synchronize_session=False)
+
+def get_field_clusters(model_name, field_ids):
+    """{field_id: cluster_id} of the given fields that belong to a cluster."""
+    return dict(
+        db.session.query(FieldCluster.field_id, FieldCluster.cluster_id)
+        .filter(FieldCluster.model_name == model_name, FieldCluster.field_id.in_(field_ids))
+    )
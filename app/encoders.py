@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEncoder:
+    """
+    Deterministic, dependency-free stand-in for a SentenceTransformer.
+
+    Texts are tokenized into lowercase words and character trigrams, which are hashed (crc32, so results are
+    stable across processes) into a fixed number of signed buckets and L2-normalized. Similar field names and
+    descriptions therefore land close together, which is enough to exercise the matching pipeline offline in
+    tests and benchmarks.
+    """
+
+    def __init__(self, dimension=256):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _features(self, text):
+        for word in TOKEN_PATTERN.findall(text.lower()):
+            yield word
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def encode(self, texts, convert_to_numpy=True, convert_to_tensor=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for feature in self._features(text or ""):
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dimension] += sign
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+ONNX_CONFIG_FILE = "onnx_config.json"
+
+# Minimum cosine similarity between PyTorch and ONNX embeddings for an export to pass the equivalence check.
+ONNX_MIN_COSINE = 0.999
+ONNX_QUANTIZED_MIN_COSINE = 0.97
+
+EQUIVALENCE_TEXTS = [
+    "Field: customer id. Description: Unique identifier of the customer",
+    "Field: email. Description: Email address",
+    "Field: putType. Description: Put option type. Values include: 'A' American, 'B' Bermudan, 'E' European, "
+    "'S' Asian. Full list of valid values are in the CALL_PUT_TYPE decode.",
+    "Field: qty",
+]
+
+
+def embedding_model_name(model_config):
+    """
+    Name a model's embeddings are stored under.
+
+    ONNX exports, and int8-quantized ones even more, produce slightly different vectors than the PyTorch model, so
+    their embeddings are stored apart from it, as "<name>@onnx" and "<name>@onnx-int8".
+    """
+    if model_config.get("backend", "torch") != "onnx":
+        return model_config["name"]
+    return f"{model_config['name']}@onnx-int8" if model_config.get("quantize") else f"{model_config['name']}@onnx"
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError("The onnx backend requires onnxruntime (pip install onnxruntime onnx).") from e
+    return onnxruntime
+
+
+class OnnxEncoder:
+    """
+    SentenceTransformer-compatible encoder that runs an exported model through ONNX Runtime on the CPU.
+
+    Args:
+        model_dir (str): Directory written by `export_onnx` (tokenizer, ONNX model(s) and onnx_config.json).
+        quantized (bool): Use the int8 dynamically quantized model.
+        intra_op_threads (int): Threads used inside an operator; defaults to the number of CPUs.
+        batch_size (int): Texts per inference call.
+    """
+
+    def __init__(self, model_dir, quantized=False, intra_op_threads=None, batch_size=32):
+        onnxruntime = _require_onnxruntime()
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE)) as f:
+            self.onnx_config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = self.onnx_config["max_seq_length"]
+        self.batch_size = batch_size
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, model_file), options,
+                                                    providers=["CPUExecutionProvider"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.onnx_config["dimension"]
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, convert_to_tensor=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = batch_size or self.batch_size
+
+        embeddings = np.zeros((len(texts), self.get_sentence_embedding_dimension()), dtype="float32")
+        # Batching texts of similar length keeps padding (and wasted compute) low.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i] or ""))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            features = self.tokenizer([texts[i] or "" for i in batch], padding=True, truncation=True,
+                                      max_length=self.max_seq_length, return_tensors="np")
+            outputs = self.session.run(None, {
+                "input_ids": features["input_ids"].astype("int64"),
+                "attention_mask": features["attention_mask"].astype("int64"),
+            })
+            embeddings[batch] = outputs[0]
+        return embeddings
+
+
+def export_onnx(model, output_dir, quantize=False, opset_version=17):
+    """
+    Export a SentenceTransformer (transformer, pooling and normalization) to ONNX.
+
+    Args:
+        model (SentenceTransformer): Model to export.
+        output_dir (str): Directory for the tokenizer, model.onnx, model_quantized.onnx (with `quantize`) and
+            onnx_config.json.
+        quantize (bool): Also write an int8 dynamically quantized copy.
+        opset_version (int): ONNX opset.
+
+    Returns:
+        str: `output_dir`.
+    """
+    _require_onnxruntime()
+    import torch
+
+    class SentenceEmbedding(torch.nn.Module):
+        def __init__(self, sentence_transformer):
+            super().__init__()
+            self.sentence_transformer = sentence_transformer
+
+        def forward(self, input_ids, attention_mask):
+            features = {"input_ids": input_ids, "attention_mask": attention_mask}
+            return self.sentence_transformer(features)["sentence_embedding"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = model.to("cpu").eval()
+    features = model.tokenizer(EQUIVALENCE_TEXTS[:2], padding=True, truncation=True,
+                               max_length=model.max_seq_length, return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            SentenceEmbedding(model),
+            (features["input_ids"], features["attention_mask"]),
+            os.path.join(output_dir, ONNX_MODEL_FILE),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["sentence_embedding"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "sentence_embedding": {0: "batch"},
+            },
+            opset_version=opset_version,
+            dynamo=False,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(os.path.join(output_dir, ONNX_MODEL_FILE),
+                         os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    model.tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump({
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "quantized": quantize,
+        }, f, indent=2)
+    return output_dir
+
+
+def check_equivalence(reference, candidate, texts=None, min_cosine=ONNX_MIN_COSINE):
+    """
+    Compare the embeddings of two encoders (e.g. the PyTorch model and its ONNX export).
+
+    Args:
+        reference: Encoder with a SentenceTransformer-style `encode`.
+        candidate: Encoder to check.
+        texts (list): Texts to embed; defaults to a few field texts of different lengths.
+        min_cosine (float): Lowest acceptable cosine similarity between corresponding embeddings.
+
+    Returns:
+        dict: {"min_cosine", "max_abs_diff", "passed"}
+    """
+    texts = texts or EQUIVALENCE_TEXTS
+    expected = np.asarray(reference.encode(texts, convert_to_numpy=True), dtype="float32")
+    actual = np.asarray(candidate.encode(texts, convert_to_numpy=True), dtype="float32")
+    cosine = (expected * actual).sum(axis=1) / np.maximum(
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1), 1e-12)
+    return {
+        "min_cosine": float(cosine.min()),
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "passed": bool(cosine.min() >= min_cosine),
+    }
@@ -0,0 +1,152 @@
+"""
+Match-quality evaluation against stored gold mappings.
+
+Runs `match_fields` for each (model, index) configuration over every source entity that has gold mappings and reports
+recall@k, mean reciprocal rank and per-entity latency side by side.
+"""
+import time
+
+import numpy as np
+
+from app.database import Entity, db, get_entities_by_ids, get_entities_by_names, get_gold_mappings
+
+DEFAULT_KS = (1, 3, 5)
+
+
+def load_gold_set(source_schema_id, target_schema_id):
+    """
+    Resolve the gold mappings of a schema pair against the current entities.
+
+    Args:
+        source_schema_id (int): Source schema id.
+        target_schema_id (int): Target schema id.
+
+    Returns:
+        tuple: (source_entities, target_entities, expected, unresolved) where the entities are dicts as returned by
+               `get_entities_by_ids`, `expected` maps (source_entity_id, source_field_name) to the set of correct
+               (target_entity_id, target_field_name) pairs, and `unresolved` counts gold mappings whose source or
+               target no longer exists.
+    """
+    gold_mappings = get_gold_mappings(source_schema_id, target_schema_id)
+
+    source_names = sorted({gold["source_entity_name"] for gold in gold_mappings})
+    source_entities = get_entities_by_names(source_schema_id, source_names) if source_names else []
+    target_entity_ids = [entity_id for (entity_id,) in
+                         db.session.query(Entity.id).filter(Entity.schema_id == target_schema_id)]
+    target_entities = get_entities_by_ids(target_entity_ids) if target_entity_ids else []
+
+    source_fields = {(entity["name"], field["name"]): entity["id"]
+                     for entity in source_entities for field in entity["fields"]}
+    target_fields = {(entity["name"], field["name"]): entity["id"]
+                     for entity in target_entities for field in entity["fields"]}
+
+    expected = {}
+    unresolved = 0
+    for gold in gold_mappings:
+        source_key = (gold["source_entity_name"], gold["source_field_name"])
+        target_key = (gold["target_entity_name"], gold["target_field_name"])
+        if source_key not in source_fields or target_key not in target_fields:
+            unresolved += 1
+            continue
+        expected.setdefault((source_fields[source_key], gold["source_field_name"]), set()).add(
+            (target_fields[target_key], gold["target_field_name"])
+        )
+
+    source_entities = [entity for entity in source_entities
+                       if any((entity["id"], field["name"]) in expected for field in entity["fields"])]
+    return source_entities, target_entities, expected, unresolved
+
+
+def rank_of(matches, expected_targets):
+    """1-based rank of the first correct match, or None if no correct target was returned."""
+    for rank, match in enumerate(matches, start=1):
+        if (match["target_entity_id"], match["target_field_name"]) in expected_targets:
+            return rank
+    return None
+
+
+def evaluate_configuration(source_entities, target_entities, expected, model_name, index_spec="Flat",
+                           ks=DEFAULT_KS, warmup=True):
+    """
+    Evaluate one model/index configuration over a resolved gold set.
+
+    Args:
+        source_entities (list): Source entities with gold mappings.
+        target_entities (list): Candidate target entities.
+        expected (dict): Gold set as returned by `load_gold_set`.
+        model_name (str): Model to evaluate.
+        index_spec (str): FAISS index factory string.
+        ks (tuple): Cut-offs to report recall at.
+        warmup (bool): Run every source entity once before timing so that latency excludes one-off embedding
+            generation (reported separately as `cold_seconds`).
+
+    Returns:
+        dict: Quality and latency metrics for the configuration.
+    """
+    # Deferred so that loading and storing gold sets never loads the embedding models.
+    from app.match import match_fields
+
+    max_k = max(ks)
+    cold_seconds = None
+    if warmup:
+        start = time.perf_counter()
+        for source_entity in source_entities:
+            match_fields(source_entity, target_entities, model_name, k=max_k, index_spec=index_spec)
+        cold_seconds = time.perf_counter() - start
+
+    latencies = []
+    ranks = []
+    for source_entity in source_entities:
+        start = time.perf_counter()
+        field_mappings = match_fields(source_entity, target_entities, model_name, k=max_k, index_spec=index_spec)
+        latencies.append(time.perf_counter() - start)
+
+        for field in source_entity["fields"]:
+            expected_targets = expected.get((source_entity["id"], field["name"]))
+            if expected_targets:
+                ranks.append(rank_of(field_mappings.get(field["name"], []), expected_targets))
+
+    result = {
+        "model_name": model_name,
+        "index_spec": index_spec,
+        "queries": len(ranks),
+    }
+    for k in ks:
+        result[f"recall@{k}"] = (
+            sum(1 for rank in ranks if rank is not None and rank <= k) / len(ranks) if ranks else 0.0
+        )
+    result["mrr"] = sum(1.0 / rank for rank in ranks if rank is not None) / len(ranks) if ranks else 0.0
+
+    latencies_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    result["latency_p50_ms"] = float(np.percentile(latencies_ms, 50))
+    result["latency_p95_ms"] = float(np.percentile(latencies_ms, 95))
+    result["cold_seconds"] = cold_seconds
+    return result
+
+
+def evaluate(source_schema_id, target_schema_id, configurations, ks=DEFAULT_KS, warmup=True):
+    """
+    Evaluate several (model_name, index_spec) configurations against the gold mappings of a schema pair.
+
+    Returns:
+        dict: {"unresolved": int, "results": [per-configuration metrics]}
+    """
+    source_entities, target_entities, expected, unresolved = load_gold_set(source_schema_id, target_schema_id)
+    results = [
+        evaluate_configuration(source_entities, target_entities, expected, model_name, index_spec, ks, warmup)
+        for model_name, index_spec in configurations
+    ]
+    return {"unresolved": unresolved, "results": results}
+
+
+def format_report(results, ks=DEFAULT_KS):
+    """Render evaluation results as a fixed-width table."""
+    columns = ["model", "index", "queries"] + [f"R@{k}" for k in ks] + ["MRR", "p50 ms", "p95 ms"]
+    widths = [32, 14, 8] + [8] * len(ks) + [8, 10, 10]
+    lines = ["".join(f"{column:<{width}}" for column, width in zip(columns, widths))]
+    for result in results:
+        values = [result["model_name"], result["index_spec"], str(result["queries"])]
+        values += [f"{result[f'recall@{k}']:.3f}" for k in ks]
+        values += [f"{result['mrr']:.3f}", f"{result['latency_p50_ms']:.1f}", f"{result['latency_p95_ms']:.1f}"]
+        lines.append("".join(f"{value:<{width}}" for value, width in zip(values, widths)))
+    return "\n".join(lines)
@@ -0,0 +1,220 @@
+import csv
+import io
+
+from app.confirmed import decisions_key, field_decisions
+from app.database import (
+    Entity, FieldMatch, FieldMatchTarget, db, field_dict, get_entities_by_ids, match_cache_key,
+    store_matching_data_in_db,
+)
+from app.reduction import reduction_key
+from app.serialization import dumps
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = [
+    "source_schema_id",
+    "source_entity_id",
+    "source_entity_name",
+    "source_field_name",
+    "target_schema_id",
+    "target_entity_id",
+    "target_field_id",
+    "target_field_name",
+    "rank",
+    "score",
+    "model_name",
+    "origin",
+]
+
+
+def _mapping_rows(source_entity, target_schema_id, target_entity_ids, model_name, field_mappings, min_score, origin):
+    """
+    Flatten one stored/fresh field mapping dictionary into export rows.
+
+    Only matches pointing at entities of the target schema (and above `min_score`) are kept.
+    """
+    for source_field_name, matches in field_mappings.items():
+        rank = 0
+        for match in matches:
+            if match["target_entity_id"] not in target_entity_ids:
+                continue
+            if min_score is not None and match["score"] < min_score:
+                continue
+            rank += 1
+            yield {
+                "source_schema_id": source_entity.schema_id,
+                "source_entity_id": source_entity.id,
+                "source_entity_name": source_entity.name,
+                "source_field_name": source_field_name,
+                "target_schema_id": target_schema_id,
+                "target_entity_id": match["target_entity_id"],
+                "target_field_id": match["target_field_id"],
+                "target_field_name": match["target_field_name"],
+                "rank": rank,
+                "score": float(match["score"]),
+                "model_name": model_name,
+                "origin": origin,
+            }
+
+
+def iter_match_rows(source_schema_id, target_schema_id, model_name=None, min_score=None, include_fresh=False,
+                    batch_size=100, top_entities=None):
+    """
+    Lazily yield one row per (source field, target field) match for a schema pair.
+
+    Stored `field_matches` are read in batches of `batch_size` so memory stays flat regardless of schema size. When
+    a source entity has several stored results for a model that searched the target schema (different targets or
+    match options), the most recent one is exported; dirty results (waiting for a refresh, see `app.refresh`) and
+    results computed against other schemas are skipped. With `include_fresh`, source entities that have no such
+    stored matches for `model_name` are matched on the fly, applying their confirmed and rejected mappings (and the
+    result is cached like `/api/match-entities/` does, sharing its single-flight and work lock).
+
+    Args:
+        source_schema_id (int): Schema whose entities are the match sources.
+        target_schema_id (int): Schema whose entities are the match targets.
+        model_name (str): Only export matches produced by this model. Required with `include_fresh`.
+        min_score (float): Drop matches scoring below this value.
+        include_fresh (bool): Compute matches for source entities that have none stored.
+        batch_size (int): Number of rows fetched from the database per round trip.
+        top_entities (int): With `include_fresh`, match each source entity only against its `top_entities` most
+            similar target entities (see `app.blocking`); defaults to `DEFAULT_TOP_ENTITIES`, as in
+            `/api/match-entities/`, so that both cache under the same key.
+
+    Returns:
+        Iterator[dict]: Rows keyed by `EXPORT_COLUMNS`.
+    """
+    if include_fresh and not model_name:
+        raise ValueError("model_name is required to compute fresh matches.")
+
+    target_entity_ids = {
+        entity_id for (entity_id,) in db.session.query(Entity.id).filter(Entity.schema_id == target_schema_id)
+    }
+    if not target_entity_ids:
+        return
+
+    # Results that searched an entity of the target schema, and results stored before their targets were recorded
+    # (which only qualify if one of their matches points at the target schema).
+    searched_target_schema = (
+        db.session.query(FieldMatchTarget.id)
+        .filter(FieldMatchTarget.field_match_id == FieldMatch.id,
+                FieldMatchTarget.target_entity_id.in_(target_entity_ids))
+        .exists()
+    )
+    # Selected as a column so that the stream does not lazy-load the targets of every row.
+    query = (
+        db.session.query(FieldMatch, Entity, FieldMatch.targets.any())
+        .join(Entity, Entity.id == FieldMatch.source_entity_id)
+        .filter(Entity.schema_id == source_schema_id, FieldMatch.dirty.is_(False),
+                searched_target_schema | ~FieldMatch.targets.any())
+        .order_by(Entity.id, FieldMatch.model_name, FieldMatch.id.desc())
+    )
+    if model_name:
+        query = query.filter(FieldMatch.model_name == model_name)
+
+    matched_entity_ids = set()
+    exported = None
+    for field_match, source_entity, has_targets in query.yield_per(batch_size):
+        if (source_entity.id, field_match.model_name) == exported:
+            continue
+        if not has_targets and not any(match["target_entity_id"] in target_entity_ids
+                                               for matches in field_match.field_mappings.values()
+                                               for match in matches):
+            continue
+        exported = (source_entity.id, field_match.model_name)
+        matched_entity_ids.add(source_entity.id)
+        yield from _mapping_rows(source_entity, target_schema_id, target_entity_ids, field_match.model_name,
+                                 field_match.field_mappings, min_score, "stored")
+
+    if not include_fresh:
+        return
+
+    # Deferred so that exporting stored matches never loads the embedding models.
+    from app.blocking import DEFAULT_TOP_ENTITIES, block_entities
+    from app.confirmed import resolved_fields
+    from app.match import match_fields
+    from app.singleflight import match_once
+
+    unmatched_entities = (
+        Entity.query
+        .filter(Entity.schema_id == source_schema_id, Entity.id.notin_(matched_entity_ids))
+        .order_by(Entity.id)
+        .all()
+    )
+    if not unmatched_entities:
+        return
+
+    target_entities = get_entities_by_ids(list(target_entity_ids))
+    options = {"hybrid": False, "short_circuit": False, "type_filter": True,
+               "top_entities": top_entities or DEFAULT_TOP_ENTITIES}
+    reduction = reduction_key(model_name)
+    if reduction:
+        options["reduction"] = reduction
+    for source_entity in unmatched_entities:
+        source_entity_data = {
+            "id": source_entity.id,
+            "name": source_entity.name,
+            "description": source_entity.description,
+            "schema_id": source_entity.schema_id,
+            "fields": [field_dict(field) for field in source_entity.fields]
+        }
+        # Accepted and rejected mappings apply (and key the cache) as in `/api/match-entities/`.
+        decisions = field_decisions(source_entity_data, target_entities)
+        entity_options = dict(options)
+        confirmed_key = decisions_key(decisions)
+        if confirmed_key:
+            entity_options["confirmed"] = confirmed_key
+        cache_key = match_cache_key(list(target_entity_ids), **entity_options)
+
+        def compute():
+            # Fields with an accepted mapping need no candidates, so blocking is skipped once every field is decided.
+            candidates = target_entities
+            if len(resolved_fields(source_entity_data, decisions)) < len(source_entity_data["fields"]):
+                blocked = block_entities([source_entity_data], target_entities, model_name, options["top_entities"])
+                candidates = [entity for entity, _ in blocked[source_entity_data["id"]]]
+            field_mappings = match_fields(source_entity_data, candidates, model_name, confirmed=decisions)
+            store_matching_data_in_db(source_entity_data, model_name, field_mappings, cache_key,
+                                      target_entity_ids=target_entity_ids, match_options=entity_options)
+            return field_mappings
+
+        field_mappings = match_once(source_entity_data, model_name, cache_key, compute)
+        yield from _mapping_rows(source_entity, target_schema_id, target_entity_ids, model_name,
+                                 field_mappings, min_score, "fresh")
+
+
+def iter_ndjson(rows):
+    """Encode rows as newline-delimited JSON, one line per row."""
+    for row in rows:
+        yield dumps(row).decode("utf-8") + "\n"
+
+
+def iter_csv(rows, chunk_size=500):
+    """
+    Encode rows as CSV (with a header line), emitting text in chunks of `chunk_size` rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue()
+
+
+def encode_rows(rows, export_format):
+    """Return a generator of text chunks for the given export format."""
+    if export_format == "ndjson":
+        return iter_ndjson(rows)
+    if export_format == "csv":
+        return iter_csv(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,27 @@
+"""
+Application factory for the database layer.
+
+`create_app` configures storage exactly like `main.py` but registers no routes and imports nothing from the matching
+engine, so schema imports and CLIs get an app context without loading torch, FAISS or the embedding models.
+"""
+from flask import Flask
+
+from app.database import db
+from app.storage import init_storage
+
+
+def create_app(import_name=__name__, database_url=None):
+    """
+    Create a Flask app bound to the database.
+
+    Args:
+        import_name (str): Flask import name; decides where templates and static files are looked up.
+        database_url (str): Overrides `DATABASE_URL` (see app/storage.py).
+
+    Returns:
+        Flask: The configured app.
+    """
+    app = Flask(import_name)
+    # Database URL, pooling and sqlite/pgvector tuning come from the environment (see app/storage.py).
+    init_storage(app, db, database_url)
+    return app
@@ -0,0 +1,151 @@
+"""
+Construction of the text that is embedded for a field.
+
+Every model renders its fields through a template (`"text_template"` in the model config, `DEFAULT_TEMPLATE`
+otherwise). Templates can use the field's name, description, type and enum values and the name and description of its
+entity; identifiers are split on camelCase and underscores first. The hash of the rendered text is stored next to the
+embedding, so changing a template (or the normalization) re-embeds only the fields whose text changed. Texts are
+truncated to what the model actually reads when they are embedded (see `truncate_text`); hashes are computed before
+truncation so that detecting stale embeddings never needs the model itself.
+"""
+import hashlib
+import re
+import string
+
+# Kept equal to the text embedded before templates existed, so that existing snake_case embeddings stay valid.
+DEFAULT_TEMPLATE = "Field: {name}. Description: {description}"
+
+# Parts of a list template are joined with spaces; parts whose placeholders are all empty are left out.
+DETAILED_TEMPLATE = [
+    "Field: {name}.",
+    "Type: {type}.",
+    "Allowed values: {enum}.",
+    "Entity: {entity}.",
+    "Entity description: {entity_description}.",
+    "Description: {description}",
+]
+
+# Splits camelCase and PascalCase (keeping acronyms such as "ID" together) and letter/digit boundaries.
+CAMEL_CASE_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|(?<=[A-Za-z])(?=\d)")
+
+# Tokens reserved for the special tokens ([CLS]/[SEP] or <s>/</s>) a local model adds to every input.
+SPECIAL_TOKENS = 2
+
+
+def normalize_identifier(name):
+    """Split an identifier into space-separated words, keeping their case (`customerID_no` -> "customer ID no")."""
+    if not name:
+        return ""
+    return " ".join(CAMEL_CASE_BOUNDARY.sub(" ", name.replace("_", " ").replace("-", " ")).split())
+
+
+def template_values(field, entity=None):
+    """
+    Placeholder values for a field.
+
+    Args:
+        field (dict): Field dict with name and description and optionally type, enum, entity_name and
+            entity_description.
+        entity (dict): The field's entity (name and description); overrides the entity keys of `field`.
+
+    Returns:
+        dict: Values for name, description, type, enum, entity and entity_description.
+    """
+    enum = field.get("enum") or ""
+    if isinstance(enum, (list, tuple)):
+        enum = ", ".join(str(value) for value in enum)
+    entity_name = entity.get("name") if entity else field.get("entity_name")
+    entity_description = entity.get("description") if entity else field.get("entity_description")
+    return {
+        "name": normalize_identifier(field["name"]),
+        "description": field.get("description"),
+        "type": field.get("type") or "",
+        "enum": enum,
+        "entity": normalize_identifier(entity_name),
+        "entity_description": entity_description or "",
+    }
+
+
+def render_template(template, values):
+    """
+    Render a template string, or a list of template parts (see `DETAILED_TEMPLATE`).
+
+    Raises:
+        ValueError: If the template uses an unknown placeholder.
+    """
+    parts = [template] if isinstance(template, str) else template
+    rendered = []
+    for part in parts:
+        names = [name for _, name, _, _ in string.Formatter().parse(part) if name]
+        unknown = [name for name in names if name not in values]
+        if unknown:
+            raise ValueError(f"Unknown placeholder(s) in field text template: {', '.join(unknown)}")
+        if isinstance(template, str) or any(values[name] for name in names):
+            rendered.append(part.format_map(values))
+    return " ".join(rendered)
+
+
+def max_input_tokens(model_config):
+    """Number of tokens the model reads per input (`"max_tokens"` in the config overrides it), or None if unknown."""
+    if model_config.get("max_tokens"):
+        return model_config["max_tokens"]
+    if model_config.get("provider") == "openai":
+        from app.openai_client import MAX_INPUT_TOKENS
+
+        return MAX_INPUT_TOKENS
+    max_seq_length = getattr(model_config.get("instance"), "max_seq_length", None)
+    return max_seq_length - SPECIAL_TOKENS if max_seq_length else None
+
+
+def truncate_text(model_config, text):
+    """
+    Cut `text` to the tokens the model actually reads (OpenAI rejects inputs over the limit).
+
+    Local models are measured with their own tokenizer and OpenAI models with `count_tokens`. Texts that cannot
+    exceed the limit (no more UTF-8 bytes than tokens allowed) are returned without tokenizing.
+    """
+    limit = max_input_tokens(model_config)
+    if not limit or len(text.encode("utf-8")) <= limit:
+        return text
+    if model_config.get("provider") == "openai":
+        from app.openai_client import count_tokens, tiktoken
+
+        if count_tokens(text) <= limit:
+            return text
+        if tiktoken is None:
+            return text[:4 * (limit - 1)]
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return encoding.decode(encoding.encode(text)[:limit])
+
+    tokenizer = getattr(model_config.get("instance"), "tokenizer", None)
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        return text
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= limit:
+        return text
+    return text[:offsets[limit - 1][1]]
+
+
+def build_field_text(model_config, field, entity=None):
+    """
+    Text embedded for a field by a model.
+
+    Args:
+        model_config (dict): Model config; `"text_template"` selects the template.
+        field (dict): Field dict (see `template_values`).
+        entity (dict): The field's entity, for templates that use entity context.
+
+    Returns:
+        str: The rendered text.
+    """
+    return render_template(model_config.get("text_template", DEFAULT_TEMPLATE), template_values(field, entity))
+
+
+def text_hash(text):
+    """Hash of an embedded text, stored with the embedding to detect stale vectors."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def template_fingerprint(model_config):
+    """Hash of a model's field text template; changes when the template changes."""
+    return text_hash(repr(model_config.get("text_template", DEFAULT_TEMPLATE)))
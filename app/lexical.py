@@ -0,0 +1,185 @@
+"""
+Lexical matching of field names and descriptions.
+
+Identifiers are split on camelCase, snake_case, kebab-case and digit boundaries and common abbreviations are expanded,
+so `custId`, `customer_id` and `CUSTOMER-ID` all normalize to "customer id". A BM25 index over the target fields
+complements the dense (FAISS) search: fused scores recover short, cryptic names the embedding models handle poorly, and
+near-exact name matches can be answered without calling a model at all.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+ABBREVIATIONS = {
+    "acct": ["account"],
+    "addr": ["address"],
+    "amt": ["amount"],
+    "avg": ["average"],
+    "bal": ["balance"],
+    "ccy": ["currency"],
+    "cd": ["code"],
+    "cnt": ["count"],
+    "ctry": ["country"],
+    "cur": ["currency"],
+    "cust": ["customer"],
+    "desc": ["description"],
+    "dob": ["date", "of", "birth"],
+    "dt": ["date"],
+    "emp": ["employee"],
+    "fname": ["first", "name"],
+    "lname": ["last", "name"],
+    "max": ["maximum"],
+    "min": ["minimum"],
+    "msg": ["message"],
+    "nbr": ["number"],
+    "nm": ["name"],
+    "no": ["number"],
+    "num": ["number"],
+    "org": ["organization"],
+    "pct": ["percent"],
+    "ph": ["phone"],
+    "qty": ["quantity"],
+    "ref": ["reference"],
+    "tel": ["phone"],
+    "telephone": ["phone"],
+    "ts": ["timestamp"],
+    "txn": ["transaction"],
+    "zip": ["postal", "code"],
+}
+
+STOPWORDS = {"a", "an", "and", "are", "as", "by", "for", "from", "in", "is", "it", "of", "on", "or", "the", "this",
+             "to", "which", "with"}
+
+
+def split_identifier(name):
+    """Split an identifier into lowercase words (`customerID_v2` -> ["customer", "id", "v", "2"])."""
+    return [part.lower() for part in IDENTIFIER_PATTERN.findall(name or "")]
+
+
+def tokenize(text):
+    """Split identifiers and free text into lowercase, abbreviation-expanded tokens without stopwords."""
+    tokens = []
+    for word in split_identifier(text):
+        for token in ABBREVIATIONS.get(word, [word]):
+            if token not in STOPWORDS:
+                tokens.append(token)
+    return tokens
+
+
+def normalize_name(name):
+    """Canonical form of a field name used for near-exact matching."""
+    return " ".join(tokenize(name))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over field documents (name tokens weighted `name_weight` times, plus description tokens).
+
+    Args:
+        fields (list): Field dicts with name and description.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalization.
+        name_weight (int): How many times name tokens are counted relative to description tokens.
+    """
+
+    def __init__(self, fields, k1=1.2, b=0.75, name_weight=2):
+        self.k1 = k1
+        self.b = b
+        self.size = len(fields)
+        self.names = [normalize_name(field["name"]) for field in fields]
+        self.postings = defaultdict(list)
+        self.lengths = np.zeros(self.size, dtype="float32")
+
+        for doc_id, field in enumerate(fields):
+            tokens = tokenize(field["name"]) * name_weight + tokenize(field.get("description") or "")
+            self.lengths[doc_id] = len(tokens)
+            for token, count in Counter(tokens).items():
+                self.postings[token].append((doc_id, count))
+
+        self.average_length = float(self.lengths.mean()) if self.size else 0.0
+        self.idf = {
+            token: math.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+        self._exact = defaultdict(list)
+        for doc_id, name in enumerate(self.names):
+            if name:
+                self._exact[name].append(doc_id)
+
+    def scores(self, query):
+        """BM25 score of every document for a query string (field name and/or description)."""
+        scores = np.zeros(self.size, dtype="float32")
+        if not self.size:
+            return scores
+        length_norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1e-9))
+        for token in set(tokenize(query)):
+            docs = self.postings.get(token)
+            if not docs:
+                continue
+            doc_ids = np.fromiter((doc_id for doc_id, _ in docs), dtype="int64", count=len(docs))
+            tf = np.fromiter((count for _, count in docs), dtype="float32", count=len(docs))
+            scores[doc_ids] += self.idf[token] * tf * (self.k1 + 1) / (tf + length_norm[doc_ids])
+        return scores
+
+    def search(self, query, k=5):
+        """
+        Top-k documents for a query.
+
+        Returns:
+            list: (doc_id, score, normalized_score) tuples, best first; normalized scores are divided by the best
+                  score so they fall in [0, 1].
+        """
+        scores = self.scores(query)
+        if not self.size:
+            return []
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        best = float(scores[top[0]])
+        if best <= 0:
+            return []
+        return [(int(doc_id), float(scores[doc_id]), float(scores[doc_id]) / best)
+                for doc_id in top if scores[doc_id] > 0]
+
+    def exact_matches(self, name):
+        """Documents whose normalized name equals the normalized `name`."""
+        normalized = normalize_name(name)
+        return list(self._exact.get(normalized, [])) if normalized else []
+
+
+def fuse(dense_matches, lexical_matches, lexical_weight=0.3, k=5):
+    """
+    Combine dense and lexical candidates into one ranking.
+
+    The fused score is `(1 - lexical_weight) * dense_score + lexical_weight * normalized_bm25`. Candidates only found
+    lexically get the lowest dense score of the dense candidates (an upper bound of what the dense search would have
+    given them), and candidates only found densely get a lexical score of 0.
+
+    Args:
+        dense_matches (list): Match dicts with "target_field_id" and "score" (dense similarity).
+        lexical_matches (list): Match dicts with "target_field_id" and "lexical_score" (normalized BM25).
+        lexical_weight (float): Weight of the lexical score.
+        k (int): Number of results.
+
+    Returns:
+        list: Match dicts with "score" (fused), "dense_score" and "lexical_score", best first.
+    """
+    dense_floor = min((match["score"] for match in dense_matches), default=0.0)
+    candidates = {}
+    for match in dense_matches:
+        candidates[match["target_field_id"]] = {**match, "dense_score": match["score"], "lexical_score": 0.0}
+    for match in lexical_matches:
+        candidate = candidates.get(match["target_field_id"])
+        if candidate:
+            candidate["lexical_score"] = match["lexical_score"]
+        else:
+            candidates[match["target_field_id"]] = {**match, "dense_score": dense_floor}
+
+    for candidate in candidates.values():
+        candidate["score"] = ((1 - lexical_weight) * candidate["dense_score"]
+                              + lexical_weight * candidate["lexical_score"])
+    return sorted(candidates.values(), key=lambda candidate: candidate["score"], reverse=True)[:k]
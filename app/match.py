@@ -1,28 +1,130 @@
-import faiss
-import torch
-from sentence_transformers import SentenceTransformer
+"""
+Field matching engine: model loading, field embeddings and FAISS/pgvector search.
+
+torch, faiss, sentence-transformers and the OpenAI client are imported on first use rather than at module load, so
+that processes that only need the database layer (CRUD endpoints, schema imports) never pay their startup cost.
+"""
+import logging
+import os
+import threading
+
 import numpy as np
-from openai import OpenAI
 
-from app.database import fetch_entity_embeddings, get_schema_entities, store_embedding
+from flask import current_app
 
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+from app.clustering import representative_groups
+from app.database import (
+    db,
+    fetch_entity_embeddings,
+    get_field_clusters,
+    get_fields_with_embedding_hashes,
+    store_embeddings,
+)
+from app.encoders import (
+    ONNX_MIN_COSINE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MIN_COSINE,
+    ONNX_QUANTIZED_MODEL_FILE,
+    OnnxEncoder,
+    check_equivalence,
+    embedding_model_name,
+    export_onnx,
+)
+from app.field_text import build_field_text, text_hash, truncate_text
+from app.lexical import BM25Index, fuse
+from app.metrics import increment, timed
+from app.reduction import get_projection
+from app.singleflight import embedding_flights
+from app.storage import search_vectors, vector_search_enabled
+from app.type_compat import category_groups, category_indices, compatible
 
 config = {
     "models": [
-        {"name": "openai", "use": lambda api_key: bool(api_key)},
-        {"name": "distilbert-base-nli-mean-tokens", "instance": SentenceTransformer("sentence-transformers/distilbert-base-nli-mean-tokens").to(device)},
-        {"name": "msmarco-distilbert-base-v3", "instance": SentenceTransformer("sentence-transformers/msmarco-distilbert-base-v3").to(device)},
-        {"name": "all-mpnet-base-v2", "instance": SentenceTransformer("sentence-transformers/all-mpnet-base-v2").to(device)},
-        {"name": "multi-qa-mpnet-base-dot-v1", "instance": SentenceTransformer("sentence-transformers/multi-qa-mpnet-base-dot-v1").to(device)},
-        {"name": "colbertv2.0", "instance": SentenceTransformer("colbert-ir/colbertv2.0").to(device)},
+        # Kept on ada-002 so that embeddings stored under "openai" stay comparable.
+        {"name": "openai", "provider": "openai", "model": "text-embedding-ada-002",
+         "use": lambda api_key: bool(api_key)},
+        {"name": "openai-3-small", "provider": "openai", "model": "text-embedding-3-small", "dimensions": 512},
+        {"name": "distilbert-base-nli-mean-tokens", "path": "sentence-transformers/distilbert-base-nli-mean-tokens"},
+        {"name": "msmarco-distilbert-base-v3", "path": "sentence-transformers/msmarco-distilbert-base-v3"},
+        {"name": "all-mpnet-base-v2", "path": "sentence-transformers/all-mpnet-base-v2"},
+        {"name": "multi-qa-mpnet-base-dot-v1", "path": "sentence-transformers/multi-qa-mpnet-base-dot-v1"},
+        {"name": "colbertv2.0", "path": "colbert-ir/colbertv2.0"},
     ],
-    "openai_api_key": ""
+    "openai_api_key": os.environ.get("OPENAI_API_KEY", ""),
+    # Where local models configured with "backend": "onnx" are exported to.
+    "onnx_model_dir": os.environ.get("ONNX_MODEL_DIR", "onnx_models"),
 }
 
-client = None
-if (config.get("openai_api_key")):
-    client = OpenAI(api_key=config.get("openai_api_key"))
+_model_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+def get_model_config(model_name):
+    """
+    Look up a model config by name, loading its SentenceTransformer on first use.
+
+    Models are loaded lazily so that only the models that are actually requested pay the startup cost. OpenAI models
+    get an `EmbeddingClient` as their instance, or None when no API key is configured.
+
+    Args:
+        model_name (str): Name of the model in `config["models"]`.
+
+    Returns:
+        dict: The model config (with "instance" populated for local models), or None if unknown.
+    """
+    model_config = next((x for x in config["models"] if x["name"] == model_name), None)
+    if model_config and "instance" not in model_config:
+        with _model_lock:
+            if "instance" not in model_config and "path" in model_config:
+                model_config["instance"] = load_local_model(model_config)
+            elif "instance" not in model_config and model_config.get("provider") == "openai":
+                from app.openai_client import EmbeddingClient
+
+                api_key = config.get("openai_api_key")
+                model_config["instance"] = EmbeddingClient(
+                    model=model_config["model"],
+                    dimensions=model_config.get("dimensions"),
+                    api_key=api_key,
+                    metric_model=model_config["name"],
+                ) if api_key else None
+    return model_config
+
+def load_local_model(model_config):
+    """
+    Load a local model with the backend selected in its config.
+
+    The default "torch" backend runs the SentenceTransformer with PyTorch. With `"backend": "onnx"` the model is
+    exported to ONNX on first use (checked against the PyTorch embeddings, and int8-quantized with `"quantize": True`)
+    and run with ONNX Runtime using `"intra_op_threads"` threads; torch is only imported for the export. ONNX
+    embeddings are stored under their own name (see `app.encoders.embedding_model_name`).
+
+    Returns:
+        SentenceTransformer or OnnxEncoder: Encoder with a SentenceTransformer-style `encode`.
+    """
+    if model_config.get("backend", "torch") != "onnx":
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        return SentenceTransformer(model_config["path"]).to(device)
+
+    quantize = model_config.get("quantize", False)
+    onnx_dir = os.path.join(config["onnx_model_dir"], model_config["name"])
+    model_file = ONNX_QUANTIZED_MODEL_FILE if quantize else ONNX_MODEL_FILE
+    if os.path.exists(os.path.join(onnx_dir, model_file)):
+        return OnnxEncoder(onnx_dir, quantize, model_config.get("intra_op_threads"))
+
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_config["path"], device="cpu")
+    export_onnx(reference, onnx_dir, quantize)
+    encoder = OnnxEncoder(onnx_dir, quantize, model_config.get("intra_op_threads"))
+    result = check_equivalence(reference, encoder,
+                               min_cosine=ONNX_QUANTIZED_MIN_COSINE if quantize else ONNX_MIN_COSINE)
+    if not result["passed"]:
+        os.remove(os.path.join(onnx_dir, model_file))
+        raise RuntimeError(f"ONNX export of {model_config['name']} does not match the PyTorch model: {result}")
+    return encoder
 
 def add_embeddings_to_faiss(embeddings, faiss_index, metadata_mapping):
     """
@@ -68,27 +170,210 @@ def search_embeddings(source_text, model, faiss_index, metadata_mapping, k=5):
         results.append(metadata)
     return results
 
-def generate_embeddings(model_config, field):
-    text = f"Field: {field['name'].replace('_', ' ')}. Description: {field['description']}"
-    if model_config["name"] == "openai":
-        if not client:
-            return None
-        response = client.embeddings.create(input=text, model="text-embedding-ada-002")
-        embedding = response.data[0].embedding
-        embedding = torch.tensor(embedding)
-        return embedding
+def build_index(embeddings, index_spec="Flat"):
+    """
+    Build a FAISS index over the given vectors.
+
+    Args:
+        embeddings (np.ndarray): 2D float32 array of vectors.
+        index_spec (str): FAISS index factory string, e.g. "Flat", "HNSW32" or "IVF16,Flat". Indexes that need
+            training are trained on `embeddings`.
+
+    Returns:
+        faiss.Index: Populated index using L2 distance.
+    """
+    import faiss
+
+    if index_spec == "Flat":
+        faiss_index = faiss.IndexFlatL2(embeddings.shape[1])
     else:
-        model = model_config["instance"]
-        try:
-            embedding = model.encode([text], convert_to_tensor=True)[0]
-            return embedding.cpu()
-        except Exception as e:
-            print(e)
-            return None
+        faiss_index = faiss.index_factory(embeddings.shape[1], index_spec, faiss.METRIC_L2)
+        if not faiss_index.is_trained:
+            faiss_index.train(embeddings)
+    faiss_index.add(embeddings)
+    return faiss_index
+
+def _search_parameters(faiss_index, selector):
+    """Search parameters of the right kind for `faiss_index` that only consider the vectors accepted by `selector`."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(faiss_index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(faiss_index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=faiss_index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def search_index(faiss_index, queries, k, allowed=None):
+    """
+    Search a FAISS index, optionally only among the vectors at the `allowed` positions.
+
+    Other vectors are skipped by an ID selector inside FAISS, so they are never scored.
+
+    Returns:
+        tuple: (distances, indices) as returned by `faiss.Index.search`; missing results have index -1.
+    """
+    if allowed is None:
+        return faiss_index.search(queries, k)
+    if not len(allowed):
+        return np.zeros((len(queries), k), dtype="float32"), np.full((len(queries), k), -1, dtype="int64")
+    import faiss
+
+    selector = faiss.IDSelectorBatch(np.asarray(allowed, dtype="int64"))
+    return faiss_index.search(queries, k, params=_search_parameters(faiss_index, selector))
 
+def search_compatible(faiss_index, queries, k, query_categories, target_categories):
+    """
+    Search a FAISS index so that each query only scores the targets its type is compatible with.
+
+    Args:
+        faiss_index (faiss.Index): Index over the targets, in `target_categories` order.
+        queries (np.ndarray): 2D array of query vectors.
+        k (int): Neighbours per query.
+        query_categories (np.ndarray): Type category index of each query (see `app.type_compat`).
+        target_categories (np.ndarray): Type category index of each indexed target.
 
+    Returns:
+        tuple: (distances, indices) as returned by `faiss.Index.search`.
+    """
+    distances = np.zeros((len(queries), k), dtype="float32")
+    indices = np.full((len(queries), k), -1, dtype="int64")
+    for rows, allowed in category_groups(query_categories, target_categories):
+        distances[rows], indices[rows] = search_index(faiss_index, np.ascontiguousarray(queries[rows]), k, allowed)
+    return distances, indices
+
+def generate_embeddings(model_config, field):
+    return embed_text(model_config, build_field_text(model_config, field))
 
-def match_fields(source_entity, target_entities, model_name):
+def embed_text(model_config, text):
+    """
+    Embed one piece of text with a model.
+
+    Returns:
+        np.ndarray: The embedding, or None if the model is unavailable or failed.
+    """
+    return embed_texts(model_config, [text])[0]
+
+def embed_texts(model_config, texts):
+    """
+    Embed several texts with one batched model call (OpenAI models split them into concurrent requests).
+
+    Returns:
+        list: One embedding per text; entries are None if the model is unavailable (e.g. no OpenAI API key).
+
+    Raises:
+        Exception: The model's error (for OpenAI, once the client's retries are exhausted), after logging it.
+    """
+    model = model_config.get("instance")
+    texts = [truncate_text(model_config, text) for text in texts]
+    if model_config.get("provider") == "openai" and not model:
+        return [None] * len(texts)
+    try:
+        if model_config.get("provider") == "openai":
+            return list(model.embed(texts))
+        increment("embedding_calls_total", model=model_config["name"])
+        return list(model.encode(texts, convert_to_numpy=True))
+    except Exception:
+        logger.exception("Embedding %d text(s) with %s failed", len(texts), model_config["name"])
+        raise
+
+def embed_fields(model_config, fields, entity=None):
+    """
+    Generate and store embeddings for a list of fields.
+
+    Args:
+        model_config (dict): Model config as returned by `get_model_config`.
+        fields (list): Field dicts with id, name, description and entity_id (or the entity's context keys, see
+            `app.field_text.template_values`); a precomputed "text" is used as is.
+        entity (dict): The entity all `fields` belong to, if they come from one entity dict.
+
+    Returns:
+        list: The generated embeddings, in the order of `fields`.
+    """
+    if not fields:
+        return []
+    if entity:
+        fields = [{"entity_id": entity["id"], **field} for field in fields]
+    model_name = embedding_model_name(model_config)
+    texts = [field.get("text") or build_field_text(model_config, field, entity) for field in fields]
+    hashes = [text_hash(text) for text in texts]
+    texts_by_hash = dict(zip(hashes, texts))
+
+    def embed_and_store(keys):
+        # Fields sharing a text are embedded once; the fields stored here need not be stored by the waiters.
+        with timed("generate_embeddings"):
+            vectors = dict(zip(keys, embed_texts(model_config, [texts_by_hash[hash_] for _, hash_ in keys])))
+        led = [i for i, hash_ in enumerate(hashes) if (model_name, hash_) in vectors]
+        with timed("store_embedding"):
+            store_embeddings(model_name, [fields[i] for i in led], [vectors[(model_name, hashes[i])] for i in led],
+                             [hashes[i] for i in led])
+        stored = {fields[i]["id"] for i in led}
+        return {key: (vector, stored) for key, vector in vectors.items()}
+
+    # Concurrent requests embedding the same text share one model call (see `app.singleflight`).
+    results = embedding_flights.do_many([(model_name, hash_) for hash_ in hashes], embed_and_store)
+    embeddings = [results[(model_name, hash_)][0] for hash_ in hashes]
+    unstored = [i for i, (field, hash_) in enumerate(zip(fields, hashes))
+                if field["id"] not in results[(model_name, hash_)][1]]
+    if unstored:
+        with timed("store_embedding"):
+            store_embeddings(model_name, [fields[i] for i in unstored], [embeddings[i] for i in unstored],
+                             [hashes[i] for i in unstored])
+    return embeddings
+
+def stale_fields(model_config, entity_ids):
+    """
+    Fields of the given entities whose embedding is missing or was made from a different text than the current one.
+
+    Returns:
+        list: Field dicts (with entity context and the current "text") that need to be (re-)embedded.
+    """
+    fields = []
+    for field in get_fields_with_embedding_hashes(entity_ids, embedding_model_name(model_config)):
+        text = build_field_text(model_config, field)
+        if field["text_hash"] != text_hash(text):
+            fields.append({**field, "text": text})
+    return fields
+
+def load_entity_embeddings(model_config, entity):
+    """
+    Fetch the field embeddings of an entity, generating and storing the ones that don't exist yet or are stale.
+
+    Only the fields listed in `entity["fields"]` are returned, so callers can pass an entity with a subset of its
+    fields.
+
+    Returns:
+        list: Embedding dicts as returned by `fetch_entity_embeddings`.
+    """
+    model_name = model_config["name"]
+    # Stored embeddings only count when they were made from the field's current text.
+    texts = {field["id"]: build_field_text(model_config, field, entity) for field in entity["fields"]}
+    hashes = {field_id: text_hash(text) for field_id, text in texts.items()}
+    with timed("fetch_entity_embeddings"):
+        entity_embeddings = [embedding for embedding in fetch_entity_embeddings([entity["id"]],
+                                                                                embedding_model_name(model_config))
+                             if hashes.get(embedding["field"]["id"]) == embedding["text_hash"]]
+    if entity_embeddings:
+        increment("embedding_cache_hits_total", len(entity_embeddings), model=model_name)
+
+    stored_ids = {embedding["field"]["id"] for embedding in entity_embeddings}
+    missing_fields = [{**field, "text": texts[field["id"]]} for field in entity["fields"]
+                      if field["id"] not in stored_ids]
+    if not missing_fields:
+        return entity_embeddings
+
+    increment("embedding_cache_misses_total", len(missing_fields), model=model_name)
+    embeddings = embed_fields(model_config, missing_fields, entity)
+    return entity_embeddings + [{
+        "field": {"id": field["id"], "name": field["name"], "description": field["description"],
+                  "type": field.get("type"), "enum": field.get("enum"), "nullable": field.get("nullable")},
+        "entity_id": entity["id"],
+        "model_name": embedding_model_name(model_config),
+        "embedding": embedding
+    } for field, embedding in zip(missing_fields, embeddings)]
+
+def match_fields(source_entity, target_entities, model_name, k=5, index_spec="Flat", hybrid=False,
+                 lexical_weight=0.3, short_circuit=False, type_filter=True, confirmed=None, clustered=False):
     """
     Matches fields between source and target entities using multiple embedding models.
 
@@ -96,82 +381,237 @@ def match_fields(source_entity, target_entities, model_name):
         source_entity (Entity): source entity.
         target_entities (list): List of entities to map to
         model_name (str): Name of model to use.
+        k (int): Number of matches to return per source field.
+        index_spec (str): FAISS index factory string used for the target index (see `build_index`).
+        hybrid (bool): Fuse the dense scores with BM25 scores over target field names and descriptions
+            (see `app.lexical.fuse`).
+        lexical_weight (float): Weight of the BM25 score in hybrid mode.
+        short_circuit (bool): Answer source fields whose normalized name equals a target field name with those
+            targets (score 1.0) without embedding them.
+        type_filter (bool): Only match target fields whose type is compatible with the source field's
+            (see `app.type_compat`); incompatible targets are masked out of the search rather than scored.
+        confirmed (dict): User decisions as returned by `app.confirmed.field_decisions`. Source fields with an
+            accepted mapping get it (score 1.0) without a search, and rejected targets are never returned.
+        clustered (bool): Index only one target field per stored cluster of near-duplicates (see `app.clustering`)
+            and expand the representatives found to their members, scored exactly. In-database (pgvector) search
+            ignores clusters.
     Returns:
-        dict: A mapping where the key is the source field name, and the value is list of top 5 matches across
+        dict: A mapping where the key is the source field name, and the value is list of top k matches across
               all models.
     """
-    model = next((x for x in config["models"] if x["name"] == model_name), None)
+    if not any(model_config["name"] == model_name for model_config in config["models"]):
+        raise ValueError(f"Unknown model: {model_name}")
+
+    field_mappings = {}
+    source_fields = source_entity["fields"]
+    confirmed = confirmed or {}
+    rejected = {name: decision["rejected"] for name, decision in confirmed.items() if decision["rejected"]}
+    for field in source_fields:
+        accepted = confirmed.get(field["name"], {}).get("accepted")
+        if accepted:
+            field_mappings[field["name"]] = [
+                {**_match_entry(entity_id, target_field, 1.0), "match_type": "confirmed"}
+                for entity_id, target_field in accepted[:k]
+            ]
+    if field_mappings:
+        increment("confirmed_mappings_total", len(field_mappings), model=model_name)
+        source_fields = [field for field in source_fields if field["name"] not in field_mappings]
+        if not source_fields:
+            return field_mappings
+
+    lexical_index = None
+    if hybrid or short_circuit:
+        with timed("lexical_index"):
+            lexical_targets = [(entity["id"], field) for entity in target_entities for field in entity["fields"]]
+            lexical_index = BM25Index([field for _, field in lexical_targets])
+
+    if short_circuit:
+        with timed("lexical_search"):
+            for field in source_fields:
+                exact = [doc_id for doc_id in lexical_index.exact_matches(field["name"])
+                         if (not type_filter or compatible(field, lexical_targets[doc_id][1]))
+                         and lexical_targets[doc_id][1]["id"] not in rejected.get(field["name"], ())]
+                if exact:
+                    field_mappings[field["name"]] = [
+                        {**_match_entry(*lexical_targets[doc_id], 1.0), "match_type": "exact_name"}
+                        for doc_id in exact[:k]
+                    ]
+        short_circuited = [field for field in source_fields if field["name"] in field_mappings]
+        if short_circuited:
+            increment("lexical_short_circuits_total", len(short_circuited), model=model_name)
+            source_fields = [field for field in source_fields if field["name"] not in field_mappings]
+            if not source_fields:
+                return field_mappings
+
+    # Hybrid search re-ranks a wider dense candidate list.
+    dense_k = 2 * k if hybrid else k
+    # Rejected targets are dropped after the search, so fetch enough extra candidates to still have dense_k.
+    extra = max((len(rejected.get(field["name"], ())) for field in source_fields), default=0)
+    dense_mappings = _dense_matches({**source_entity, "fields": source_fields}, target_entities,
+                                    get_model_config(model_name), dense_k + extra, index_spec, type_filter, clustered)
+    if extra:
+        dense_mappings = {
+            name: [match for match in matches if match["target_field_id"] not in rejected.get(name, ())][:dense_k]
+            for name, matches in dense_mappings.items()
+        }
+    if not hybrid:
+        field_mappings.update(dense_mappings)
+        return field_mappings
+
+    with timed("lexical_search"):
+        for field in source_fields:
+            lexical_matches = [
+                {**_match_entry(*lexical_targets[doc_id], normalized), "lexical_score": normalized}
+                for doc_id, _, normalized in lexical_index.search(
+                    f"{field['name']} {field.get('description') or ''}", dense_k + extra)
+                if (not type_filter or compatible(field, lexical_targets[doc_id][1]))
+                and lexical_targets[doc_id][1]["id"] not in rejected.get(field["name"], ())
+            ][:dense_k]
+            dense_matches = dense_mappings.get(field["name"], [])
+            if dense_matches or lexical_matches:
+                field_mappings[field["name"]] = fuse(dense_matches, lexical_matches, lexical_weight, k)
+    return field_mappings
+
+def _dense_matches(source_entity, target_entities, model, k, index_spec, type_filter=True, clustered=False):
+    """Top-k embedding matches for every field of `source_entity` (see `match_fields`)."""
+    model_name = model["name"]
+    target_field_count = sum(len(entity["fields"]) for entity in target_entities)
+    database_search = (vector_search_enabled(current_app)
+                       and target_field_count >= current_app.config['PGVECTOR_MIN_TARGET_FIELDS'])
+
+    # With in-database search the target vectors never leave Postgres; only missing ones are generated.
     all_entities = {source_entity["id"]: source_entity}
-    for entity in target_entities:
-        all_entities[entity["id"]] = entity
+    if database_search:
+        missing_fields = stale_fields(model, [entity["id"] for entity in target_entities])
+        increment("embedding_cache_misses_total", len(missing_fields), model=model_name)
+        embed_fields(model, missing_fields)
+    else:
+        for entity in target_entities:
+            all_entities[entity["id"]] = entity
 
     for entity_id, entity in all_entities.items():
-        entity_embeddings = fetch_entity_embeddings([entity_id], model_name)
-        # All or none for now. If an entity field is added, the whole entity has to be regenerated.
-        # TODO: add logic to check for missing field embeddings and regenerate
-        if not entity_embeddings:
-            entity_embeddings = [{
-                "field": {"id": field["id"], "name": field["name"], "description": field["description"]},
-                "entity_id": entity_id,
-                "model_name": model_name,
-                "embedding": generate_embeddings(model, field)
-            } for field in entity["fields"]]
-            [store_embedding(field_embedding["field"]["id"], model_name, field_embedding["embedding"]) for field_embedding in entity_embeddings]
-        all_entities[entity["id"]]["embeddings"] = entity_embeddings
+        all_entities[entity_id]["embeddings"] = load_entity_embeddings(model, entity)
 
     field_mappings = {}
 
-    # Initialize FAISS index. TODO: DONT hardcode 768
-    metadata_mapping = {}
+    # The source may also be one of the targets, in which case its entry holds all of its fields.
+    source_field_ids = {field["id"] for field in source_entity["fields"]}
+    source_embeddings = [embedding for embedding in all_entities[source_entity["id"]]["embeddings"]
+                         if embedding["field"]["id"] in source_field_ids]
+    if not source_embeddings or not target_field_count:
+        return field_mappings
+    queries = np.array([item["embedding"] for item in source_embeddings]).astype("float32")
+    queries = queries.reshape(len(source_embeddings), -1)
+    query_categories = category_indices([embedding["field"] for embedding in source_embeddings])
+
+    if database_search:
+        target_fields = {field["id"]: field for entity in target_entities for field in entity["fields"]}
+        target_entity_ids = [entity["id"] for entity in target_entities]
+        results = [[] for _ in source_embeddings]
+        groups = [(np.arange(len(queries)), None)]
+        if type_filter:
+            target_field_ids = np.array(list(target_fields), dtype="int64")
+            groups = category_groups(query_categories, category_indices(list(target_fields.values())))
+        with timed("vector_search"):
+            for rows, allowed in groups:
+                if allowed is not None and not len(allowed):
+                    continue
+                field_ids = None if allowed is None else target_field_ids[allowed].tolist()
+                for row, found in zip(rows.tolist(), search_vectors(db.session, queries[rows], target_entity_ids,
+                                                                    embedding_model_name(model), k, field_ids)):
+                    results[row] = found
+        for source_field_embedding, rows in zip(source_embeddings, results):
+            field_mappings[source_field_embedding["field"]["name"]] = [
+                _match_entry(entity_id, target_fields[field_id], 1 - distance)
+                for field_id, entity_id, distance in rows
+                if field_id in target_fields
+            ]
+        return field_mappings
 
     target_embeddings = [embedding for target_entity in target_entities for embedding in target_entity["embeddings"]]
+    if not target_embeddings:
+        return field_mappings
+
+    embeddings = np.array([item["embedding"] for item in target_embeddings]).astype("float32")
+    if embeddings.ndim == 1:
+        embeddings = embeddings.reshape(1, -1)  # Reshape to (1, embedding_dimension)
+    elif embeddings.ndim != 2:
+        raise ValueError("Embeddings should be a 1D or 2D array")
+
+    # Optionally search in a reduced space (see app/reduction.py).
+    projection = get_projection(model)
+    if projection:
+        with timed("reduce_vectors"):
+            embeddings = projection.apply(embeddings)
+            queries = projection.apply(queries)
+
+    target_categories = category_indices([item["field"] for item in target_embeddings])
+    # Only one field per cluster of near-duplicates is indexed (see app/clustering.py); hits are expanded below.
+    groups = None
+    searched = np.arange(len(target_embeddings))
+    if clustered:
+        target_field_ids = [item["field"]["id"] for item in target_embeddings]
+        groups = representative_groups(target_field_ids,
+                                       get_field_clusters(embedding_model_name(model), target_field_ids),
+                                       target_categories if type_filter else None)
+        searched = np.array(sorted(groups), dtype="int64")
+        increment("cluster_members_pruned_total", len(target_embeddings) - len(searched), model=model_name)
 
     # Add target embeddings to the FAISS index
-    if target_embeddings:
-        embeddings = np.array([item["embedding"] for item in target_embeddings]).astype("float32")
-        print(embeddings.shape)
-        if embeddings.ndim == 1:
-            embeddings = embeddings.reshape(1, -1)  # Reshape to (1, embedding_dimension)
-        elif embeddings.ndim == 2:
-            pass  # Already 2D, no need to reshape
+    with timed("faiss_build"):
+        faiss_index = build_index(np.ascontiguousarray(embeddings[searched]), index_spec)
+
+    # Search all source fields in one batch (one per restricted type category). Scores and indices are converted
+    # with a single vectorized .tolist() so the result only holds native Python scalars.
+    with timed("faiss_search"):
+        if type_filter:
+            distances, indices = search_compatible(faiss_index, queries, k, query_categories,
+                                                   target_categories[searched])
         else:
-            raise ValueError("Embeddings should be a 1D or 2D array")
-
-        embedding_dimension = embeddings.shape[1]
-        faiss_index = faiss.IndexFlatL2(embedding_dimension)
-        faiss_index.add(embeddings)
-        metadata_mapping = {i: target_embeddings[i] for i in range(len(target_embeddings))}
-
-    # Process source fields
-    for source_field_embedding in source_entity["embeddings"]:
-        source_field = source_field_embedding["field"]
-        source_field_name = source_field["name"]
-        source_text = f"Field: {source_field_name.replace('_', ' ')}. Description: {source_field['description']}"
-
-        source_embedding = source_field_embedding["embedding"]
-
-        # Search FAISS for top matches
-        if faiss_index.ntotal > 0:
-            distances, indices = faiss_index.search(np.array(source_embedding, dtype="float32").reshape(1, -1), k=5)
-            if all(idx == -1 for idx in indices[0]):
-                matches = []
-            else:
-                matches = [
-                    {
-                        "target_entity_id": metadata_mapping[idx]["entity_id"],
-                        "target_field_id": metadata_mapping[idx]["field"]["id"],
-                        "target_field_name": metadata_mapping[idx]["field"]["name"],
-                        "target_field_description": metadata_mapping[idx]["field"]["description"],
-                        "score": 1 - distances[0][i],  # FAISS uses L2 distance; convert to similarity
-                    }
-                    for i, idx in enumerate(indices[0])
-                    if idx != -1  # Skip indices that are -1
-                ]
-
-            field_mappings[source_field_name] = matches
+            distances, indices = faiss_index.search(queries, k=k)
+    scores = (1 - distances).tolist()  # FAISS uses L2 distance; convert to similarity
+    indices = np.where(indices == -1, -1, searched[indices]).tolist()
+    if groups is not None:
+        with timed("cluster_expand"):
+            indices, scores = _expand_clusters(queries, embeddings, indices, scores, groups, k)
+
+    for source_field_embedding, row_indices, row_scores in zip(source_embeddings, indices, scores):
+        field_mappings[source_field_embedding["field"]["name"]] = [
+            _match_entry(target_embeddings[idx]["entity_id"], target_embeddings[idx]["field"], score)
+            for idx, score in zip(row_indices, row_scores)
+            if idx != -1  # Skip indices that are -1
+        ]
 
     return field_mappings
 
+def _expand_clusters(queries, embeddings, indices, scores, groups, k):
+    """
+    Replace every representative found by the members of its group, scored exactly, and keep the best k per query.
+
+    Returns:
+        tuple: (indices, scores) lists like the FAISS search returns, without -1 padding.
+    """
+    expanded_indices, expanded_scores = [], []
+    for query, row_indices, row_scores in zip(queries, indices, scores):
+        candidates = [(score, idx) for idx, score in zip(row_indices, row_scores) if idx != -1]
+        members = [member for idx in row_indices if idx != -1 for member in groups[idx][1:]]
+        if members:
+            member_scores = 1.0 - ((embeddings[members] - query) ** 2).sum(axis=1)
+            candidates += list(zip(member_scores.tolist(), members))
+        best = sorted(candidates, key=lambda candidate: candidate[0], reverse=True)[:k]
+        expanded_indices.append([idx for _, idx in best])
+        expanded_scores.append([score for score, _ in best])
+    return expanded_indices, expanded_scores
+
+def _match_entry(target_entity_id, target_field, score):
+    return {
+        "target_entity_id": target_entity_id,
+        "target_field_id": target_field["id"],
+        "target_field_name": target_field["name"],
+        "target_field_description": target_field["description"],
+        "score": score,
+    }
+
 # Not used after switching to FAISS but may use it again later.
 def rank_candidates_pytorch(source_embedding, target_embeddings):
     """
@@ -184,6 +624,8 @@ def rank_candidates_pytorch(source_embedding, target_embeddings):
     Returns:
         List[Tuple[int, float]]: List of (index, similarity score) sorted by similarity.
     """
+    import torch
+
     similarities = torch.nn.functional.cosine_similarity(
         source_embedding.unsqueeze(0), target_embeddings, dim=1
     )
@@ -0,0 +1,166 @@
+"""
+In-process metrics: per-stage timers, counters and a Prometheus text exposition.
+
+Stage timings are recorded into a histogram and, when a request enabled it with `start_request_timing`, into a
+per-request list that is used for `Server-Timing` headers.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRIC_PREFIX = "entity_matcher"
+
+# Histogram buckets in seconds.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+COUNTERS = {
+    "embedding_cache_hits_total": "Field embeddings served from the embeddings table.",
+    "embedding_cache_misses_total": "Field embeddings that had to be generated.",
+    "match_cache_hits_total": "Match requests answered from the field_matches table.",
+    "match_cache_misses_total": "Match requests that ran a new search.",
+    "embedding_calls_total": "Calls made to an embedding model.",
+    "openai_tokens_total": "Tokens billed by the OpenAI embeddings API.",
+    "lexical_short_circuits_total": "Source fields matched by normalized name without an embedding model.",
+    "projection_missing_total": "Indexes built at full size because the model's PCA projection is not fitted yet.",
+    "confirmed_mappings_total": "Source fields answered from confirmed mappings without a search.",
+    "pivot_mappings_computed_total": "Entities matched against a pivot schema because no stored matches existed.",
+    "pivot_compositions_total": "Source fields answered by composing matches through a pivot schema.",
+    "pivot_fallbacks_total": "Source fields searched directly because the pivot schema did not connect them.",
+    "match_refreshes_total": "Dirty cached matches updated incrementally after their fields changed.",
+    "match_refresh_researched_fields_total": "Source fields searched again while refreshing cached matches.",
+    "match_refresh_drops_total": "Dirty cached matches deleted because they cannot be refreshed incrementally.",
+    "match_refresh_conflicts_total": "Cached match refreshes redone because the result was marked dirty meanwhile.",
+    "singleflight_shared_total": "Results shared with a concurrent identical computation instead of computed again.",
+    "work_lock_waits_total": "Computations that waited for another worker process holding the same work lock.",
+    "response_cache_hits_total": "Schema reads answered with a cached serialized body.",
+    "response_cache_misses_total": "Schema reads that walked the database and serialized a new body.",
+    "http_not_modified_total": "Schema reads answered with 304 Not Modified.",
+    "cluster_members_pruned_total": "Target fields left out of FAISS indexes because their cluster representative was.",
+    "http_requests_total": "HTTP requests handled, by endpoint and status.",
+}
+
+HISTOGRAMS = {
+    "stage_duration_seconds": "Time spent in each matching pipeline stage.",
+    "http_request_duration_seconds": "HTTP request latency by endpoint.",
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_request_timings = ContextVar("request_timings", default=None)
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """Add `value` to the counter `name` (one of `COUNTERS`) for the given labels."""
+    if name not in COUNTERS:
+        raise ValueError(f"Unknown counter: {name}")
+    with _lock:
+        _counters[(name, _labels_key(labels))] += value
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in the histogram `name` (one of `HISTOGRAMS`)."""
+    if name not in HISTOGRAMS:
+        raise ValueError(f"Unknown histogram: {name}")
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time the enclosed block as pipeline stage `stage`.
+
+    The duration goes to the `stage_duration_seconds` histogram and, if request timing is active, to the
+    current request's timings.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_duration_seconds", elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def start_request_timing():
+    """Start collecting stage timings for the current request/context."""
+    _request_timings.set({})
+
+
+def stop_request_timing():
+    """Stop collecting stage timings and return {stage: total seconds} for the current request."""
+    timings = _request_timings.get()
+    _request_timings.set(None)
+    return timings or {}
+
+
+def server_timing_header(timings):
+    """Format stage timings as a `Server-Timing` header value (durations in milliseconds)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                      for key, value in _histograms.items()}
+
+    lines = []
+    for name, help_text in COUNTERS.items():
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+    for name, help_text in HISTOGRAMS.items():
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (histogram_name, labels), histogram in sorted(histograms.items()):
+            if histogram_name != name:
+                continue
+            for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Clear all recorded metrics."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
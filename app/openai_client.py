@@ -0,0 +1,237 @@
+"""
+Batched, concurrent OpenAI embedding client.
+
+Texts are packed into requests by an estimated token budget, several requests run concurrently under a
+requests-per-minute / tokens-per-minute limiter, and rate-limit (429), server (5xx) and connection errors are retried
+with exponential backoff (honouring `Retry-After`). The client owns a background event loop so that the limiter state
+and HTTP connections persist across the synchronous `embed` calls made from request handlers.
+
+The API key and base URL come from `OPENAI_API_KEY` and `OPENAI_BASE_URL` unless passed explicitly.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import numpy as np
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI
+
+from app.metrics import increment
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts are then estimated from the text length
+    tiktoken = None
+
+DEFAULT_MODEL = "text-embedding-3-small"
+
+# Per-request limits of the embeddings endpoint (inputs and total tokens), kept below the documented maximums.
+MAX_BATCH_SIZE = 2048
+MAX_REQUEST_TOKENS = 250_000
+MAX_INPUT_TOKENS = 8191
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Number of tokens in `text`, exact with tiktoken and a ~4 characters per token estimate otherwise."""
+    global _encoding
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text))
+
+
+def batch_by_tokens(token_counts, max_request_tokens=MAX_REQUEST_TOKENS, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Pack consecutive texts into batches that stay within a token budget and a maximum number of inputs.
+
+    Args:
+        token_counts (list): Token count of each text.
+        max_request_tokens (int): Token budget per batch. A single text over the budget gets a batch of its own.
+        max_batch_size (int): Maximum number of texts per batch.
+
+    Returns:
+        list: Batches as lists of indices into `token_counts`.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for index, tokens in enumerate(token_counts):
+        if batch and (batch_tokens + tokens > max_request_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute.
+
+    Args:
+        requests_per_minute (int): Request budget; None for no limit.
+        tokens_per_minute (int): Token budget; None for no limit.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.available = {name: float(limit or 0) for name, limit in self.limits.items()}
+        self.updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        for name, limit in self.limits.items():
+            if limit:
+                self.available[name] = min(float(limit), self.available[name] + elapsed * limit / 60.0)
+
+    async def acquire(self, tokens):
+        """Wait until one request of `tokens` tokens fits in both budgets, then consume it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        needed = {"requests": 1, "tokens": tokens}
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                for name, limit in self.limits.items():
+                    if not limit:
+                        continue
+                    # A request larger than the whole budget waits for a full bucket instead of forever.
+                    amount = min(needed[name], limit)
+                    if self.available[name] < amount:
+                        wait = max(wait, (amount - self.available[name]) * 60.0 / limit)
+                if wait <= 0:
+                    for name, limit in self.limits.items():
+                        if limit:
+                            self.available[name] -= min(needed[name], limit)
+                    return
+                await asyncio.sleep(wait)
+
+
+def _retry_delay(error, attempt, base_delay, max_delay):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def _is_retryable(error):
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+class EmbeddingClient:
+    """
+    Embed many texts with the OpenAI embeddings API.
+
+    Args:
+        model (str): Embedding model, e.g. "text-embedding-3-small".
+        dimensions (int): Output dimensions for models that support shortening (text-embedding-3-*).
+        api_key (str): Defaults to `OPENAI_API_KEY`.
+        base_url (str): Defaults to `OPENAI_BASE_URL`, then the public API.
+        max_concurrency (int): Requests in flight at once.
+        requests_per_minute (int): Request rate limit; None for no client-side limit.
+        tokens_per_minute (int): Token rate limit; None for no client-side limit.
+        max_retries (int): Retries per request on 429, 5xx and connection errors.
+        max_request_tokens (int): Token budget per request.
+        max_batch_size (int): Inputs per request.
+        base_delay (float): First backoff delay in seconds; doubles on every retry.
+        max_delay (float): Longest backoff delay in seconds.
+        metric_model (str): `model` label of the embedding metrics.
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, dimensions=None, api_key=None, base_url=None, max_concurrency=8,
+                 requests_per_minute=3000, tokens_per_minute=1_000_000, max_retries=6,
+                 max_request_tokens=MAX_REQUEST_TOKENS, max_batch_size=MAX_BATCH_SIZE, base_delay=0.5,
+                 max_delay=30.0, metric_model=None):
+        self.model = model
+        self.dimensions = dimensions
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.max_request_tokens = max_request_tokens
+        self.max_batch_size = max_batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metric_model = metric_model or model
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._client = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _run(self, coroutine):
+        """Run a coroutine on the client's background event loop and wait for the result."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="openai-embeddings", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _request(self, texts, tokens, semaphore):
+        if self._client is None:
+            # Retries are handled here so that they also go through the rate limiter.
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        params = {"model": self.model, "input": texts}
+        if self.dimensions:
+            params["dimensions"] = self.dimensions
+
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(tokens)
+                try:
+                    increment("embedding_calls_total", model=self.metric_model)
+                    response = await self._client.embeddings.create(**params)
+                    break
+                except Exception as error:
+                    if attempt == self.max_retries or not _is_retryable(error):
+                        raise
+                    await asyncio.sleep(_retry_delay(error, attempt, self.base_delay, self.max_delay))
+
+        if response.usage:
+            increment("openai_tokens_total", response.usage.total_tokens, model=self.metric_model)
+        vectors = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = item.embedding
+        return np.array(vectors, dtype="float32")
+
+    async def aembed(self, texts):
+        """
+        Embed texts concurrently.
+
+        Args:
+            texts (list): Strings to embed.
+
+        Returns:
+            np.ndarray: 2D float32 array with one row per text, in the order of `texts`.
+        """
+        if not texts:
+            return np.zeros((0, self.dimensions or 0), dtype="float32")
+        token_counts = [min(count_tokens(text), MAX_INPUT_TOKENS) for text in texts]
+        batches = batch_by_tokens(token_counts, self.max_request_tokens, self.max_batch_size)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*[
+            self._request([texts[i] for i in batch], sum(token_counts[i] for i in batch), semaphore)
+            for batch in batches
+        ])
+        embeddings = np.empty((len(texts), results[0].shape[1]), dtype="float32")
+        for batch, vectors in zip(batches, results):
+            embeddings[batch] = vectors
+        return embeddings
+
+    def embed(self, texts):
+        """Synchronous wrapper around `aembed`."""
+        return self._run(self.aembed(list(texts)))
@@ -0,0 +1,177 @@
+"""
+Pivot-schema (transitive) matching.
+
+When many source schemas are mapped to one canonical schema, A -> B mappings between two sources can be composed from
+the stored A -> canonical and B -> canonical matches instead of running a new embedding search: a field a of A reaches
+a field b of B through every canonical field p that both were matched to, with a score combined from the two edges.
+Each entity is matched against the canonical schema once (the result is stored in field_matches like any other match),
+so N sources need N matching runs instead of one per pair. Source fields that reach no target field through the pivot
+fall back to a direct search.
+"""
+import heapq
+
+from app.database import (
+    Entity,
+    db,
+    get_entities_by_schema,
+    get_stored_field_mappings,
+    match_cache_key,
+    store_matching_data_in_db,
+)
+from app.match import _match_entry, match_fields
+from app.metrics import increment, timed
+from app.reduction import reduction_key
+from app.type_compat import compatible
+
+# How the scores of the source -> pivot and target -> pivot edges are combined (both clamped to [0, 1] first).
+COMBINE_METHODS = {
+    "product": lambda first, second: first * second,
+    "min": min,
+}
+
+
+def _pivot_options(model_name):
+    options = {"hybrid": False, "short_circuit": False, "type_filter": True}
+    reduction = reduction_key(model_name)
+    if reduction:
+        options["reduction"] = reduction
+    return options
+
+
+def pivot_cache_key(pivot_entity_ids, model_name):
+    """Cache key of matches against the whole pivot schema, the same as `/api/match-entities/` uses for them."""
+    return match_cache_key(list(pivot_entity_ids), **_pivot_options(model_name))
+
+
+def pivot_entity_ids(pivot_schema_id):
+    """
+    Ids of the pivot schema's entities.
+
+    Composed results depend on them as much as on their targets: they are recorded as dependencies so that a change to
+    the pivot schema marks the composed results dirty (see `app.database.mark_matches_dirty`).
+    """
+    return [entity_id for (entity_id,) in
+            db.session.query(Entity.id).filter(Entity.schema_id == pivot_schema_id).order_by(Entity.id)]
+
+
+def pivot_mappings(entities, pivot_entities, model_name):
+    """
+    Matches of each entity's fields against the pivot schema, computing (and storing) them for entities that have none.
+
+    Every stored result of an entity is reused for the matches it has that point at pivot entities, whatever targets
+    and options it was computed for.
+
+    Returns:
+        dict: {entity_id: {field name: [match dicts pointing at pivot fields], best first}}
+    """
+    pivot_entity_ids = {entity["id"] for entity in pivot_entities}
+    stored = get_stored_field_mappings([entity["id"] for entity in entities], model_name)
+
+    mappings = {}
+    for entity in entities:
+        merged = {}
+        # Newest results first, so a target field keeps the score of its most recent match.
+        for field_mappings in stored.get(entity["id"], []):
+            for field_name, matches in field_mappings.items():
+                field_matches = merged.setdefault(field_name, {})
+                for match in matches:
+                    if match["target_entity_id"] in pivot_entity_ids:
+                        field_matches.setdefault(match["target_field_id"], match)
+        if not any(merged.values()):
+            field_mappings = match_fields(entity, pivot_entities, model_name)
+            store_matching_data_in_db(entity, model_name, field_mappings, pivot_cache_key(pivot_entity_ids, model_name),
+                                      target_entity_ids=pivot_entity_ids, match_options=_pivot_options(model_name))
+            increment("pivot_mappings_computed_total", model=model_name)
+            merged = {field_name: {match["target_field_id"]: match for match in matches}
+                      for field_name, matches in field_mappings.items()}
+        mappings[entity["id"]] = {
+            field_name: sorted(field_matches.values(), key=lambda match: match["score"], reverse=True)
+            for field_name, field_matches in merged.items()
+        }
+    return mappings
+
+
+def compose_matches(source_entity, target_entities, model_name, pivot_schema_id, k=5, combine="product",
+                    type_filter=True, confirmed=None, **match_options):
+    """
+    Match fields by composing source -> pivot and target -> pivot matches, searching directly only for the source
+    fields that reach no target field through the pivot.
+
+    Args:
+        source_entity (dict): Source entity (with "schema_id").
+        target_entities (list): Entities to map to; none of them may belong to the pivot schema.
+        model_name (str): Name of model to use.
+        pivot_schema_id (int): The canonical schema every entity is matched against.
+        k (int): Number of matches to return per source field.
+        combine (str): How the two edge scores are combined, one of `COMBINE_METHODS`.
+        type_filter (bool): Drop composed targets whose type is incompatible with the source field's.
+        confirmed (dict): User decisions (see `app.confirmed.field_decisions`); accepted mappings are returned as
+            they are and rejected targets are never returned.
+        **match_options: Passed on to `match_fields` for the direct fallback search.
+
+    Returns:
+        dict: Field mappings like `match_fields`; composed matches have `"match_type": "pivot"` and the
+              `pivot_field_id` of the best path.
+    """
+    if combine not in COMBINE_METHODS:
+        raise ValueError(f"Unknown score combination: {combine}")
+    if source_entity["schema_id"] == pivot_schema_id or any(entity["schema_id"] == pivot_schema_id
+                                                            for entity in target_entities):
+        raise ValueError("Source and target entities must not belong to the pivot schema.")
+    pivot_entities = get_entities_by_schema(pivot_schema_id)
+    if not pivot_entities:
+        raise ValueError(f"Pivot schema {pivot_schema_id} has no entities.")
+    combine_scores = COMBINE_METHODS[combine]
+    confirmed = confirmed or {}
+
+    with timed("pivot_mappings"):
+        mappings = pivot_mappings([source_entity] + target_entities, pivot_entities, model_name)
+
+    with timed("pivot_compose"):
+        # Reverse index of the target side: pivot field id -> [(score, target entity id, target field)].
+        reached_from = {}
+        for entity in target_entities:
+            fields = {field["name"]: field for field in entity["fields"]}
+            for field_name, matches in mappings[entity["id"]].items():
+                if field_name not in fields:
+                    continue
+                for match in matches:
+                    reached_from.setdefault(match["target_field_id"], []).append(
+                        (max(match["score"], 0.0), entity["id"], fields[field_name]))
+
+        field_mappings = {}
+        direct_fields = []
+        fallbacks = 0
+        for field in source_entity["fields"]:
+            decision = confirmed.get(field["name"], {})
+            if decision.get("accepted"):
+                direct_fields.append(field)  # answered by match_fields without a search
+                continue
+            rejected = decision.get("rejected", ())
+            best = {}
+            for pivot_match in mappings[source_entity["id"]].get(field["name"], []):
+                source_score = max(pivot_match["score"], 0.0)
+                for target_score, entity_id, target_field in reached_from.get(pivot_match["target_field_id"], []):
+                    if target_field["id"] in rejected or (type_filter and not compatible(field, target_field)):
+                        continue
+                    score = combine_scores(source_score, target_score)
+                    if target_field["id"] not in best or score > best[target_field["id"]][0]:
+                        best[target_field["id"]] = (score, entity_id, target_field, pivot_match["target_field_id"])
+            if not best:
+                direct_fields.append(field)
+                fallbacks += 1
+                continue
+            field_mappings[field["name"]] = [
+                {**_match_entry(entity_id, target_field, score), "match_type": "pivot", "pivot_field_id": pivot_field_id}
+                for score, entity_id, target_field, pivot_field_id in heapq.nlargest(k, best.values(),
+                                                                                    key=lambda path: path[0])
+            ]
+    if field_mappings:
+        increment("pivot_compositions_total", len(field_mappings), model=model_name)
+
+    if fallbacks:
+        increment("pivot_fallbacks_total", fallbacks, model=model_name)
+    if direct_fields:
+        field_mappings.update(match_fields({**source_entity, "fields": direct_fields}, target_entities, model_name,
+                                           k=k, type_filter=type_filter, confirmed=confirmed, **match_options))
+    return field_mappings
@@ -0,0 +1,224 @@
+"""
+Optional per-model dimensionality reduction of field vectors before they are indexed.
+
+A model entry opts in with `"reduction": {"method": "pca" | "truncate", "dimensions": n}`:
+
+- "pca" projects onto the top principal components of the model's stored embeddings. Projections are fitted ahead of
+  time with `fit_projection` (or reduce_dimensions.py) and stored as numbered versions in the embedding_projections
+  table; the newest version with the configured dimensions is used, and until one exists vectors are indexed at full
+  size.
+- "truncate" keeps the first n dimensions, for Matryoshka-trained models (text-embedding-3) whose prefixes are
+  embeddings in their own right.
+
+Reduced vectors are re-normalized so scores (1 - squared L2 distance) stay on the same scale. Stored embeddings are
+never modified; only the in-memory FAISS indexes of field matching and sharded search are built on reduced vectors
+(in-database pgvector search always uses the full vectors). `recall_at_k` measures how many of the full-dimension
+nearest neighbours the reduced search still finds, and every fitted projection records it.
+"""
+import numpy as np
+
+from app.database import Entity, db, fetch_entity_embeddings, fetch_projection, get_projection_version, store_projection
+from app.encoders import embedding_model_name
+from app.metrics import increment
+
+REDUCTION_METHODS = ("pca", "truncate")
+
+# Embeddings sampled from the corpus to fit a PCA projection.
+DEFAULT_SAMPLE_SIZE = 50_000
+
+# Neighbours and query vectors used by the recall check.
+RECALL_K = 10
+RECALL_QUERIES = 200
+
+_projections = {}
+
+
+class Projection:
+    """
+    A reduction that can be applied to batches of vectors.
+
+    Args:
+        method (str): "pca" or "truncate".
+        dimensions (int): Output dimension.
+        mean (np.ndarray): PCA mean, subtracted before projecting.
+        components (np.ndarray): PCA projection matrix (input dimension x `dimensions`).
+        version (int): Stored version of a PCA projection.
+    """
+
+    def __init__(self, method, dimensions, mean=None, components=None, version=None):
+        self.method = method
+        self.dimensions = dimensions
+        self.mean = mean
+        self.components = components
+        self.version = version
+
+    @property
+    def key(self):
+        """Identifies the projection in cache keys and shard signatures, e.g. "pca256v3" or "truncate256"."""
+        return f"{self.method}{self.dimensions}" + (f"v{self.version}" if self.version else "")
+
+    def apply(self, vectors):
+        """
+        Returns:
+            np.ndarray: 2D float32 array of re-normalized reduced vectors.
+        """
+        vectors = np.asarray(vectors, dtype="float32")
+        vectors = vectors.reshape(len(vectors), -1)
+        if self.method == "truncate":
+            reduced = vectors[:, :self.dimensions]
+        else:
+            reduced = (vectors - self.mean) @ self.components
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return np.ascontiguousarray(reduced / np.maximum(norms, 1e-12), dtype="float32")
+
+
+def _reduction_config(model_config):
+    reduction = model_config.get("reduction")
+    if not reduction:
+        return None
+    if reduction.get("method") not in REDUCTION_METHODS:
+        raise ValueError(f"Unknown reduction method for {model_config['name']}: {reduction.get('method')}")
+    return reduction["method"], int(reduction["dimensions"])
+
+
+def get_projection(model_config):
+    """
+    The projection to apply to a model's vectors, or None when the model is not reduced (or not fitted yet).
+
+    PCA projections are loaded from the database once per version; later calls only check the newest version number.
+    """
+    reduction = _reduction_config(model_config)
+    if not reduction:
+        return None
+    method, dimensions = reduction
+    if method == "truncate":
+        return Projection(method, dimensions)
+
+    model_name = embedding_model_name(model_config)
+    version = get_projection_version(model_name, method, dimensions)
+    if version is None:
+        increment("projection_missing_total", model=model_config["name"])
+        return None
+    cache_key = (model_name, method, dimensions, version)
+    if cache_key not in _projections:
+        stored = fetch_projection(model_name, method, dimensions)
+        _projections[cache_key] = Projection(method, dimensions, stored["mean"], stored["components"],
+                                             stored["version"])
+    return _projections[cache_key]
+
+
+def _model_config(model_name):
+    """Config of a model in `app.match.config`, or None."""
+    from app.match import config
+
+    return next((model for model in config["models"] if model["name"] == model_name), None)
+
+
+def reduction_key(model_name):
+    """Key of the projection currently applied to `model_name` (for match cache keys), or None."""
+    model_config = _model_config(model_name)
+    projection = get_projection(model_config) if model_config else None
+    return projection.key if projection else None
+
+
+def fit_pca(vectors, dimensions):
+    """
+    Fit a PCA projection.
+
+    Returns:
+        tuple: (mean, components, explained variance ratio of the kept components).
+    """
+    vectors = np.asarray(vectors, dtype="float64")
+    mean = vectors.mean(axis=0)
+    centered = vectors - mean
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    order = np.argsort(eigenvalues)[::-1][:dimensions]
+    explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+    return mean.astype("float32"), eigenvectors[:, order].astype("float32"), explained
+
+
+def _nearest(queries, vectors, query_indices, k):
+    """Indices of the k nearest vectors of each query (by L2 distance), leaving out the query itself."""
+    distances = (vectors ** 2).sum(axis=1)[None, :] - 2 * queries @ vectors.T
+    distances[np.arange(len(query_indices)), query_indices] = np.inf
+    k = min(k, vectors.shape[0] - 1)
+    return np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+
+def recall_at_k(vectors, projection, k=RECALL_K, queries=RECALL_QUERIES, seed=0):
+    """
+    Fraction of the full-dimension k nearest neighbours that are also found after reduction.
+
+    Args:
+        vectors (np.ndarray): Corpus of full-dimension vectors; the queries are sampled from it.
+        projection (Projection): Reduction to check.
+        k (int): Neighbours per query.
+        queries (int): Number of query vectors.
+        seed (int): Seed of the query sample.
+
+    Returns:
+        float: Mean recall@k.
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if len(vectors) < 2:
+        return 1.0
+    query_indices = np.random.default_rng(seed).choice(len(vectors), min(queries, len(vectors)), replace=False)
+    full = _nearest(vectors[query_indices], vectors, query_indices, k)
+    reduced_vectors = projection.apply(vectors)
+    reduced = _nearest(reduced_vectors[query_indices], reduced_vectors, query_indices, k)
+    hits = [len(set(expected) & set(found)) for expected, found in zip(full.tolist(), reduced.tolist())]
+    return float(np.sum(hits) / (len(hits) * full.shape[1]))
+
+
+def fit_projection(model_name, dimensions, method="pca", schema_ids=None, sample_size=DEFAULT_SAMPLE_SIZE,
+                   recall_k=RECALL_K, min_recall=None, seed=0):
+    """
+    Fit (PCA) or evaluate (truncation) a reduction of a model's stored embeddings and check its recall.
+
+    A PCA projection is stored as a new version unless its recall is below `min_recall`; truncation needs no fitting
+    and is only evaluated.
+
+    Args:
+        model_name (str): Model in `app.match.config`.
+        dimensions (int): Output dimension.
+        method (str): "pca" or "truncate".
+        schema_ids (list): Fit on the embeddings of these schemas; all schemas when empty.
+        sample_size (int): Maximum number of embeddings used for fitting and the recall check.
+        recall_k (int): k of the recall check.
+        min_recall (float): Do not store a PCA projection whose recall@k is below this.
+        seed (int): Seed of the corpus sample.
+
+    Returns:
+        dict: Report with the dimensions, sample size, recall and (for stored projections) the new version.
+    """
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"Unknown reduction method: {method}")
+    model_config = _model_config(model_name)
+    stored_name = embedding_model_name(model_config) if model_config else model_name
+    query = db.session.query(Entity.id)
+    if schema_ids:
+        query = query.filter(Entity.schema_id.in_(schema_ids))
+    embeddings = fetch_entity_embeddings([entity_id for (entity_id,) in query], stored_name)
+    if not embeddings:
+        raise ValueError(f"No stored {model_name} embeddings to fit on")
+    vectors = np.array([item["embedding"] for item in embeddings], dtype="float32")
+    if len(vectors) > sample_size:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), sample_size, replace=False)]
+    if dimensions >= vectors.shape[1]:
+        raise ValueError(f"{model_name} vectors have {vectors.shape[1]} dimensions; cannot reduce to {dimensions}")
+
+    report = {"model_name": model_name, "method": method, "input_dimension": vectors.shape[1],
+              "output_dimension": dimensions, "sample_count": len(vectors), "recall_k": recall_k, "version": None}
+    if method == "truncate":
+        projection = Projection(method, dimensions)
+    else:
+        if len(vectors) <= dimensions:
+            raise ValueError(f"PCA to {dimensions} dimensions needs more than {dimensions} embeddings")
+        mean, components, report["explained_variance"] = fit_pca(vectors, dimensions)
+        projection = Projection(method, dimensions, mean, components)
+    report["recall"] = recall_at_k(vectors, projection, recall_k, seed=seed)
+
+    if method == "pca" and (min_recall is None or report["recall"] >= min_recall):
+        report["version"] = store_projection(stored_name, method, projection.mean, projection.components,
+                                             len(vectors), report["recall"])
+    return report
@@ -0,0 +1,211 @@
+"""
+Incremental refresh of cached field matches.
+
+Every cached result in field_matches records the target entities it was searched against; when fields of one of them
+(or of its source entity) change, `app.database.mark_matches_dirty` marks the result dirty with the changed field
+ids, and dirty results are no longer served. Refreshing a dirty result only touches the affected source fields: a
+changed target field can only enter or leave existing top-k lists, so
+
+- lists holding a removed or changed target field, and source fields that were added or changed, are searched again;
+- every other list only has to score the added and changed target fields against its k-th entry.
+
+Results computed with options that do not allow this (hybrid fusion, blocking, assignment, pivots, confirmed mappings,
+reduced vectors) are deleted instead and recomputed on the next request.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import current_app
+
+from app.assignment import dense_score_matrix
+from app.database import FieldMatch, db, get_entities_by_ids, get_entity_by_id
+from app.match import _match_entry, get_model_config, load_entity_embeddings, match_fields
+from app.metrics import increment, timed
+from app.type_compat import compatibility_mask
+
+# Results per source field of cached matches (the `match_fields` default used by the API).
+MATCH_K = 5
+
+# Times a result that is marked dirty again while it is being refreshed is refreshed again before it is left dirty.
+REFRESH_ATTEMPTS = 3
+
+# Match options under which a cached result can be updated incrementally.
+REFRESHABLE_OPTIONS = {"hybrid": False, "short_circuit": False}
+
+
+def refreshable(match_options):
+    """True if cached matches computed with `match_options` can be refreshed incrementally."""
+    if match_options is None:
+        return False
+    extra = set(match_options) - set(REFRESHABLE_OPTIONS) - {"type_filter"}
+    return not extra and all(match_options.get(key, value) == value for key, value in REFRESHABLE_OPTIONS.items())
+
+
+def _entering_matches(model_config, source_entity, source_names, entering, type_filter):
+    """
+    Score the given source fields against the entering target fields.
+
+    Returns:
+        dict: {source field name: [match dicts of the entering targets]}
+    """
+    fields = [field for field in source_entity["fields"] if field["name"] in source_names]
+    source_embeddings = load_entity_embeddings(model_config, {**source_entity, "fields": fields})
+    target_embeddings = [embedding for entity in entering for embedding in load_entity_embeddings(model_config, entity)]
+    if not source_embeddings or not target_embeddings:
+        return {}
+    scores = dense_score_matrix([item["embedding"] for item in source_embeddings],
+                                [item["embedding"] for item in target_embeddings])
+    if type_filter:
+        scores[~compatibility_mask([item["field"] for item in source_embeddings],
+                                   [item["field"] for item in target_embeddings])] = -np.inf
+    return {
+        source["field"]["name"]: [
+            _match_entry(target["entity_id"], target["field"], score)
+            for target, score in zip(target_embeddings, row.tolist()) if np.isfinite(score)
+        ]
+        for source, row in zip(source_embeddings, scores)
+    }
+
+
+def _refreshed_mappings(field_match, source_entity, model_config, target_entities, k):
+    """
+    The mappings of a dirty cached result brought up to date with its pending changes.
+
+    Returns:
+        tuple: (field mappings, number of source fields searched again)
+    """
+    type_filter = field_match.match_options.get("type_filter", True)
+    pending = field_match.pending_changes or {}
+    leave = set(pending.get("leave", []))
+    source_names = {field["name"] for field in source_entity["fields"]}
+
+    # Lists of removed source fields are dropped; lists that held an outdated target field are searched again.
+    mappings = {name: matches for name, matches in field_match.field_mappings.items() if name in source_names}
+    research = set(pending.get("sources", [])) & source_names
+    research |= {name for name, matches in mappings.items()
+                 if any(match["target_field_id"] in leave for match in matches)}
+
+    enter = set(pending.get("enter", []))
+    entering = [{**entity, "fields": [field for field in entity["fields"] if field["id"] in enter]}
+                for entity in target_entities]
+    entering = [entity for entity in entering if entity["fields"]]
+    if entering:
+        candidates = _entering_matches(model_config, source_entity, source_names - research, entering, type_filter)
+        for name, new_matches in candidates.items():
+            matches = mappings.get(name, [])
+            known = {match["target_field_id"] for match in matches}
+            merged = matches + [match for match in new_matches if match["target_field_id"] not in known]
+            mappings[name] = sorted(merged, key=lambda match: match["score"], reverse=True)[:k]
+
+    if research:
+        fields = [field for field in source_entity["fields"] if field["name"] in research]
+        mappings.update(match_fields({**source_entity, "fields": fields}, target_entities, field_match.model_name,
+                                     k=k, type_filter=type_filter))
+    return mappings, len(research)
+
+
+def refresh_match(field_match, k=MATCH_K, attempts=REFRESH_ATTEMPTS):
+    """
+    Bring one dirty cached result up to date, searching only the affected source fields.
+
+    The result is only marked clean if nothing marked it dirty again while it was being refreshed (its pending changes
+    are compared under a row lock); otherwise it is refreshed again with the new changes, up to `attempts` times.
+
+    Returns:
+        bool: True if refreshed, False if the result was deleted instead (see `refreshable`), None if it kept changing
+              and was left dirty for the next refresh.
+    """
+    field_match_id, model_name = field_match.id, field_match.model_name
+    for _ in range(attempts):
+        options = field_match.match_options
+        source_entity = get_entity_by_id(field_match.source_entity_id)
+        model_config = get_model_config(model_name)
+        target_entity_ids = [target.target_entity_id for target in field_match.targets]
+        if not refreshable(options) or source_entity is None or model_config is None or not target_entity_ids:
+            increment("match_refresh_drops_total", model=model_name)
+            db.session.delete(field_match)
+            db.session.commit()
+            return False
+
+        pending = field_match.pending_changes
+        mappings, researched = _refreshed_mappings(field_match, source_entity, model_config,
+                                                   get_entities_by_ids(target_entity_ids), k)
+
+        # Computing the mappings may have committed (new embeddings); re-read the row before marking it clean.
+        field_match = (FieldMatch.query.filter_by(id=field_match_id)
+                       .with_for_update().populate_existing().one_or_none())
+        if field_match is None:
+            db.session.commit()
+            return False
+        if field_match.pending_changes == pending:
+            field_match.field_mappings = mappings
+            field_match.dirty = False
+            field_match.pending_changes = None
+            db.session.commit()
+            increment("match_refreshes_total", model=model_name)
+            increment("match_refresh_researched_fields_total", researched, model=model_name)
+            return True
+        db.session.commit()  # releases the lock; the new changes are applied on the next attempt
+        increment("match_refresh_conflicts_total", model=model_name)
+    return None
+
+
+def refresh_dirty_matches(limit=None, k=MATCH_K):
+    """
+    Refresh (or delete, see `refresh_match`) the dirty cached results, oldest first.
+
+    Args:
+        limit (int): Refresh at most this many results.
+        k (int): Number of matches per source field the results were computed with.
+
+    Returns:
+        dict: Counts of "refreshed", "deleted" and "deferred" (still changing, left dirty) results.
+    """
+    query = FieldMatch.query.filter(FieldMatch.dirty.is_(True)).order_by(FieldMatch.id)
+    if limit:
+        query = query.limit(limit)
+    counts = {"refreshed": 0, "deleted": 0, "deferred": 0}
+    outcomes = {True: "refreshed", False: "deleted", None: "deferred"}
+    with timed("match_refresh"):
+        for field_match_id in [field_match.id for field_match in query]:
+            field_match = db.session.get(FieldMatch, field_match_id)
+            if field_match is not None:
+                counts[outcomes[refresh_match(field_match, k)]] += 1
+    return counts
+
+
+class MatchRefresher:
+    """Runs `refresh_dirty_matches` on one background thread; refreshes requested while one runs are coalesced."""
+
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="match-refresh")
+        self._lock = threading.Lock()
+        self._queued = False
+
+    def schedule(self):
+        """Queue a refresh unless one is already waiting to start."""
+        with self._lock:
+            if self._queued:
+                return None
+            self._queued = True
+        return self.executor.submit(self._run)
+
+    def _run(self):
+        with self._lock:
+            self._queued = False
+        with self.app.app_context():
+            try:
+                return refresh_dirty_matches()
+            finally:
+                db.session.remove()
+
+
+def schedule_refresh(app=None):
+    """Refresh dirty cached matches of `app` (the current app by default) in the background."""
+    app = app or current_app._get_current_object()
+    refresher = app.extensions.get("match_refresher")
+    if refresher is None:
+        refresher = app.extensions["match_refresher"] = MatchRefresher(app)
+    return refresher.schedule()
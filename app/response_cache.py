@@ -0,0 +1,84 @@
+"""
+Conditional GET and an in-process cache of serialized read responses.
+
+Schema read endpoints identify their response by an ETag built from the schema versions it covers (see
+`Schema.version`), which only costs a lookup in the schemas table. A client sending that ETag back in `If-None-Match`
+gets a 304 without a body; other clients get the body serialized for that version, cached until it is evicted, so
+only the first read after a write walks entities and fields.
+"""
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+from app.metrics import increment, timed
+from app.serialization import dumps
+
+# Serialized bodies kept; old versions are never read again and simply age out.
+DEFAULT_MAX_ENTRIES = 256
+
+
+class ResponseCache:
+    """A thread-safe LRU of serialized response bodies keyed by ETag."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._bodies = OrderedDict()
+
+    def get(self, etag):
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is not None:
+                self._bodies.move_to_end(etag)
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._bodies[etag] = body
+            self._bodies.move_to_end(etag)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+
+
+response_cache = ResponseCache()
+
+
+def conditional_response(etag, build, cache=response_cache):
+    """
+    Respond with the JSON body identified by `etag`, as a 304 if the client already has it.
+
+    Args:
+        etag (str): Identifies the body; must change whenever the body would (e.g. contain the schema version). Read
+            the version before `build` reads the data, so a body is never cached under a newer version than its own.
+        build (callable): Returns the payload to serialize, or None if the resource does not exist.
+        cache (ResponseCache): Where serialized bodies are kept.
+
+    Returns:
+        Response: 200 or 304 with the ETag, or None if `build` returned None.
+    """
+    if request.if_none_match.contains(etag):
+        increment("http_not_modified_total")
+        response = Response(status=304)
+    else:
+        body = cache.get(etag)
+        if body is None:
+            increment("response_cache_misses_total")
+            payload = build()
+            if payload is None:
+                return None
+            with timed("serialization"):
+                body = dumps(payload)
+            cache.put(etag, body)
+        else:
+            increment("response_cache_hits_total")
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate it, since any write changes it.
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder.
+    orjson = None
+
+
+def numpy_default(obj):
+    """
+    `default` hook for JSON encoders: converts NumPy scalars and arrays to native Python types.
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def dumps(obj):
+    """
+    Serialize `obj` to JSON bytes without copying it first.
+
+    Uses orjson when it is installed (NumPy arrays and scalars are encoded natively) and the stdlib `json`
+    module with `numpy_default` otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=numpy_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=numpy_default, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,302 @@
+"""
+Field search across many schemas, with one FAISS index per (schema, model) as a shard.
+
+A query fans out to the shards of the allowed schemas on a thread pool (FAISS releases the GIL while searching) and
+the per-shard top-k lists are merged with a heap. Shards are built on first use and kept on the application; every
+`refresh_seconds` their signature (schema version, field count, embedding count, newest embedding id, the model's field
+text template and its projection, see app/reduction.py) is compared against the database, and changed schemas, or
+schemas with a field whose embedding no longer matches its text, are rebuilt. One search per model runs that check,
+outside the registry lock (which only guards swapping shards in); concurrent searches keep using the current shards.
+"""
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+
+from app.database import (
+    Embedding,
+    Entity,
+    Field,
+    db,
+    fetch_entity_embeddings,
+    get_entity_by_id,
+    get_schema_versions,
+)
+from app.encoders import embedding_model_name
+from app.field_text import build_field_text, template_fingerprint
+from app.match import (
+    _match_entry,
+    build_index,
+    embed_fields,
+    embed_texts,
+    get_model_config,
+    load_entity_embeddings,
+    search_compatible,
+    stale_fields,
+)
+from app.metrics import timed
+from app.reduction import get_projection
+from app.type_compat import category_indices
+
+SHARD_REFRESH_SECONDS = 30
+
+
+class SchemaShard:
+    """FAISS index over the field embeddings of one schema for one model."""
+
+    def __init__(self, schema_id, model_name, embeddings, index_spec="Flat", signature=None, projection=None):
+        self.schema_id = schema_id
+        self.model_name = model_name
+        self.signature = signature
+        self.fields = [(item["entity_id"], item["field"]) for item in embeddings]
+        self.categories = category_indices([item["field"] for item in embeddings])
+        self.index = None
+        if embeddings:
+            vectors = np.array([item["embedding"] for item in embeddings], dtype="float32")
+            if projection:
+                vectors = projection.apply(vectors)
+            self.index = build_index(vectors, index_spec)
+
+    def search(self, queries, k, query_categories=None):
+        """
+        Args:
+            queries (np.ndarray): 2D array of query vectors.
+            k (int): Results per query.
+            query_categories (np.ndarray): Type category of each query; only compatible fields are scored.
+
+        Returns:
+            list: One list per query of (score, entity_id, field) tuples, best first.
+        """
+        if self.index is None:
+            return [[] for _ in range(len(queries))]
+        k = min(k, len(self.fields))
+        if query_categories is None:
+            distances, indices = self.index.search(queries, k)
+        else:
+            distances, indices = search_compatible(self.index, queries, k, query_categories, self.categories)
+        scores = (1 - distances).tolist()
+        return [
+            [(score, *self.fields[idx]) for idx, score in zip(row_indices, row_scores) if idx != -1]
+            for row_indices, row_scores in zip(indices.tolist(), scores)
+        ]
+
+
+class ShardRegistry:
+    """
+    Per-application cache of schema shards and the thread pool used to search them.
+
+    Args:
+        max_workers (int): Threads searching shards in parallel; defaults to the number of CPUs.
+        refresh_seconds (float): How often shard signatures are checked against the database.
+        index_spec (str): FAISS index factory string used for every shard.
+    """
+
+    def __init__(self, max_workers=None, refresh_seconds=SHARD_REFRESH_SECONDS, index_spec="Flat"):
+        self.shards = {}
+        self.index_spec = index_spec
+        self.refresh_seconds = refresh_seconds
+        self.checked = {}
+        self.projection_keys = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                           thread_name_prefix="shard-search")
+        self._lock = threading.Lock()
+
+    def _signatures(self, model_config, schema_ids, projection):
+        model_name = embedding_model_name(model_config)
+        fingerprint = (template_fingerprint(model_config), projection.key if projection else None)
+        field_counts = (
+            db.session.query(Entity.schema_id, func.count(Field.id))
+            .join(Field, Field.entity_id == Entity.id)
+            .group_by(Entity.schema_id)
+        )
+        embedding_counts = (
+            db.session.query(Entity.schema_id, func.count(Embedding.id), func.max(Embedding.id))
+            .join(Field, Field.entity_id == Entity.id)
+            .join(Embedding, Embedding.field_id == Field.id)
+            .filter(Embedding.model_name == model_name)
+            .group_by(Entity.schema_id)
+        )
+        if schema_ids is not None:
+            field_counts = field_counts.filter(Entity.schema_id.in_(schema_ids))
+            embedding_counts = embedding_counts.filter(Entity.schema_id.in_(schema_ids))
+        embeddings = {schema_id: (count, max_id) for schema_id, count, max_id in embedding_counts}
+        # Fields edited in place keep their ids and their re-embedding keeps its row, but any edit bumps the version.
+        versions = dict(get_schema_versions())
+        return {schema_id: (versions.get(schema_id), field_count, *embeddings.get(schema_id, (0, None)), fingerprint)
+                for schema_id, field_count in field_counts}
+
+    def _stale_schema_ids(self, model_config, schema_ids):
+        """Those of `schema_ids` with a field whose stored embedding was not made from its current text."""
+        if not schema_ids:
+            return set()
+        entity_schemas = dict(db.session.query(Entity.id, Entity.schema_id).filter(Entity.schema_id.in_(schema_ids)))
+        return {entity_schemas[field["entity_id"]] for field in stale_fields(model_config, list(entity_schemas))}
+
+    def _build(self, model_config, schema_id, signature, projection):
+        model_name = model_config["name"]
+        entity_ids = [entity_id for (entity_id,) in db.session.query(Entity.id).filter(Entity.schema_id == schema_id)]
+        missing_fields = stale_fields(model_config, entity_ids)
+        if missing_fields:
+            embed_fields(model_config, missing_fields)
+            signature = self._signatures(model_config, [schema_id], projection).get(schema_id, signature)
+        with timed("shard_build"):
+            return SchemaShard(schema_id, model_name,
+                               fetch_entity_embeddings(entity_ids, embedding_model_name(model_config)),
+                               self.index_spec, signature, projection)
+
+    def get_shards(self, model_config, schema_ids=None, projection=None):
+        """
+        Shards of the given schemas (all schemas when None), building or rebuilding the stale ones.
+
+        Args:
+            model_config (dict): Model config as returned by `get_model_config`.
+            schema_ids (set): Schemas to return; all schemas when None.
+            projection (Projection): Reduction the shards must be built with (see `app.reduction.get_projection`).
+
+        Returns:
+            list: SchemaShard objects.
+        """
+        model_name = model_config["name"]
+        projection_key = projection.key if projection else None
+        with self._lock:
+            now = time.monotonic()
+            # Queries are reduced with the current projection, so a new projection invalidates every shard at once.
+            if not (now - self.checked.get(model_name, float("-inf")) >= self.refresh_seconds
+                    or self.projection_keys.get(model_name, projection_key) != projection_key
+                    or any((schema_id, model_name) not in self.shards for schema_id in schema_ids or [])):
+                return self._model_shards(model_name, schema_ids)
+            # Concurrent searches keep using the current shards instead of checking the database again.
+            self.checked[model_name] = now
+            current = {schema_id: shard for (schema_id, shard_model), shard in self.shards.items()
+                       if shard_model == model_name}
+
+        # Checking signatures and staleness and (re-)embedding run outside the lock; it is only taken to swap shards in.
+        signatures = self._signatures(model_config, None, projection)
+        # Shards that look current are still rebuilt (and their fields re-embedded) when an embedding is stale.
+        stale_schema_ids = self._stale_schema_ids(model_config, [
+            schema_id for schema_id, signature in signatures.items()
+            if schema_id in current and current[schema_id].signature == signature
+        ])
+        built = {
+            schema_id: self._build(model_config, schema_id, signature, projection)
+            for schema_id, signature in signatures.items()
+            if schema_id not in current or current[schema_id].signature != signature or schema_id in stale_schema_ids
+        }
+
+        with self._lock:
+            for (schema_id, shard_model) in list(self.shards):
+                if shard_model == model_name and schema_id not in signatures:
+                    del self.shards[(schema_id, shard_model)]
+            self.shards.update({(schema_id, model_name): shard for schema_id, shard in built.items()})
+            self.projection_keys[model_name] = projection_key
+            return self._model_shards(model_name, schema_ids)
+
+    def _model_shards(self, model_name, schema_ids):
+        return [shard for (schema_id, shard_model), shard in self.shards.items()
+                if shard_model == model_name and (schema_ids is None or schema_id in schema_ids)]
+
+    def search(self, model_config, queries, k=10, schema_ids=None, exclude_field_ids=None, query_categories=None):
+        """
+        Search field vectors across schema shards in parallel and merge the results.
+
+        Args:
+            model_config (dict): Model config as returned by `get_model_config`.
+            queries (np.ndarray): 2D array of query vectors.
+            k (int): Results per query.
+            schema_ids (list): Only search these schemas (allow-list); all schemas when None.
+            exclude_field_ids (list): Per query, a field id to leave out (e.g. the query field itself).
+            query_categories (np.ndarray): Per query, a type category (see `app.type_compat`); only fields of a
+                compatible type are returned.
+
+        Returns:
+            list: One list of match dicts (with `target_schema_id`) per query, best first.
+        """
+        queries = np.asarray(queries, dtype="float32").reshape(len(queries), -1)
+        projection = get_projection(model_config)
+        if projection:
+            queries = projection.apply(queries)
+        shards = self.get_shards(model_config, None if schema_ids is None else set(schema_ids), projection)
+        exclude_field_ids = exclude_field_ids or [None] * len(queries)
+        # One extra candidate per shard so that dropping the query field still leaves k results.
+        shard_k = k + 1 if any(field_id is not None for field_id in exclude_field_ids) else k
+
+        with timed("shard_search"):
+            shard_results = list(self.executor.map(lambda shard: shard.search(queries, shard_k, query_categories),
+                                                   shards))
+
+        with timed("shard_merge"):
+            merged = []
+            for query_index, excluded in enumerate(exclude_field_ids):
+                candidates = (
+                    (score, shard.schema_id, entity_id, field)
+                    for shard, results in zip(shards, shard_results)
+                    for score, entity_id, field in results[query_index]
+                    if field["id"] != excluded
+                )
+                merged.append([
+                    {**_match_entry(entity_id, field, score), "target_schema_id": schema_id}
+                    for score, schema_id, entity_id, field in heapq.nlargest(k, candidates, key=lambda c: c[0])
+                ])
+        return merged
+
+
+def get_registry(app=None):
+    """The shard registry of `app` (the current app by default), created on first use."""
+    app = app or current_app._get_current_object()
+    registry = app.extensions.get("shard_registry")
+    if registry is None:
+        registry = app.extensions["shard_registry"] = ShardRegistry()
+    return registry
+
+
+def search_fields(model_name, field_ids=None, fields=None, k=10, schema_ids=None, type_filter=True):
+    """
+    Find the fields most similar to the given fields across all (or the allowed) schemas.
+
+    Args:
+        model_name (str): Name of the model to use.
+        field_ids (list): Existing fields to look for elsewhere; a field never matches itself.
+        fields (list): Ad-hoc field dicts with name and description that are not stored anywhere.
+        k (int): Results per query.
+        schema_ids (list): Only search these schemas; all schemas when None.
+        type_filter (bool): Only return fields whose type is compatible with the query field's (ad-hoc fields may
+            give a "type" and "enum"; see `app.type_compat`).
+
+    Returns:
+        list: One list of match dicts (with `target_schema_id`) per query, field ids first, then fields.
+    """
+    model_config = get_model_config(model_name)
+    if not model_config:
+        raise ValueError(f"Unknown model: {model_name}")
+    field_ids = list(field_ids or [])
+    fields = list(fields or [])
+
+    queries = []
+    query_fields = []
+    entities = {}
+    with timed("query_embeddings"):
+        for field_id in field_ids:
+            field = db.session.get(Field, field_id)
+            if field is None:
+                raise ValueError(f"Unknown field: {field_id}")
+            if field.entity_id not in entities:
+                entities[field.entity_id] = get_entity_by_id(field.entity_id)
+            entity = entities[field.entity_id]
+            query_fields.append(next(item for item in entity["fields"] if item["id"] == field_id))
+            # Stored embeddings are checked against the field's current text (with its entity context).
+            [embedding] = load_entity_embeddings(model_config, {**entity, "fields": [query_fields[-1]]})
+            queries.append(embedding["embedding"])
+        if fields:
+            queries.extend(embed_texts(model_config, [build_field_text(model_config, field) for field in fields]))
+    if any(query is None for query in queries):
+        raise ValueError(f"Model {model_name} could not embed the query")
+    if not queries:
+        return []
+
+    return get_registry().search(model_config, np.vstack(queries), k, schema_ids, field_ids + [None] * len(fields),
+                                 category_indices(query_fields + fields) if type_filter else None)
@@ -0,0 +1,152 @@
+"""
+Coalescing of identical concurrent work.
+
+When several requests need the same result at the same time (two users opening the same entity pair, or two imports
+embedding the same field text), only the first one computes it and the others wait for and share its result.
+`SingleFlight` does this between the threads of one process; `work_lock` extends it across worker processes with a
+lease row in the database, so the process that waited can read the stored result instead of recomputing it.
+"""
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from app.database import acquire_work_lock, get_matching_data_from_db, release_work_lock
+from app.metrics import increment
+
+# Seconds a database lease is held before it is considered abandoned, and how long to wait for one.
+LOCK_TTL = 120.0
+LOCK_WAIT = 60.0
+LOCK_POLL = 0.05
+
+_OWNER = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs each keyed computation once among the threads that ask for it concurrently.
+
+    Results are not kept after the computation finishes: a caller arriving later computes again (callers are expected
+    to check their own cache first).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return `fn()`, or the result of the identical call already running for `key`."""
+        return self.do_many([key], lambda keys: {key: fn()})[key]
+
+    def do_many(self, keys, fn):
+        """
+        Compute values for several keys, leaving the ones already in flight to their callers.
+
+        Args:
+            keys (list): Hashable keys.
+            fn (callable): Called once with the list of keys this caller leads; returns {key: value} for them.
+
+        Returns:
+            dict: {key: value} for every key.
+        """
+        leading, waiting = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    leading[key] = self._calls[key] = _Call()
+                else:
+                    waiting[key] = call
+        if waiting:
+            increment("singleflight_shared_total", len(waiting), flight=self.name)
+
+        results = {}
+        if leading:
+            try:
+                results = fn(list(leading))
+                for key, call in leading.items():
+                    call.result = results.get(key)
+            except BaseException as e:
+                for call in leading.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key, call in leading.items():
+                        del self._calls[key]
+                        call.done.set()
+
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.result
+        return results
+
+
+@contextmanager
+def work_lock(key, ttl=LOCK_TTL, wait=LOCK_WAIT, poll=LOCK_POLL):
+    """
+    Hold the database lease `key` while the block runs, so one worker process at a time does that work.
+
+    Waits up to `wait` seconds for another holder to finish; after that (or if its lease expired) the block runs anyway,
+    since duplicated work is better than a failed request. Callers should re-check for a stored result inside the block.
+
+    Yields:
+        bool: True if the lease was acquired.
+    """
+    deadline = time.monotonic() + wait
+    acquired = acquire_work_lock(key, _OWNER, ttl)
+    if not acquired:
+        increment("work_lock_waits_total")
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(poll)
+            acquired = acquire_work_lock(key, _OWNER, ttl)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            release_work_lock(key, _OWNER)
+
+
+# Match results, keyed by (source entity id, model name, match cache key).
+match_flights = SingleFlight("match")
+# Field embeddings, keyed by (model name, text hash).
+embedding_flights = SingleFlight("embedding")
+
+
+def match_once(source_entity, model_name, cache_key, compute, ignore_db=False):
+    """
+    Compute (and store) a match result once, however many threads and worker processes ask for it concurrently.
+
+    Threads of this process share one call of `compute` through `match_flights`; other worker processes wait on the
+    database lease of the result and then read the one stored meanwhile instead of recomputing it.
+
+    Args:
+        source_entity (dict): Source entity dict of the result.
+        model_name (str): Model of the result.
+        cache_key (str): Match cache key of the result (see `app.database.match_cache_key`).
+        compute (callable): Computes, stores and returns the field mappings.
+        ignore_db (bool): Always compute, even when a stored result appeared while waiting for the lease.
+
+    Returns:
+        dict: The field mappings.
+    """
+    def locked():
+        with work_lock(f"match:{source_entity['id']}:{model_name}:{cache_key}"):
+            # Another worker process may have stored the result while this one waited for the lock.
+            stored = None if ignore_db else get_matching_data_from_db(source_entity, model_name, cache_key)
+            if stored:
+                return stored
+            return compute()
+
+    return match_flights.do((source_entity["id"], model_name, cache_key), locked)
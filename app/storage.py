@@ -0,0 +1,215 @@
+"""
+Storage configuration: database URL, connection pooling, SQLite tuning and optional pgvector search.
+
+SQLite (the default) is put in WAL mode with `synchronous=NORMAL` and a busy timeout so embedding and match-cache
+writers don't serialize readers on the database lock. With a Postgres URL and `PGVECTOR=1`, field vectors are also kept
+in a pgvector column so nearest-neighbour queries can run inside the database.
+"""
+import os
+
+import numpy as np
+from sqlalchemy import Column, Integer, MetaData, String, Table, event, text
+from sqlalchemy.types import UserDefinedType
+
+DEFAULT_DATABASE_URL = 'sqlite:///schemas.db'
+
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+vector_metadata = MetaData()
+
+
+class Vector(UserDefinedType):
+    """pgvector `vector` column type (dimension-less, so one table can hold every model's vectors)."""
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "vector"
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            return "[" + ",".join(repr(float(x)) for x in np.asarray(value, dtype="float32")) + "]"
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None:
+                return None
+            return np.array(value.strip("[]").split(","), dtype="float32")
+        return process
+
+
+embedding_vectors = Table(
+    'embedding_vectors',
+    vector_metadata,
+    Column('field_id', Integer, primary_key=True),
+    Column('model_name', String, primary_key=True),
+    Column('entity_id', Integer, nullable=False, index=True),
+    Column('vector', Vector, nullable=False),
+)
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def storage_config(database_url=None):
+    """
+    Build the Flask-SQLAlchemy settings for a database URL.
+
+    Args:
+        database_url (str): SQLAlchemy URL. Defaults to the `DATABASE_URL` environment variable, then sqlite.
+
+    Returns:
+        dict: Flask config entries (`SQLALCHEMY_DATABASE_URI`, `SQLALCHEMY_ENGINE_OPTIONS`, `PGVECTOR` and
+              `PGVECTOR_MIN_TARGET_FIELDS`, the target size from which searches run in the database).
+    """
+    database_url = database_url or os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    engine_options = {}
+
+    if database_url.startswith('sqlite'):
+        in_memory = database_url in ('sqlite://', 'sqlite:///:memory:')
+        # The sqlite3 driver's own lock timeout (in seconds) complements PRAGMA busy_timeout.
+        engine_options['connect_args'] = {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False}
+        if not in_memory:
+            engine_options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+            engine_options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    else:
+        engine_options['pool_pre_ping'] = True
+        engine_options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 10))
+        engine_options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+
+    return {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+        'PGVECTOR': database_url.startswith('postgresql') and _env_flag('PGVECTOR'),
+        'PGVECTOR_MIN_TARGET_FIELDS': int(os.environ.get('PGVECTOR_MIN_TARGET_FIELDS', 20000)),
+    }
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys (and so ON DELETE CASCADE) unless enabled per connection.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def init_storage(app, db, database_url=None):
+    """
+    Configure `app` for the selected database and bind `db` to it.
+
+    Args:
+        app (Flask): Application to configure.
+        db (SQLAlchemy): Flask-SQLAlchemy extension.
+        database_url (str): Overrides `DATABASE_URL`.
+    """
+    app.config.update(storage_config(database_url))
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _enable_sqlite_foreign_keys)
+            if engine.url.database not in (None, '', ':memory:'):
+                event.listen(engine, 'connect', _set_sqlite_pragmas)
+        db.create_all()
+        if app.config['PGVECTOR']:
+            with engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            vector_metadata.create_all(engine)
+            # Declared here rather than on the Table because `fields` lives in the models' metadata.
+            with engine.begin() as connection:
+                connection.execute(text(
+                    "DO $$ BEGIN "
+                    "ALTER TABLE embedding_vectors ADD CONSTRAINT fk_embedding_vectors_field_id "
+                    "FOREIGN KEY (field_id) REFERENCES fields (id) ON DELETE CASCADE; "
+                    "EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+                ))
+
+
+def vector_search_enabled(app):
+    """True when field vectors are mirrored into pgvector and can be searched in the database."""
+    return bool(app.config.get('PGVECTOR'))
+
+
+def upsert_vectors(session, rows):
+    """
+    Insert or replace pgvector rows.
+
+    Args:
+        session: SQLAlchemy session.
+        rows (list): Dicts with field_id, model_name, entity_id and vector.
+    """
+    if not rows:
+        return
+    from sqlalchemy.dialects.postgresql import insert
+
+    statement = insert(embedding_vectors).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=['field_id', 'model_name'],
+        set_={'vector': statement.excluded.vector, 'entity_id': statement.excluded.entity_id},
+    )
+    session.execute(statement)
+
+
+def create_vector_index(session, model_name, dimension):
+    """
+    Create an HNSW index for one model's vectors.
+
+    pgvector indexes need a fixed dimension, so the index is a partial expression index per model; `search_vectors`
+    casts to the same dimension so the planner can use it.
+    """
+    index_name = "ix_embedding_vectors_hnsw_" + "".join(c if c.isalnum() else "_" for c in model_name.lower())
+    model_literal = model_name.replace("'", "''")  # DDL does not accept bind parameters
+    session.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {index_name} ON embedding_vectors "
+        f"USING hnsw ((vector::vector({int(dimension)})) vector_l2_ops) "
+        f"WHERE model_name = '{model_literal}'"
+    ))
+    session.commit()
+
+
+def search_vectors(session, query_vectors, entity_ids, model_name, k=5, field_ids=None):
+    """
+    Nearest-neighbour search inside Postgres.
+
+    Args:
+        session: SQLAlchemy session.
+        query_vectors (np.ndarray): 2D array of query vectors.
+        entity_ids (list): Restrict candidates to fields of these entities.
+        model_name (str): Model whose vectors are searched.
+        k (int): Neighbours per query.
+        field_ids (list): Further restrict candidates to these fields (e.g. the type-compatible ones).
+
+    Returns:
+        list: One list per query of (field_id, entity_id, squared L2 distance), nearest first. Distances are squared
+              to match `faiss.IndexFlatL2`.
+    """
+    dimension = int(np.asarray(query_vectors).shape[1])
+    field_filter = "AND field_id = ANY(:field_ids) " if field_ids is not None else ""
+    statement = text(
+        f"SELECT field_id, entity_id, (vector::vector({dimension}) <-> CAST(:query AS vector({dimension}))) AS distance "
+        f"FROM embedding_vectors "
+        f"WHERE model_name = :model_name AND entity_id = ANY(:entity_ids) {field_filter}"
+        f"ORDER BY distance LIMIT :k"
+    )
+    bind = Vector().bind_processor(None)
+    parameters = {"model_name": model_name, "entity_ids": list(entity_ids), "k": k}
+    if field_ids is not None:
+        parameters["field_ids"] = list(field_ids)
+    results = []
+    for query in np.asarray(query_vectors, dtype="float32"):
+        rows = session.execute(statement, {**parameters, "query": bind(query)}).all()
+        results.append([(row.field_id, row.entity_id, float(row.distance) ** 2) for row in rows])
+    return results
@@ -0,0 +1,113 @@
+"""
+Field type compatibility.
+
+Raw field types from OpenAPI specs ("string", "integer", "date-time", ...) and CSV schemas ("VARCHAR(50)", "DECIMAL",
+"TIMESTAMP", ...) are mapped to a few categories, and a symmetric compatibility matrix over the categories decides
+which target fields a source field may be matched with. Search applies it as a mask, so incompatible candidates (a
+boolean target for a date source) are never scored. Fields without a (recognized) type are compatible with everything,
+and strings are compatible with every category because any value can be stored as text.
+"""
+import re
+
+import numpy as np
+
+CATEGORIES = ("unknown", "string", "integer", "number", "boolean", "date", "datetime", "enum", "binary")
+
+# Checked in order against the lowercased raw type; the first matching pattern wins.
+TYPE_PATTERNS = [
+    ("datetime", re.compile(r"date-?time|timestamp")),
+    ("date", re.compile(r"^date$|^date\b")),
+    ("boolean", re.compile(r"bool|^bit$")),
+    ("integer", re.compile(r"int|serial|^long$|^short$")),
+    ("number", re.compile(r"number|decimal|numeric|float|double|real|money")),
+    ("enum", re.compile(r"enum")),
+    ("binary", re.compile(r"binary|blob|bytea|byte")),
+    ("string", re.compile(r"string|char|text|clob|uuid|guid|json|xml")),
+]
+
+# Pairs of different categories that may be matched; "unknown" and "string" are handled separately.
+COMPATIBLE_PAIRS = {
+    ("integer", "number"),
+    ("integer", "enum"),
+    ("boolean", "enum"),
+    ("date", "datetime"),
+}
+
+
+def _build_matrix():
+    size = len(CATEGORIES)
+    matrix = np.eye(size, dtype=bool)
+    for category in ("unknown", "string"):
+        index = CATEGORIES.index(category)
+        matrix[index, :] = matrix[:, index] = True
+    for first, second in COMPATIBLE_PAIRS:
+        i, j = CATEGORIES.index(first), CATEGORIES.index(second)
+        matrix[i, j] = matrix[j, i] = True
+    return matrix
+
+
+COMPATIBILITY = _build_matrix()
+
+
+def type_category(field_type, enum=None):
+    """
+    Category of a raw field type.
+
+    Args:
+        field_type (str): Type as extracted from the schema source, or None.
+        enum (list): Allowed values; a field with allowed values is an enum whatever its declared type.
+
+    Returns:
+        str: One of `CATEGORIES`.
+    """
+    if enum:
+        return "enum"
+    if not field_type:
+        return "unknown"
+    field_type = field_type.strip().lower()
+    return next((category for category, pattern in TYPE_PATTERNS if pattern.search(field_type)), "unknown")
+
+
+def category_indices(fields):
+    """Index into `CATEGORIES` of each field dict's type (see `type_category`)."""
+    return np.array([CATEGORIES.index(type_category(field.get("type"), field.get("enum"))) for field in fields],
+                    dtype="int64")
+
+
+def compatible(source_field, target_field):
+    """True if the two field dicts have compatible types."""
+    source, target = category_indices([source_field, target_field])
+    return bool(COMPATIBILITY[source, target])
+
+
+def compatibility_mask(source_fields, target_fields):
+    """
+    Boolean matrix (source fields x target fields) of type compatibility, computed with one vectorized lookup.
+    """
+    return COMPATIBILITY[category_indices(source_fields)[:, None], category_indices(target_fields)[None, :]]
+
+
+def category_groups(source_categories, target_categories):
+    """
+    Group sources by category together with the target positions they may be matched with.
+
+    Categories that are compatible with every target share a single unrestricted group, so a search over well-typed
+    schemas does not turn into one search per category.
+
+    Args:
+        source_categories (np.ndarray): Category indices of the sources (see `category_indices`).
+        target_categories (np.ndarray): Category indices of the targets.
+
+    Returns:
+        list: (source positions, target positions) pairs; target positions are None when every target is allowed.
+    """
+    allowed = COMPATIBILITY[:, np.asarray(target_categories, dtype="int64")]
+    unrestricted = allowed.all(axis=1)
+    source_categories = np.asarray(source_categories, dtype="int64")
+    groups = []
+    open_rows = np.flatnonzero(unrestricted[source_categories])
+    if len(open_rows):
+        groups.append((open_rows, None))
+    for category in np.unique(source_categories[~unrestricted[source_categories]]):
+        groups.append((np.flatnonzero(source_categories == category), np.flatnonzero(allowed[category])))
+    return groups
@@ -0,0 +1,197 @@
+"""
+Benchmark harness for the matching pipeline.
+
+Generates a synthetic schema pair, loads it into a throwaway SQLite database and times each stage of matching:
+embedding generation, embedding writes, embedding reads, FAISS index build, FAISS search and end-to-end
+`/api/match-entities/` requests (with and without a cached match). Results are written as JSON so runs can be compared
+across commits:
+
+    python -m benchmarks.run_benchmark --entities 20 --fields 30 --output bench.json
+    python -m benchmarks.run_benchmark --entities 20 --fields 30 --baseline bench.json
+
+By default a deterministic hashing encoder is used so the benchmark runs offline; pass `--model` to time one of the
+configured models instead.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.synthetic import generate_schema_pair
+
+STUB_MODEL_NAME = "hashing-stub"
+
+
+def summarize(samples):
+    """Summary statistics (in milliseconds) for a list of durations in seconds."""
+    values = np.array(samples) * 1000.0
+    return {
+        "count": len(samples),
+        "total_ms": float(values.sum()),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+class StageTimer:
+    """Collects duration samples per stage name."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def measure(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items()}
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(num_entities, fields_per_entity, model_name=None, dimension=256, requests_per_entity=1,
+                  seed=0, k=5):
+    """
+    Run every benchmark stage once over a freshly generated schema pair.
+
+    Returns:
+        dict: {"meta": {...}, "stages": {stage_name: summary}}
+    """
+    database_dir = tempfile.mkdtemp(prefix="entity-matcher-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(database_dir, 'bench.db')}"
+
+    # Imported here so DATABASE_URL is set before the app binds its engine.
+    import faiss
+    from app import match
+    from app.database import (
+        fetch_entity_embeddings, get_entity_by_id, insert_or_update_entity, insert_or_update_schema, store_embedding
+    )
+    from app.encoders import HashingEncoder
+    from main import app
+
+    if model_name is None:
+        model_name = STUB_MODEL_NAME
+        if not any(model["name"] == STUB_MODEL_NAME for model in match.config["models"]):
+            match.config["models"].append({"name": STUB_MODEL_NAME, "instance": HashingEncoder(dimension)})
+    model_config = match.get_model_config(model_name)
+    if not model_config:
+        raise ValueError(f"Unknown model: {model_name}")
+
+    source_entities, target_entities, _ = generate_schema_pair(num_entities, fields_per_entity, seed)
+    timer = StageTimer()
+
+    with app.app_context():
+        source_schema = insert_or_update_schema(f"bench-source-{seed}", "Synthetic source schema")
+        target_schema = insert_or_update_schema(f"bench-target-{seed}", "Synthetic target schema")
+        source_ids = [insert_or_update_entity(source_schema.id, entity["name"], entity["description"],
+                                              entity["fields"]).id for entity in source_entities]
+        target_ids = [insert_or_update_entity(target_schema.id, entity["name"], entity["description"],
+                                              entity["fields"]).id for entity in target_entities]
+
+        # Embedding generation and writes, one field at a time like match_fields does on a cold entity.
+        for entity_id in source_ids + target_ids:
+            for field in get_entity_by_id(entity_id)["fields"]:
+                embedding = timer.measure("embed_field", match.generate_embeddings, model_config, field)
+                timer.measure("store_embedding", store_embedding, field["id"], model_name, embedding)
+
+        for entity_id in source_ids + target_ids:
+            timer.measure("fetch_entity_embeddings", fetch_entity_embeddings, [entity_id], model_name)
+
+        target_embeddings = fetch_entity_embeddings(target_ids, model_name)
+        vectors = np.array([item["embedding"] for item in target_embeddings]).astype("float32")
+
+        def build_index():
+            index = faiss.IndexFlatL2(vectors.shape[1])
+            index.add(vectors)
+            return index
+
+        index = timer.measure("index_build", build_index)
+        source_embeddings = fetch_entity_embeddings(source_ids, model_name)
+        for item in source_embeddings:
+            timer.measure("index_search", index.search, np.asarray(item["embedding"], dtype="float32")[None, :], k)
+
+    client = app.test_client()
+    for label in ("match_request_uncached", "match_request_cached"):
+        for entity_id in source_ids:
+            for _ in range(requests_per_entity):
+                response = timer.measure(label, client.post, "/api/match-entities/", json={
+                    "source_entity_id": entity_id,
+                    "target_entity_ids": target_ids,
+                    "model_name": model_name,
+                })
+                if response.status_code != 200:
+                    raise RuntimeError(f"Match request failed ({response.status_code}): {response.get_data(True)}")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "model_name": model_name,
+            "entities": num_entities,
+            "fields_per_entity": fields_per_entity,
+            "target_fields": len(target_embeddings),
+            "dimension": int(vectors.shape[1]),
+            "seed": seed,
+        },
+        "stages": timer.summary(),
+    }
+
+
+def compare(baseline, current):
+    """Render a p50/p95 comparison table between two benchmark result dictionaries."""
+    lines = [f"{'stage':<28}{'p50 base':>12}{'p50 now':>12}{'p95 base':>12}{'p95 now':>12}{'p50 change':>12}"]
+    for stage, stats in current["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base:
+            lines.append(f"{stage:<28}{'-':>12}{stats['p50_ms']:>12.3f}{'-':>12}{stats['p95_ms']:>12.3f}{'new':>12}")
+            continue
+        change = (stats["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100 if base["p50_ms"] else 0.0
+        lines.append(f"{stage:<28}{base['p50_ms']:>12.3f}{stats['p50_ms']:>12.3f}"
+                     f"{base['p95_ms']:>12.3f}{stats['p95_ms']:>12.3f}{change:>+11.1f}%")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the entity matching pipeline on synthetic schemas.")
+    parser.add_argument("--entities", type=int, default=10, help="Entities per schema.")
+    parser.add_argument("--fields", type=int, default=20, help="Fields per entity.")
+    parser.add_argument("--model", help="Configured model to benchmark (defaults to an offline hashing encoder).")
+    parser.add_argument("--dimension", type=int, default=256, help="Vector size of the hashing encoder.")
+    parser.add_argument("--requests", type=int, default=1, help="Match requests per source entity and cache state.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against a previous results JSON file.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.entities, args.fields, args.model, args.dimension, args.requests, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            print(compare(json.load(baseline_file), results))
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
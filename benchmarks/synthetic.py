@@ -0,0 +1,143 @@
+"""
+Synthetic schema generators for benchmarks.
+
+Schemas are built from a small vocabulary of business concepts and attributes so field names and descriptions look
+like the ones imported from OpenAPI specs and CSV data dictionaries. The target schema of a pair describes the same
+concepts with synonyms, different naming conventions and reworded descriptions, and the generator returns the
+ground-truth field mapping between the two.
+"""
+import random
+
+ENTITY_CONCEPTS = [
+    ("Customer", ["Client", "Party"], "A person or company that buys products"),
+    ("Order", ["PurchaseOrder", "SalesOrder"], "A request from a customer to buy products"),
+    ("Product", ["Item", "Article"], "A good or service offered for sale"),
+    ("Invoice", ["Bill", "BillingDocument"], "A document requesting payment for an order"),
+    ("Payment", ["Transaction", "Remittance"], "Money transferred to settle an invoice"),
+    ("Account", ["Ledger", "CustomerAccount"], "A financial account held by a customer"),
+    ("Shipment", ["Delivery", "Consignment"], "Physical delivery of ordered goods"),
+    ("Employee", ["Staff", "Worker"], "A person employed by the company"),
+    ("Supplier", ["Vendor", "Provider"], "A company that supplies products"),
+    ("Position", ["Holding", "Exposure"], "Quantity of an instrument held in a portfolio"),
+    ("Instrument", ["Security", "Asset"], "A tradable financial asset"),
+    ("Trade", ["Execution", "Deal"], "An executed purchase or sale of an instrument"),
+]
+
+# (tokens, synonym tokens, type, description, alternative description)
+ATTRIBUTES = [
+    (["id"], ["identifier"], "integer", "Unique identifier of the {entity}", "Primary key for the {entity} record"),
+    (["name"], ["full", "name"], "string", "Name of the {entity}", "The display name given to the {entity}"),
+    (["email"], ["email", "address"], "string", "Email address of the {entity}", "Electronic mail contact"),
+    (["phone"], ["telephone", "number"], "string", "Phone number of the {entity}", "Contact telephone number"),
+    (["created", "at"], ["creation", "date"], "string", "Timestamp when the {entity} was created",
+     "Date the {entity} record was first entered"),
+    (["updated", "at"], ["last", "modified"], "string", "Timestamp of the last change to the {entity}",
+     "When the {entity} was last modified"),
+    (["status"], ["state"], "string", "Current status of the {entity}", "Lifecycle state of the {entity}"),
+    (["amount"], ["total", "value"], "number", "Monetary amount of the {entity}", "Total value in currency units"),
+    (["currency"], ["currency", "code"], "string", "ISO 4217 currency code", "Three letter currency of the amount"),
+    (["quantity"], ["qty"], "number", "Number of units", "How many units are involved"),
+    (["description"], ["notes"], "string", "Free text description of the {entity}", "Additional notes"),
+    (["country"], ["country", "code"], "string", "Country of the {entity}", "ISO country where the {entity} is"),
+    (["city"], ["town"], "string", "City of the {entity}", "Town or city name"),
+    (["postal", "code"], ["zip"], "string", "Postal code of the {entity} address", "ZIP or post code"),
+    (["is", "active"], ["active", "flag"], "boolean", "Whether the {entity} is active",
+     "Flag indicating the {entity} is enabled"),
+    (["due", "date"], ["payment", "deadline"], "string", "Date by which payment is due", "Deadline for settlement"),
+    (["price"], ["unit", "cost"], "number", "Price per unit", "Cost of one unit"),
+    (["category"], ["classification"], "string", "Category of the {entity}", "Grouping the {entity} belongs to"),
+    (["owner", "id"], ["owner", "identifier"], "integer", "Identifier of the owner", "Reference to the owning party"),
+    (["rating"], ["score"], "number", "Rating given to the {entity}", "Quality score of the {entity}"),
+]
+
+QUALIFIERS = ["primary", "secondary", "billing", "shipping", "original", "settlement", "reporting", "legal"]
+
+ABBREVIATIONS = {
+    "identifier": "id", "number": "num", "address": "addr", "quantity": "qty", "amount": "amt",
+    "description": "desc", "currency": "ccy", "telephone": "tel", "category": "cat", "customer": "cust",
+}
+
+
+def _format_name(tokens, style):
+    if style == "snake":
+        return "_".join(tokens)
+    if style == "camel":
+        return tokens[0] + "".join(token.capitalize() for token in tokens[1:])
+    if style == "pascal":
+        return "".join(token.capitalize() for token in tokens)
+    if style == "abbreviated":
+        return "_".join(ABBREVIATIONS.get(token, token) for token in tokens)
+    raise ValueError(f"Unknown naming style: {style}")
+
+
+def _entity_names(count, rng):
+    concepts = []
+    for i in range(count):
+        name, synonyms, description = ENTITY_CONCEPTS[i % len(ENTITY_CONCEPTS)]
+        suffix = "" if i < len(ENTITY_CONCEPTS) else str(i // len(ENTITY_CONCEPTS) + 1)
+        concepts.append((name + suffix, rng.choice(synonyms) + suffix, description))
+    return concepts
+
+
+def _field_specs(count, rng):
+    """Pick `count` distinct attributes, adding qualifiers once the base vocabulary is exhausted."""
+    specs = []
+    qualifiers = [None] + QUALIFIERS
+    for qualifier in qualifiers:
+        for attribute in rng.sample(ATTRIBUTES, len(ATTRIBUTES)):
+            if len(specs) == count:
+                return specs
+            specs.append((qualifier, attribute))
+    suffix = 2
+    while len(specs) < count:
+        for attribute in ATTRIBUTES:
+            if len(specs) == count:
+                break
+            specs.append((f"extra{suffix}", attribute))
+        suffix += 1
+    return specs
+
+
+def generate_schema_pair(num_entities=10, fields_per_entity=20, seed=0):
+    """
+    Generate a source and target schema describing the same concepts, plus the gold mapping between them.
+
+    Args:
+        num_entities (int): Number of entities per schema.
+        fields_per_entity (int): Number of fields per entity.
+        seed (int): Random seed; the same arguments always produce the same schemas.
+
+    Returns:
+        tuple: (source_entities, target_entities, gold) where entities are dicts shaped like the
+               `/api/entity` payload (name, description, fields) and gold is a list of
+               ((source_entity_name, source_field_name), (target_entity_name, target_field_name)) pairs.
+    """
+    rng = random.Random(seed)
+    source_entities, target_entities, gold = [], [], []
+    styles = ["snake", "camel", "pascal", "abbreviated"]
+
+    for source_name, target_name, entity_description in _entity_names(num_entities, rng):
+        source_style, target_style = rng.sample(styles, 2)
+        source_fields, target_fields = [], []
+
+        for qualifier, (tokens, synonyms, field_type, description, alt_description) in _field_specs(
+                fields_per_entity, rng):
+            prefix = [qualifier] if qualifier else []
+            source_field = {
+                "name": _format_name(prefix + tokens, source_style),
+                "description": description.format(entity=source_name.lower()),
+                "type": field_type,
+            }
+            target_field = {
+                "name": _format_name(prefix + (synonyms if rng.random() < 0.6 else tokens), target_style),
+                "description": alt_description.format(entity=target_name.lower()),
+                "type": field_type,
+            }
+            source_fields.append(source_field)
+            target_fields.append(target_field)
+            gold.append(((source_name, source_field["name"]), (target_name, target_field["name"])))
+
+        source_entities.append({"name": source_name, "description": entity_description, "fields": source_fields})
+        target_entities.append({"name": target_name, "description": entity_description, "fields": target_fields})
+
+    return source_entities, target_entities, gold
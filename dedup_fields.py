@@ -0,0 +1,34 @@
+import argparse
+import json
+
+from app.clustering import DEFAULT_THRESHOLD, cluster_fields
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cluster near-duplicate fields for a model, store the clusters and report them."
+    )
+    parser.add_argument("model_name")
+    parser.add_argument("--schema-id", dest="schema_ids", type=int, action="append",
+                        help="Only cluster fields of this schema (repeatable; all schemas by default).")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Minimum similarity (1 - squared L2 distance) of near-duplicate fields.")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Fields per FAISS range search.")
+    parser.add_argument("--output", help="Write the full dedup report to this JSON file.")
+    args = parser.parse_args()
+
+    from app.factory import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        report = cluster_fields(args.model_name, args.schema_ids, args.threshold, args.batch_size)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    print(f"{report['clustered_fields']} of {report['fields']} fields fall into {len(report['clusters'])} clusters.")
+    for cluster in report["clusters"][:10]:
+        names = ", ".join(f"{member['entity_name']}.{member['field_name']}" for member in cluster["members"][:5])
+        more = f" and {cluster['size'] - 5} more" if cluster["size"] > 5 else ""
+        print(f"  {cluster['size']} fields in {cluster['schemas']} schemas: {names}{more}")
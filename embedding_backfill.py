@@ -0,0 +1,161 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from flask import current_app
+
+from app.database import Entity, db, store_embeddings, sync_vector_search
+from app.encoders import embedding_model_name
+from app.field_text import text_hash
+from app.storage import vector_search_enabled
+
+_worker_model = None
+
+
+def _init_worker(model_config, threads):
+    """Load the model once per worker process, limiting it to `threads` CPU threads."""
+    global _worker_model
+    from app.match import load_local_model
+
+    # Only PyTorch models need torch; ONNX Runtime gets its thread count through "intra_op_threads".
+    if "path" in model_config and model_config.get("backend", "torch") == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+    model_config = dict(model_config)
+    if "instance" not in model_config:
+        model_config.setdefault("intra_op_threads", threads)
+        model_config["instance"] = load_local_model(model_config)
+    _worker_model = model_config
+
+
+def _encode_batch(fields):
+    from app.match import embed_texts
+
+    return fields, embed_texts(_worker_model, [field["text"] for field in fields])
+
+
+def _worker_config(model_config):
+    """The picklable part of a model config; workers load path-based models themselves."""
+    shipped = {key: value for key, value in model_config.items() if not callable(value)}
+    if "path" in shipped:
+        shipped.pop("instance", None)
+    return shipped
+
+
+def _entity_ids(schema_ids):
+    query = db.session.query(Entity.id)
+    if schema_ids:
+        query = query.filter(Entity.schema_id.in_(schema_ids))
+    return [entity_id for (entity_id,) in query]
+
+
+def _report(model_name, done, total, started, output):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate else 0.0
+    output.write(f"\r{model_name}: {done}/{total} fields ({rate:.0f}/s, ETA {eta:.0f}s)")
+    output.flush()
+
+
+def backfill_model(model_name, schema_ids=None, workers=None, batch_size=256, output=sys.stderr):
+    """
+    Generate and store the missing and stale embeddings of one model.
+
+    Fields whose embedding was made from their current text are skipped, and every batch is committed as soon as it is encoded, so an
+    interrupted backfill resumes where it stopped. Local models are encoded by a pool of `workers` processes that
+    each load the model once; OpenAI models are encoded in-process by their (already concurrent) client. With pgvector
+    enabled, the model's stored vectors are then mirrored and indexed (see `app.database.sync_vector_search`).
+
+    Args:
+        model_name (str): Model in `app.match.config`.
+        schema_ids (list): Restrict to these schemas; all schemas when empty.
+        workers (int): Encoder processes; 0 encodes in-process. Defaults to the number of CPUs.
+        batch_size (int): Fields per encode call and per database write.
+        output: Stream for progress reporting, or None.
+
+    Returns:
+        int: Number of embeddings written.
+    """
+    from app.match import config, embed_texts, get_model_config, stale_fields
+
+    model_config = next((model for model in config["models"] if model["name"] == model_name), None)
+    if not model_config:
+        raise ValueError(f"Unknown model: {model_name}")
+    stored_name = embedding_model_name(model_config)
+
+    fields = stale_fields(model_config, _entity_ids(schema_ids))
+    batches = [fields[start:start + batch_size] for start in range(0, len(fields), batch_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if model_config.get("provider") == "openai":
+        workers = 0
+
+    done = 0
+    started = time.perf_counter()
+    if output and fields:
+        _report(model_name, done, len(fields), started, output)
+
+    def write(batch, embeddings):
+        nonlocal done
+        store_embeddings(stored_name, batch, embeddings, [text_hash(field["text"]) for field in batch])
+        done += len(batch)
+        if output:
+            _report(model_name, done, len(fields), started, output)
+
+    if workers == 0 or len(batches) <= 1:
+        model_config = get_model_config(model_name)
+        for batch in batches:
+            write(batch, embed_texts(model_config, [field["text"] for field in batch]))
+    else:
+        workers = min(workers, len(batches))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn rather than fork: forking a process that already initialized torch's thread pools can hang.
+        with ProcessPoolExecutor(workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                                 initargs=(_worker_config(model_config), threads)) as executor:
+            # Keep a bounded number of batches in flight so that results are written as they arrive.
+            pending = set()
+            remaining = iter(batches)
+            for batch in remaining:
+                pending.add(executor.submit(_encode_batch, batch))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(*future.result())
+                    next_batch = next(remaining, None)
+                    if next_batch is not None:
+                        pending.add(executor.submit(_encode_batch, next_batch))
+
+    if output and fields:
+        output.write("\n")
+    # New embeddings are mirrored as they are stored; this covers the ones stored before pgvector was turned on.
+    if vector_search_enabled(current_app):
+        sync_vector_search(stored_name)
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precompute missing and stale field embeddings for schemas and models (resumable)."
+    )
+    parser.add_argument("--model", dest="models", action="append", required=True,
+                        help="Model to backfill; repeat for several models.")
+    parser.add_argument("--schema-id", dest="schema_ids", type=int, action="append",
+                        help="Schema to backfill; repeat for several. Defaults to all schemas.")
+    parser.add_argument("--workers", type=int, help="Encoder processes (default: number of CPUs, 0 = in-process).")
+    parser.add_argument("--batch-size", type=int, default=256, help="Fields per encode call and database write.")
+    args = parser.parse_args()
+
+    from app.factory import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        for model in args.models:
+            written = backfill_model(model, args.schema_ids, args.workers, args.batch_size)
+            print(f"{model}: wrote {written} embeddings")
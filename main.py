@@ -1,10 +1,10 @@
-import numpy as np
-from flask import Flask, request, jsonify, render_template
+import hashlib
+import os
+import time
+
+from flask import Response, g, request, render_template, stream_with_context
 from flask_cors import CORS
 from app.database import (
-    Entity,
-    Schema,
-    Field,
     db,
     get_entity_by_id,
     get_matching_data_from_db,
@@ -14,24 +14,73 @@ from app.database import (
     delete_entity,
     get_all_schemas,
     get_schema_entities,
-    store_matching_data_in_db, get_entity_by_name, get_entities_by_names, get_entities_by_ids
+    store_matching_data_in_db, get_entity_by_name, get_entities_by_names, get_entities_by_ids,
+    add_gold_mapping,
+    get_gold_mappings,
+    MAPPING_STATUSES,
+    confirm_mapping,
+    delete_confirmed_mapping,
+    get_confirmed_mappings,
+    get_entities_by_schema,
+    get_entity_schema_version,
+    get_schema_version,
+    get_schema_versions,
+    match_cache_key
 )
+from app.assignment import assign_fields, assignment_from_mappings
+from app.blocking import DEFAULT_TOP_ENTITIES, block_entities
+from app.catalog_search import KINDS, catalog_search
+from app.clustering import clusters_key
+from app.confirmed import decisions_key, field_decisions, resolved_fields
+from app.export import EXPORT_FORMATS, encode_rows, iter_match_rows
+from app.factory import create_app
 from app.match import match_fields
-import json
-
-app = Flask(__name__)
+from app.metrics import (
+    increment,
+    observe,
+    render_prometheus,
+    server_timing_header,
+    start_request_timing,
+    stop_request_timing,
+    timed
+)
+from app.pivot import compose_matches, pivot_entity_ids
+from app.reduction import reduction_key
+from app.refresh import schedule_refresh
+from app.response_cache import conditional_response
+from app.serialization import dumps
+from app.sharded_search import search_fields
+from app.singleflight import match_once
+
+app = create_app(__name__)
 CORS(app)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///schemas.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Adds a Server-Timing header with per-stage durations to every response.
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    start_request_timing()
 
-db.init_app(app)
+@app.after_request
+def record_timing(response):
+    timings = stop_request_timing()
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    elapsed = time.perf_counter() - g.get("request_start", time.perf_counter())
 
-with app.app_context():
-    db.create_all()
+    increment("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+    observe("http_request_duration_seconds", elapsed, endpoint=endpoint)
+
+    if app.config['SERVER_TIMING']:
+        timings["total"] = elapsed
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
 
 def generateResponse(json, statusCode):
-    response = jsonify(json)
+    with timed("serialization"):
+        body = dumps(json)
+    response = Response(body, mimetype='application/json')
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.status_code = statusCode
     return response
@@ -80,6 +129,8 @@ def api_insert_or_update_entity():
 
     try:
         entity = insert_or_update_entity(schema_id, entity_name, entity_description, fields_data)
+        # Cached matches that depended on changed fields were marked dirty; bring them up to date off the request.
+        schedule_refresh()
         return generateResponse({
             "message": "Entity inserted/updated successfully.",
             "entity": {
@@ -89,7 +140,10 @@ def api_insert_or_update_entity():
                 "fields": [
                     {
                         "name": field.name,
-                        "description": field.description
+                        "description": field.description,
+                        "type": field.type,
+                        "enum": field.enum,
+                        "nullable": field.nullable
                     } for field in entity.fields
                 ]
             }
@@ -115,12 +169,14 @@ def api_delete_entity(entity_id):
 @app.route('/api/entity/<int:entity_id>', methods=['GET'])
 def api_get_entity(entity_id):
     try:
-        entity = get_entity_by_id(entity_id)
+        version = get_entity_schema_version(entity_id)
+        response = conditional_response(f"entity-{entity_id}-v{version[1]}",
+                                        lambda: get_entity_by_id(entity_id)) if version else None
 
-        if not entity:
+        if response is None:
             return generateResponse({"error": "Entity not found."}, 404)
 
-        return generateResponse(entity, 200)
+        return response
 
     except Exception as e:
         return generateResponse({"error": f"An error occurred: {e}"}, 500)
@@ -135,12 +191,10 @@ def upload_schema():
     entities_data = data.get('entities')
 
     if not schema_name or not entities_data:
-        return jsonify({"error": "Schema name and entities are required."}), 400
+        return generateResponse({"error": "Schema name and entities are required."}, 400)
 
-    # Create schema entry
-    schema = Schema(name=schema_name, description=schema_description)
-    db.session.add(schema)
-    db.session.commit()
+    # Upsert so that re-uploading a schema respects the unique schema/entity names
+    schema = insert_or_update_schema(schema_name, schema_description)
 
     for entity_data in entities_data:
         entity_name = entity_data.get('name')
@@ -150,28 +204,18 @@ def upload_schema():
         if not entity_name or not fields_data:
             continue
 
-        # Create entity entry
-        entity = Entity(name=entity_name, description=entity_description, schema_id=schema.id)
-        db.session.add(entity)
-        db.session.commit()
-
-        for field_data in fields_data:
-            field_name = field_data.get('name')
-            field_description = field_data.get('description')
-
-            # Create field entry
-            field = Field(name=field_name, description=field_description, entity_id=entity.id)
-            db.session.add(field)
-
-        db.session.commit()
+        insert_or_update_entity(schema.id, entity_name, entity_description, fields_data)
+    schedule_refresh()
 
     return generateResponse({"message": "Schema and entities uploaded successfully."}, 201)
 
+# Read endpoints answer with the schema version(s) as ETag (see app/response_cache.py), so polling clients mostly get 304s
+# and repeated reads of an unchanged schema are served from the serialized-response cache.
 @app.route('/api/schemas/', methods=['GET'])
 def api_get_all_schemas():
     try:
-        schemas = get_all_schemas()
-        return generateResponse(schemas, 200)
+        versions = hashlib.sha1(dumps(get_schema_versions())).hexdigest()[:16]
+        return conditional_response(f"schemas-{versions}", get_all_schemas)
 
     except Exception as e:
         return generateResponse({"error": f"An error occurred: {e}"}, 500)
@@ -179,25 +223,29 @@ def api_get_all_schemas():
 @app.route('/api/schema/<int:schema_id>', methods=['GET'])
 def api_get_schema(schema_id):
     try:
-        schema = get_schema_by_id(schema_id)
+        version = get_schema_version(schema_id)
+        response = conditional_response(f"schema-{schema_id}-v{version}",
+                                        lambda: get_schema_by_id(schema_id)) if version else None
 
-        if not schema:
-            return jsonify({"error": "Schema not found."}), 404
+        if response is None:
+            return generateResponse({"error": "Schema not found."}, 404)
 
-        return jsonify(schema), 200
+        return response
 
     except Exception as e:
-        return jsonify({"error": f"An error occurred: {e}"}), 500
+        return generateResponse({"error": f"An error occurred: {e}"}, 500)
 
 @app.route('/api/entities/<int:schema_id>/', methods=['GET'])
 def api_list_entities(schema_id):
     try:
-        entities = get_schema_entities(schema_id)
+        version = get_schema_version(schema_id)
+        response = conditional_response(f"entities-{schema_id}-v{version}",
+                                        lambda: get_schema_entities(schema_id) or None) if version else None
 
-        if not entities:
+        if response is None:
             return generateResponse({"error": f"No entities found for schema_id {schema_id}"}, 404)
 
-        return generateResponse(entities, 200)
+        return response
 
     except Exception as e:
         return generateResponse({"error": f"An error occurred: {str(e)}"}, 500)
@@ -221,7 +269,7 @@ def match_entities():
 
     if not source_entity_id and not source_entity_name and not source_schema_id:
         return generateResponse({"error": "Source entity is missing"}, 400)
-    if not target_entity_ids and not target_entity_names and not source_schema_id:
+    if not target_entity_ids and not target_entity_names and not target_schema_id:
         return generateResponse({"error": "Target entities are missing"}, 400)
 
 
@@ -230,7 +278,11 @@ def match_entities():
     else:
         source_entity = get_entity_by_id(source_entity_id)
 
-    if not target_entity_ids:
+    # Without explicit targets, match against the whole target schema, restricted to the most similar entities.
+    blocking = not target_entity_ids and not target_entity_names
+    if blocking:
+        target_entities = get_entities_by_schema(target_schema_id)
+    elif not target_entity_ids:
         target_entities = get_entities_by_names(target_schema_id, target_entity_names)
     else:
         target_entities = get_entities_by_ids(target_entity_ids)
@@ -240,44 +292,286 @@ def match_entities():
     elif not target_entities:
         return generateResponse({"error": "Target entity not found in the specified schema."}, 404)
 
+    hybrid = bool(data.get("hybrid", False))
+    short_circuit = bool(data.get("short_circuit", False))
+    # Fields with incompatible types (see app/type_compat.py) are never matched unless this is turned off.
+    type_filter = bool(data.get("type_filter", True))
+    options = {"hybrid": hybrid, "short_circuit": short_circuit, "type_filter": type_filter}
+    # Accepted and rejected mappings (see app/confirmed.py) change the result, so they are part of the cache key.
+    decisions = field_decisions(source_entity, target_entities)
+    confirmed_key = decisions_key(decisions)
+    if confirmed_key:
+        options["confirmed"] = confirmed_key
+    # Compose A -> B from stored A -> pivot and B -> pivot matches instead of searching (see app/pivot.py); the
+    # composition already restricts the candidates, so there is no blocking.
+    pivot_schema_id = data.get("pivot_schema_id")
+    if pivot_schema_id:
+        try:
+            options["pivot_schema_id"] = _int_option(data, "pivot_schema_id")
+        except ValueError as e:
+            return generateResponse({"error": str(e)}, 400)
+        options["combine"] = data.get("combine", "product")
+    elif blocking:
+        try:
+            options["top_entities"] = _int_option(data, "top_entities", DEFAULT_TOP_ENTITIES, minimum=1)
+        except ValueError as e:
+            return generateResponse({"error": str(e)}, 400)
+    # Search only one field per cluster of near-duplicate targets and expand the hits (see app/clustering.py);
+    # assignments score every pair and ignore it.
+    clustered = bool(data.get("clustered", False))
+    if clustered:
+        options["clustered"] = clusters_key(model_name, [field["id"] for entity in target_entities
+                                                         for field in entity["fields"]])
+    # Results computed in a reduced space (see app/reduction.py) are cached per projection.
+    reduction = reduction_key(model_name)
+    if reduction:
+        options["reduction"] = reduction
+    # One-to-one assignment: "auto", "hungarian" or "greedy" (true means "auto"), optionally with a target capacity.
+    assignment = data.get("assignment")
+    if assignment:
+        options["assignment"] = "auto" if assignment is True else assignment
+        try:
+            options["capacity"] = _int_option(data, "capacity", 1, minimum=1)
+        except ValueError as e:
+            return generateResponse({"error": str(e)}, 400)
+    if assignment and pivot_schema_id:
+        return generateResponse({"error": "assignment cannot be combined with pivot_schema_id."}, 400)
+    # Every candidate target is a dependency of the result, including the ones blocking leaves out; composed results
+    # also depend on the pivot schema's entities.
+    dependency_ids = [entity["id"] for entity in target_entities]
+    cache_key = match_cache_key(dependency_ids, **options)
+    if pivot_schema_id:
+        dependency_ids += pivot_entity_ids(options["pivot_schema_id"])
+
     if not ignore_db:
-        db_data = get_matching_data_from_db(
-            source_entity, model_name
-        )
+        with timed("match_cache_lookup"):
+            db_data = get_matching_data_from_db(
+                source_entity, model_name, cache_key
+            )
         if db_data:
-            return generateResponse({"field_mappings": db_data}, 200)
+            increment("match_cache_hits_total", model=model_name)
+            return generateResponse(_match_response(db_data, assignment), 200)
+        increment("match_cache_misses_total", model=model_name)
+
+    def compute():
+        # Fields with an accepted mapping need no candidates, so blocking is skipped once every field is decided.
+        candidates = target_entities
+        if (blocking and not pivot_schema_id
+                and len(resolved_fields(source_entity, decisions)) < len(source_entity["fields"])):
+            blocked = block_entities([source_entity], target_entities, model_name, options["top_entities"])
+            candidates = [entity for entity, _ in blocked[source_entity["id"]]]
+        if pivot_schema_id:
+            field_mappings = compose_matches(source_entity, candidates, model_name, options["pivot_schema_id"],
+                                             combine=options["combine"], type_filter=type_filter,
+                                             confirmed=decisions, hybrid=hybrid, short_circuit=short_circuit,
+                                             clustered=clustered)
+        elif assignment:
+            field_mappings = assign_fields(source_entity, candidates, model_name,
+                                           capacity=options["capacity"], method=options["assignment"],
+                                           type_filter=type_filter, hybrid=hybrid, short_circuit=short_circuit,
+                                           confirmed=decisions)
+        else:
+            field_mappings = match_fields(source_entity, candidates, model_name,
+                                          hybrid=hybrid, short_circuit=short_circuit, type_filter=type_filter,
+                                          confirmed=decisions, clustered=clustered)
+
+        # Store the result in the database for future queries
+        with timed("store_matching_data"):
+            store_matching_data_in_db(
+                source_entity, model_name, field_mappings, cache_key,
+                target_entity_ids=dependency_ids, match_options=options
+            )
+        return field_mappings
+
+    # Identical concurrent requests are computed once (see app/singleflight.py): threads of this process share the
+    # result, other worker processes wait on the database lease and then read the stored one.
+    try:
+        field_mappings = match_once(source_entity, model_name, cache_key, compute, ignore_db)
+    except ValueError as e:
+        return generateResponse({"error": str(e)}, 400)
 
-    # Perform field matching using external match function
-    field_mappings = match_fields(source_entity, target_entities, model_name)
-    native_field_mappings = convert_numpy_types(field_mappings)
+    return generateResponse(_match_response(field_mappings, assignment), 200)
 
-    # Store the result in the database for future queries (mock function `store_matching_data_in_db`)
-    store_matching_data_in_db(
-        source_entity, model_name, native_field_mappings
-    )
+def _int_option(data, name, default=None, minimum=None):
+    """Integer request option `name` (`default` when absent); ValueError when it is not an integer or below `minimum`."""
+    try:
+        value = int(data.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer.") from None
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}.")
+    return value
+
+def _match_response(field_mappings, assignment):
+    response = {"field_mappings": field_mappings}
+    if assignment:
+        response["assignment"] = assignment_from_mappings(field_mappings)
+    return response
+
+@app.route('/api/search-fields/', methods=['POST'])
+def api_search_fields():
+    """API to find where fields (stored ones by id, or ad-hoc name/description pairs) exist across schemas."""
+    data = request.get_json()
 
+    model_name = data.get("model_name")
+    field_ids = data.get("field_ids") or []
+    fields = data.get("fields") or []
+    schema_ids = data.get("schema_ids")
+    k = int(data.get("k", 10))
+    type_filter = bool(data.get("type_filter", True))
 
-    return generateResponse(native_field_mappings, 200)
+    if not model_name:
+        return generateResponse({"error": "model_name is required."}, 400)
+    if not field_ids and not fields:
+        return generateResponse({"error": "field_ids or fields are required."}, 400)
+    if any(not field.get("name") for field in fields):
+        return generateResponse({"error": "Every field needs a name."}, 400)
 
-# Function to recursively convert NumPy types to native Python types
-def convert_numpy_types(obj):
-    if isinstance(obj, np.ndarray):  # If it's a numpy array
-        return obj.tolist()  # Convert to a list
-    elif isinstance(obj, np.generic):  # If it's a numpy scalar (e.g., float32)
-        return obj.item()  # Convert to native Python type (float, int, etc.)
-    elif isinstance(obj, dict):  # If it's a dictionary
-        return {key: convert_numpy_types(value) for key, value in obj.items()}
-    elif isinstance(obj, list):  # If it's a list
-        return [convert_numpy_types(item) for item in obj]
-    else:
-        return obj  # Return the object as is if it's a native Python type
+    try:
+        results = search_fields(model_name, field_ids, fields, k, schema_ids, type_filter)
+    except ValueError as e:
+        return generateResponse({"error": str(e)}, 400)
+
+    queries = [{"field_id": field_id} for field_id in field_ids] + [{"field": field} for field in fields]
+    return generateResponse({"results": [
+        {**query, "matches": matches} for query, matches in zip(queries, results)
+    ]}, 200)
+
+# Largest page the name search returns, so a typeahead can never ask for the whole catalog at once.
+MAX_SEARCH_PAGE_SIZE = 100
+
+@app.route('/api/search-names/', methods=['GET'])
+def api_search_names():
+    """API for pickers: schemas, entities and fields whose names match what was typed (see app/catalog_search.py)."""
+    query = request.args.get("q", "")
+    kinds = tuple(request.args.getlist("kind")) or KINDS
+    schema_ids = request.args.getlist("schema_id", type=int) or None
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", 20, type=int), MAX_SEARCH_PAGE_SIZE)
+
+    try:
+        with timed("name_search"):
+            results = catalog_search.search(query, kinds, schema_ids, page, per_page)
+    except ValueError as e:
+        return generateResponse({"error": str(e)}, 400)
+
+    return generateResponse({"query": query, "page": page, "per_page": per_page, **results}, 200)
+
+@app.route('/api/gold-mappings', methods=['POST'])
+def api_add_gold_mappings():
+    """API to record known-correct field mappings used by the match-quality evaluation."""
+    data = request.get_json()
+    mappings = data.get('mappings', [data])
+    required = ('source_schema_id', 'source_entity_name', 'source_field_name',
+                'target_schema_id', 'target_entity_name', 'target_field_name')
+
+    if any(not mapping.get(key) for mapping in mappings for key in required):
+        return generateResponse({"error": f"Each mapping requires {', '.join(required)}."}, 400)
+
+    try:
+        gold_mappings = [add_gold_mapping(*(mapping[key] for key in required)) for mapping in mappings]
+        return generateResponse({
+            "message": "Gold mappings stored successfully.",
+            "ids": [gold_mapping.id for gold_mapping in gold_mappings]
+        }, 201)
+
+    except Exception as e:
+        return generateResponse({"error": f"An error occurred: {e}"}, 500)
 
-# Custom serializer for numpy types
-def numpy_serializer(obj):
-    if isinstance(obj, np.generic):  # If it's a numpy type (like numpy.float32)
-        return obj.item()  # Convert to native Python type (float, int, etc.)
-    raise TypeError(f"Type {type(obj)} not serializable")
+@app.route('/api/gold-mappings', methods=['GET'])
+def api_get_gold_mappings():
+    source_schema_id = request.args.get("source_schema_id", type=int)
+    target_schema_id = request.args.get("target_schema_id", type=int)
 
+    if not source_schema_id or not target_schema_id:
+        return generateResponse({"error": "Source and target schema ids are required."}, 400)
+
+    try:
+        return generateResponse(get_gold_mappings(source_schema_id, target_schema_id), 200)
+
+    except Exception as e:
+        return generateResponse({"error": f"An error occurred: {e}"}, 500)
+
+@app.route('/api/confirmed-mappings', methods=['POST'])
+def api_confirm_mappings():
+    """API to accept or reject field mappings; matching returns accepted ones directly and never suggests rejected ones."""
+    data = request.get_json()
+    mappings = data.get('mappings', [data])
+    required = ('source_schema_id', 'source_entity_name', 'source_field_name',
+                'target_schema_id', 'target_entity_name', 'target_field_name', 'status')
+
+    if any(not mapping.get(key) for mapping in mappings for key in required):
+        return generateResponse({"error": f"Each mapping requires {', '.join(required)}."}, 400)
+    if any(mapping['status'] not in MAPPING_STATUSES for mapping in mappings):
+        return generateResponse({"error": f"status must be one of {', '.join(MAPPING_STATUSES)}."}, 400)
+
+    try:
+        confirmed_mappings = [confirm_mapping(*(mapping[key] for key in required)) for mapping in mappings]
+        return generateResponse({
+            "message": "Mapping decisions stored successfully.",
+            "ids": [confirmed_mapping.id for confirmed_mapping in confirmed_mappings]
+        }, 201)
+
+    except Exception as e:
+        return generateResponse({"error": f"An error occurred: {e}"}, 500)
+
+@app.route('/api/confirmed-mappings', methods=['GET'])
+def api_get_confirmed_mappings():
+    source_schema_id = request.args.get("source_schema_id", type=int)
+    target_schema_id = request.args.get("target_schema_id", type=int)
+
+    if not source_schema_id or not target_schema_id:
+        return generateResponse({"error": "Source and target schema ids are required."}, 400)
+
+    try:
+        return generateResponse(get_confirmed_mappings(source_schema_id, [target_schema_id],
+                                                       request.args.get("source_entity_name")), 200)
+
+    except Exception as e:
+        return generateResponse({"error": f"An error occurred: {e}"}, 500)
+
+@app.route('/api/confirmed-mappings/<int:mapping_id>', methods=['DELETE'])
+def api_delete_confirmed_mapping(mapping_id):
+    """API to withdraw a mapping decision."""
+    try:
+        if not delete_confirmed_mapping(mapping_id):
+            return generateResponse({"error": "Mapping decision not found."}, 404)
+        return generateResponse({"message": "Mapping decision deleted successfully."}, 200)
+
+    except Exception as e:
+        return generateResponse({"error": f"An error occurred: {e}"}, 500)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/export-matches/', methods=['GET'])
+def api_export_matches():
+    """API to stream field matches of a schema pair as NDJSON or CSV."""
+    source_schema_id = request.args.get("source_schema_id", type=int)
+    target_schema_id = request.args.get("target_schema_id", type=int)
+    export_format = request.args.get("format", "ndjson")
+    model_name = request.args.get("model_name")
+    min_score = request.args.get("min_score", type=float)
+    include_fresh = request.args.get("fresh", "false").lower() == "true"
+    top_entities = request.args.get("top_entities", type=int)
+
+    if not source_schema_id or not target_schema_id:
+        return generateResponse({"error": "Source and target schema ids are required."}, 400)
+    if export_format not in EXPORT_FORMATS:
+        return generateResponse({"error": f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"}, 400)
+    if include_fresh and not model_name:
+        return generateResponse({"error": "model_name is required to compute fresh matches."}, 400)
+
+    rows = iter_match_rows(source_schema_id, target_schema_id, model_name, min_score, include_fresh,
+                           top_entities=top_entities)
+    response = Response(stream_with_context(encode_rows(rows, export_format)), mimetype=EXPORT_FORMATS[export_format])
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="matches_{source_schema_id}_{target_schema_id}.{export_format}"'
+    )
+    return response
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000, debug=False, threaded=False)
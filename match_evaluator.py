@@ -0,0 +1,62 @@
+import argparse
+import csv
+import json
+
+from app.database import add_gold_mapping
+from app.evaluation import DEFAULT_KS, evaluate, format_report
+
+
+def import_gold_csv(csv_file, source_schema_id, target_schema_id):
+    """
+    Import gold mappings from a CSV file with the columns
+    source_entity, source_field, target_entity, target_field.
+
+    Returns:
+        int: Number of rows read.
+    """
+    count = 0
+    with open(csv_file, 'r') as file:
+        for row in csv.DictReader(file):
+            add_gold_mapping(source_schema_id, row["source_entity"], row["source_field"],
+                             target_schema_id, row["target_entity"], row["target_field"])
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate match quality (recall@k, MRR) and latency of models/index settings on gold mappings."
+    )
+    parser.add_argument("source_schema_id", type=int)
+    parser.add_argument("target_schema_id", type=int)
+    parser.add_argument("--model", dest="models", action="append", required=True,
+                        help="Model to evaluate; repeat for several models.")
+    parser.add_argument("--index", dest="indexes", action="append",
+                        help="FAISS index factory string (default Flat); repeat for several settings.")
+    parser.add_argument("--k", dest="ks", type=int, action="append", help="Recall cut-off; repeat for several.")
+    parser.add_argument("--gold-csv", help="Import gold mappings from this CSV before evaluating.")
+    parser.add_argument("--no-warmup", action="store_true", help="Include embedding generation in the latencies.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    ks = tuple(sorted(set(args.ks))) if args.ks else DEFAULT_KS
+    configurations = [(model, index) for model in args.models for index in (args.indexes or ["Flat"])]
+
+    from app.factory import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        if args.gold_csv:
+            print(f"Imported {import_gold_csv(args.gold_csv, args.source_schema_id, args.target_schema_id)} "
+                  f"gold mappings from {args.gold_csv}")
+
+        report = evaluate(args.source_schema_id, args.target_schema_id, configurations, ks, not args.no_warmup)
+
+    if report["unresolved"]:
+        print(f"Skipped {report['unresolved']} gold mappings whose fields no longer exist.")
+    print(format_report(report["results"], ks))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
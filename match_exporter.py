@@ -0,0 +1,57 @@
+import argparse
+import sys
+
+from app.export import EXPORT_FORMATS, encode_rows, iter_match_rows
+
+
+def export_matches(source_schema_id, target_schema_id, output, export_format="ndjson", model_name=None,
+                   min_score=None, include_fresh=False, top_entities=None):
+    """
+    Streams the field matches of a schema pair to a file-like object.
+
+    Args:
+        source_schema_id (int): Schema whose entities are the match sources.
+        target_schema_id (int): Schema whose entities are the match targets.
+        output: Writable text stream.
+        export_format (str): "ndjson" or "csv".
+        model_name (str): Only export matches produced by this model.
+        min_score (float): Drop matches scoring below this value.
+        include_fresh (bool): Compute matches for source entities that have none stored.
+        top_entities (int): Match fresh source entities only against their most similar target entities.
+    """
+    rows = iter_match_rows(source_schema_id, target_schema_id, model_name, min_score, include_fresh,
+                           top_entities=top_entities)
+    for chunk in encode_rows(rows, export_format):
+        output.write(chunk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export field matches between two schemas as NDJSON or CSV.")
+    parser.add_argument("source_schema_id", type=int)
+    parser.add_argument("target_schema_id", type=int)
+    parser.add_argument("--format", dest="export_format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--model-name")
+    parser.add_argument("--min-score", type=float)
+    parser.add_argument("--fresh", action="store_true",
+                        help="Match source entities that have no stored matches (requires --model-name).")
+    parser.add_argument("--top-entities", type=int,
+                        help="With --fresh, only match fields within this many most similar target entities "
+                             "(default 3).")
+    parser.add_argument("--output", help="Output file (defaults to stdout).")
+    args = parser.parse_args()
+
+    if args.fresh and not args.model_name:
+        parser.error("--fresh requires --model-name")
+
+    from app.factory import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        if args.output:
+            with open(args.output, "w", newline="") as output:
+                export_matches(args.source_schema_id, args.target_schema_id, output, args.export_format,
+                               args.model_name, args.min_score, args.fresh, args.top_entities)
+        else:
+            export_matches(args.source_schema_id, args.target_schema_id, sys.stdout, args.export_format,
+                           args.model_name, args.min_score, args.fresh, args.top_entities)
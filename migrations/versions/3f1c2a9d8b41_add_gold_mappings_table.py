@@ -0,0 +1,41 @@
+"""Add gold_mappings table
+
+Revision ID: 3f1c2a9d8b41
+Revises: 6625a7b2a9df
+Create Date: 2026-10-19 09:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d8b41'
+down_revision: Union[str, None] = '6625a7b2a9df'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'gold_mappings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_schema_id', sa.Integer(), nullable=False),
+        sa.Column('source_entity_name', sa.String(length=100), nullable=False),
+        sa.Column('source_field_name', sa.String(length=100), nullable=False),
+        sa.Column('target_schema_id', sa.Integer(), nullable=False),
+        sa.Column('target_entity_name', sa.String(length=100), nullable=False),
+        sa.Column('target_field_name', sa.String(length=100), nullable=False),
+        sa.ForeignKeyConstraint(['source_schema_id'], ['schemas.id']),
+        sa.ForeignKeyConstraint(['target_schema_id'], ['schemas.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_schema_id', 'source_entity_name', 'source_field_name',
+                            'target_schema_id', 'target_entity_name', 'target_field_name',
+                            name='unique_gold_mapping')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('gold_mappings')
@@ -0,0 +1,35 @@
+"""Add entity_embeddings table
+
+Revision ID: 5d2b8f3e6a17
+Revises: c4a91e7f0b25
+Create Date: 2026-10-19 13:22:09.871403
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b8f3e6a17'
+down_revision: Union[str, None] = 'c4a91e7f0b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'entity_embeddings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('model_name', sa.String(), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['entity_id'], ['entities.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('entity_id', 'model_name', name='unique_entity_embedding'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('entity_embeddings')
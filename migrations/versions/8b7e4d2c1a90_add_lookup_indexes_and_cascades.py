@@ -0,0 +1,169 @@
+"""Add lookup indexes, unique constraints and ON DELETE CASCADE
+
+Revision ID: 8b7e4d2c1a90
+Revises: 3f1c2a9d8b41
+Create Date: 2026-10-19 10:41:07.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b7e4d2c1a90'
+down_revision: Union[str, None] = '3f1c2a9d8b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _tables(cascade):
+    """Table definitions used to rebuild the tables on SQLite, which cannot alter constraints in place."""
+    ondelete = 'CASCADE' if cascade else None
+    metadata = sa.MetaData()
+    tables = {
+        'schemas': sa.Table(
+            'schemas', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.String(length=255)),
+            *([sa.UniqueConstraint('name', name='unique_schema_name')] if cascade else []),
+        ),
+        'entities': sa.Table(
+            'entities', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.String(length=255)),
+            sa.Column('schema_id', sa.Integer(), sa.ForeignKey('schemas.id', ondelete=ondelete), nullable=False),
+            *([sa.UniqueConstraint('schema_id', 'name', name='unique_entity_name')] if cascade else []),
+        ),
+        'fields': sa.Table(
+            'fields', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.String(length=255)),
+            sa.Column('entity_id', sa.Integer(), sa.ForeignKey('entities.id', ondelete=ondelete), nullable=False),
+            *([sa.Index('ix_fields_entity_id', 'entity_id')] if cascade else []),
+        ),
+        'field_matches': sa.Table(
+            'field_matches', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('source_entity_id', sa.Integer(),
+                      sa.ForeignKey('entities.id', ondelete=ondelete, name='fk_field_matches_source_entity_id'),
+                      nullable=False),
+            sa.Column('model_name', sa.String(), nullable=False),
+            sa.Column('field_mappings', sa.JSON(), nullable=False),
+            sa.UniqueConstraint(*(['source_entity_id', 'model_name'] if cascade else ['source_entity_id']),
+                                name='unique_field_match'),
+        ),
+        'embeddings': sa.Table(
+            'embeddings', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('field_id', sa.Integer(), sa.ForeignKey('fields.id', ondelete=ondelete), nullable=False),
+            sa.Column('model_name', sa.String(), nullable=False),
+            sa.Column('embedding', sa.LargeBinary(), nullable=False),
+            *([sa.UniqueConstraint('field_id', 'model_name', name='unique_field_embedding')] if cascade else []),
+        ),
+        'gold_mappings': sa.Table(
+            'gold_mappings', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('source_schema_id', sa.Integer(), sa.ForeignKey('schemas.id', ondelete=ondelete),
+                      nullable=False),
+            sa.Column('source_entity_name', sa.String(length=100), nullable=False),
+            sa.Column('source_field_name', sa.String(length=100), nullable=False),
+            sa.Column('target_schema_id', sa.Integer(), sa.ForeignKey('schemas.id', ondelete=ondelete),
+                      nullable=False),
+            sa.Column('target_entity_name', sa.String(length=100), nullable=False),
+            sa.Column('target_field_name', sa.String(length=100), nullable=False),
+            sa.UniqueConstraint('source_schema_id', 'source_entity_name', 'source_field_name',
+                                'target_schema_id', 'target_entity_name', 'target_field_name',
+                                name='unique_gold_mapping'),
+        ),
+    }
+    return tables
+
+
+# (table, column, referenced table) for every foreign key that gains ON DELETE CASCADE
+CASCADE_FOREIGN_KEYS = [
+    ('entities', 'schema_id', 'schemas'),
+    ('fields', 'entity_id', 'entities'),
+    ('field_matches', 'source_entity_id', 'entities'),
+    ('embeddings', 'field_id', 'fields'),
+    ('gold_mappings', 'source_schema_id', 'schemas'),
+    ('gold_mappings', 'target_schema_id', 'schemas'),
+]
+
+
+def _check_duplicates(bind):
+    checks = [('schemas', ['name']), ('entities', ['schema_id', 'name'])]
+    for table, columns in checks:
+        column_list = ', '.join(columns)
+        duplicates = bind.execute(sa.text(
+            f"SELECT {column_list}, COUNT(*) FROM {table} GROUP BY {column_list} HAVING COUNT(*) > 1"
+        )).fetchall()
+        if duplicates:
+            raise RuntimeError(
+                f"Cannot add a unique constraint on {table}({column_list}); merge or rename these duplicates first: "
+                f"{[tuple(row) for row in duplicates]}"
+            )
+
+
+def _delete_orphans_and_duplicate_embeddings():
+    # Rows left behind by deletes that did not cascade before this revision.
+    op.execute("DELETE FROM entities WHERE schema_id NOT IN (SELECT id FROM schemas)")
+    op.execute("DELETE FROM fields WHERE entity_id NOT IN (SELECT id FROM entities)")
+    op.execute("DELETE FROM embeddings WHERE field_id NOT IN (SELECT id FROM fields)")
+    op.execute("DELETE FROM field_matches WHERE source_entity_id NOT IN (SELECT id FROM entities)")
+    # Embeddings are a cache; keep the newest row per (field, model).
+    op.execute(
+        "DELETE FROM embeddings WHERE id NOT IN "
+        "(SELECT MAX(id) FROM embeddings GROUP BY field_id, model_name)"
+    )
+
+
+def _replace_foreign_keys(ondelete):
+    inspector = sa.inspect(op.get_bind())
+    for table, column, referred_table in CASCADE_FOREIGN_KEYS:
+        for foreign_key in inspector.get_foreign_keys(table):
+            if foreign_key['constrained_columns'] == [column] and foreign_key['name']:
+                op.drop_constraint(foreign_key['name'], table, type_='foreignkey')
+        op.create_foreign_key(f'fk_{table}_{column}', table, referred_table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    _check_duplicates(bind)
+    _delete_orphans_and_duplicate_embeddings()
+
+    if bind.dialect.name == 'sqlite':
+        for name, table in _tables(cascade=True).items():
+            with op.batch_alter_table(name, recreate='always', copy_from=table):
+                pass
+        return
+
+    op.create_unique_constraint('unique_schema_name', 'schemas', ['name'])
+    op.create_unique_constraint('unique_entity_name', 'entities', ['schema_id', 'name'])
+    op.create_index('ix_fields_entity_id', 'fields', ['entity_id'])
+    op.create_unique_constraint('unique_field_embedding', 'embeddings', ['field_id', 'model_name'])
+    op.drop_constraint('unique_field_match', 'field_matches', type_='unique')
+    op.create_unique_constraint('unique_field_match', 'field_matches', ['source_entity_id', 'model_name'])
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'sqlite':
+        for name, table in _tables(cascade=False).items():
+            with op.batch_alter_table(name, recreate='always', copy_from=table):
+                pass
+        return
+
+    _replace_foreign_keys(None)
+    op.drop_constraint('unique_field_match', 'field_matches', type_='unique')
+    op.create_unique_constraint('unique_field_match', 'field_matches', ['source_entity_id'])
+    op.drop_constraint('unique_field_embedding', 'embeddings', type_='unique')
+    op.drop_index('ix_fields_entity_id', table_name='fields')
+    op.drop_constraint('unique_entity_name', 'entities', type_='unique')
+    op.drop_constraint('unique_schema_name', 'schemas', type_='unique')
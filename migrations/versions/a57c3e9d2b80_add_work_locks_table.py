@@ -0,0 +1,32 @@
+"""Add work_locks table
+
+Revision ID: a57c3e9d2b80
+Revises: d82b5f0e6a19
+Create Date: 2026-10-19 20:11:27.548203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a57c3e9d2b80'
+down_revision: Union[str, None] = 'd82b5f0e6a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'work_locks',
+        sa.Column('key', sa.String(length=200), nullable=False),
+        sa.Column('owner', sa.String(length=64), nullable=False),
+        sa.Column('expires_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('work_locks')
@@ -0,0 +1,40 @@
+"""Add embedding_projections table
+
+Revision ID: a9c4e2b7d315
+Revises: e7a3c9d1f284
+Create Date: 2026-10-19 16:10:27.502913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e2b7d315'
+down_revision: Union[str, None] = 'e7a3c9d1f284'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'embedding_projections',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('model_name', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('method', sa.String(length=20), nullable=False),
+        sa.Column('input_dimension', sa.Integer(), nullable=False),
+        sa.Column('output_dimension', sa.Integer(), nullable=False),
+        sa.Column('mean', sa.LargeBinary(), nullable=False),
+        sa.Column('components', sa.LargeBinary(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('recall', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('model_name', 'version', name='unique_embedding_projection'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('embedding_projections')
@@ -0,0 +1,33 @@
+"""Add fields.type, fields.enum and fields.nullable
+
+Revision ID: b36f1d8e4c52
+Revises: a9c4e2b7d315
+Create Date: 2026-10-19 17:02:18.640115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b36f1d8e4c52'
+down_revision: Union[str, None] = 'a9c4e2b7d315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing fields keep NULL types, which are compatible with every type until their schema is re-imported.
+    with op.batch_alter_table('fields') as batch_op:
+        batch_op.add_column(sa.Column('type', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('enum', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('nullable', sa.Boolean(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('fields') as batch_op:
+        batch_op.drop_column('nullable')
+        batch_op.drop_column('enum')
+        batch_op.drop_column('type')
@@ -0,0 +1,36 @@
+"""Add field clusters table
+
+Revision ID: b94d2f7a6c15
+Revises: c61e8a4f7d53
+Create Date: 2026-10-19 22:41:07.318562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b94d2f7a6c15'
+down_revision: Union[str, None] = 'c61e8a4f7d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'field_clusters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('model_name', sa.String(), nullable=False),
+        sa.Column('field_id', sa.Integer(), nullable=False),
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.Column('similarity', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['field_id'], ['fields.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('model_name', 'field_id', name='unique_field_cluster')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('field_clusters')
@@ -0,0 +1,38 @@
+"""Key cached field matches by target entities and match options
+
+Revision ID: c4a91e7f0b25
+Revises: 8b7e4d2c1a90
+Create Date: 2026-10-19 12:05:44.530219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a91e7f0b25'
+down_revision: Union[str, None] = '8b7e4d2c1a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows keep the empty key: they are no longer served by /api/match-entities/ but are still exported.
+    with op.batch_alter_table('field_matches') as batch_op:
+        batch_op.add_column(sa.Column('cache_key', sa.String(length=40), nullable=False, server_default=''))
+        batch_op.drop_constraint('unique_field_match', type_='unique')
+        batch_op.create_unique_constraint('unique_field_match', ['source_entity_id', 'model_name', 'cache_key'])
+
+
+def downgrade() -> None:
+    # Keep the most recent result per (source entity, model) so the narrower constraint can be restored.
+    op.execute(
+        "DELETE FROM field_matches WHERE id NOT IN "
+        "(SELECT MAX(id) FROM field_matches GROUP BY source_entity_id, model_name)"
+    )
+    with op.batch_alter_table('field_matches') as batch_op:
+        batch_op.drop_constraint('unique_field_match', type_='unique')
+        batch_op.create_unique_constraint('unique_field_match', ['source_entity_id', 'model_name'])
+        batch_op.drop_column('cache_key')
@@ -0,0 +1,28 @@
+"""Add schema version
+
+Revision ID: c61e8a4f7d53
+Revises: a57c3e9d2b80
+Create Date: 2026-10-19 21:03:52.690174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61e8a4f7d53'
+down_revision: Union[str, None] = 'a57c3e9d2b80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('schemas') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('schemas') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,48 @@
+"""Add field match dependencies and dirty state
+
+Revision ID: d82b5f0e6a19
+Revises: f18d6a3c9e07
+Create Date: 2026-10-19 19:02:41.306518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd82b5f0e6a19'
+down_revision: Union[str, None] = 'f18d6a3c9e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('field_matches') as batch_op:
+        batch_op.add_column(sa.Column('match_options', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('dirty', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('pending_changes', sa.JSON(), nullable=True))
+
+    op.create_table(
+        'field_match_targets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('field_match_id', sa.Integer(), nullable=False),
+        sa.Column('target_entity_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['field_match_id'], ['field_matches.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['target_entity_id'], ['entities.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('field_match_id', 'target_entity_id', name='unique_field_match_target')
+    )
+    op.create_index(op.f('ix_field_match_targets_target_entity_id'), 'field_match_targets', ['target_entity_id'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_field_match_targets_target_entity_id'), table_name='field_match_targets')
+    op.drop_table('field_match_targets')
+
+    with op.batch_alter_table('field_matches') as batch_op:
+        batch_op.drop_column('pending_changes')
+        batch_op.drop_column('dirty')
+        batch_op.drop_column('match_options')
@@ -0,0 +1,33 @@
+"""Add entity_embeddings.text_hash, pooled and schema_version
+
+Revision ID: e5b8c1f47a26
+Revises: b94d2f7a6c15
+Create Date: 2026-10-19 23:12:54.207381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8c1f47a26'
+down_revision: Union[str, None] = 'b94d2f7a6c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows get no text hash, so their name/description embeddings are remade with the template once.
+    with op.batch_alter_table('entity_embeddings') as batch_op:
+        batch_op.add_column(sa.Column('text_hash', sa.String(length=40), nullable=True))
+        batch_op.add_column(sa.Column('pooled', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('schema_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('entity_embeddings') as batch_op:
+        batch_op.drop_column('schema_version')
+        batch_op.drop_column('pooled')
+        batch_op.drop_column('text_hash')
@@ -0,0 +1,56 @@
+"""Add embeddings.text_hash
+
+Revision ID: e7a3c9d1f284
+Revises: 5d2b8f3e6a17
+Create Date: 2026-10-19 15:02:41.318266
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c9d1f284'
+down_revision: Union[str, None] = '5d2b8f3e6a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('embeddings') as batch_op:
+        batch_op.add_column(sa.Column('text_hash', sa.String(length=40), nullable=True))
+
+    # Existing embeddings were made from the pre-template text; recording its hash keeps every embedding whose text
+    # the default template still produces, and leaves the others (e.g. camelCase names) to be re-embedded.
+    connection = op.get_bind()
+    embeddings = sa.table('embeddings', sa.column('id', sa.Integer), sa.column('field_id', sa.Integer),
+                          sa.column('text_hash', sa.String))
+    fields = sa.table('fields', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                      sa.column('description', sa.String))
+    rows = connection.execute(
+        sa.select(embeddings.c.id, fields.c.name, fields.c.description)
+        .select_from(embeddings.join(fields, fields.c.id == embeddings.c.field_id))
+    ).fetchall()
+    updates = [
+        {"embedding_id": embedding_id,
+         "text_hash": hashlib.sha1(f"Field: {name.replace('_', ' ')}. Description: {description}".encode("utf-8"))
+         .hexdigest()}
+        for embedding_id, name, description in rows
+    ]
+    statement = (
+        sa.update(embeddings)
+        .where(embeddings.c.id == sa.bindparam('embedding_id'))
+        .values(text_hash=sa.bindparam('text_hash'))
+    )
+    for start in range(0, len(updates), BATCH_SIZE):
+        connection.execute(statement, updates[start:start + BATCH_SIZE])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('embeddings') as batch_op:
+        batch_op.drop_column('text_hash')
@@ -0,0 +1,42 @@
+"""Add confirmed_mappings table
+
+Revision ID: f18d6a3c9e07
+Revises: b36f1d8e4c52
+Create Date: 2026-10-19 17:48:05.114902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f18d6a3c9e07'
+down_revision: Union[str, None] = 'b36f1d8e4c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'confirmed_mappings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_schema_id', sa.Integer(), nullable=False),
+        sa.Column('source_entity_name', sa.String(length=100), nullable=False),
+        sa.Column('source_field_name', sa.String(length=100), nullable=False),
+        sa.Column('target_schema_id', sa.Integer(), nullable=False),
+        sa.Column('target_entity_name', sa.String(length=100), nullable=False),
+        sa.Column('target_field_name', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.ForeignKeyConstraint(['source_schema_id'], ['schemas.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['target_schema_id'], ['schemas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_schema_id', 'source_entity_name', 'source_field_name',
+                            'target_schema_id', 'target_entity_name', 'target_field_name',
+                            name='unique_confirmed_mapping')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('confirmed_mappings')
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import time
+
+from app.encoders import (
+    EQUIVALENCE_TEXTS,
+    ONNX_MIN_COSINE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MIN_COSINE,
+    ONNX_QUANTIZED_MODEL_FILE,
+    OnnxEncoder,
+    check_equivalence,
+    export_onnx,
+)
+
+
+def encode_throughput(encoder, texts, repeats=3):
+    """Best-of-`repeats` encode throughput in texts per second."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encoder.encode(texts, convert_to_numpy=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(texts) / best
+
+
+def export_model(path, output_dir, quantize=False, intra_op_threads=None, texts=None):
+    """
+    Export a sentence-transformer to ONNX and compare it with the PyTorch model.
+
+    Args:
+        path (str): SentenceTransformer name or path.
+        output_dir (str): Export directory.
+        quantize (bool): Also export and check an int8 quantized model.
+        intra_op_threads (int): ONNX Runtime intra-op threads.
+        texts (list): Texts used for the equivalence and throughput checks.
+
+    Returns:
+        dict: Equivalence results, throughput (texts/s) and model file sizes (bytes) per backend.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    texts = texts or EQUIVALENCE_TEXTS * 64
+    reference = SentenceTransformer(path, device="cpu")
+    export_onnx(reference, output_dir, quantize)
+
+    report = {"torch": {"throughput": encode_throughput(reference, texts)}}
+    backends = [("onnx", False, ONNX_MIN_COSINE, ONNX_MODEL_FILE)]
+    if quantize:
+        backends.append(("onnx-int8", True, ONNX_QUANTIZED_MIN_COSINE, ONNX_QUANTIZED_MODEL_FILE))
+    for name, quantized, min_cosine, model_file in backends:
+        encoder = OnnxEncoder(output_dir, quantized, intra_op_threads)
+        report[name] = {
+            **check_equivalence(reference, encoder, texts[:len(EQUIVALENCE_TEXTS)], min_cosine),
+            "throughput": encode_throughput(encoder, texts),
+            "size_bytes": os.path.getsize(os.path.join(output_dir, model_file)),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a configured local model to ONNX and compare accuracy and CPU throughput with PyTorch."
+    )
+    parser.add_argument("model_name", help="Name of a local model in app.match.config.")
+    parser.add_argument("--quantize", action="store_true", help="Also export an int8 dynamically quantized model.")
+    parser.add_argument("--threads", type=int, help="ONNX Runtime intra-op threads (default: number of CPUs).")
+    parser.add_argument("--output-dir", help="Export directory (default: <onnx_model_dir>/<model_name>).")
+    args = parser.parse_args()
+
+    from app.match import config
+
+    model_config = next((model for model in config["models"] if model["name"] == args.model_name), None)
+    if not model_config or "path" not in model_config:
+        parser.error(f"{args.model_name} is not a local model")
+
+    output_dir = args.output_dir or os.path.join(config["onnx_model_dir"], args.model_name)
+    print(json.dumps(export_model(model_config["path"], output_dir, args.quantize, args.threads), indent=2))
@@ -0,0 +1,29 @@
+import argparse
+import json
+
+from app.reduction import DEFAULT_SAMPLE_SIZE, REDUCTION_METHODS, RECALL_K, fit_projection
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fit a PCA projection of a model's stored embeddings (or evaluate prefix truncation) and report "
+                    "its recall against full-dimension search."
+    )
+    parser.add_argument("model_name", help="Name of a model in app.match.config.")
+    parser.add_argument("--dimensions", type=int, required=True, help="Output dimension.")
+    parser.add_argument("--method", choices=REDUCTION_METHODS, default="pca",
+                        help="pca (fitted and stored as a new version) or truncate (Matryoshka models, evaluated only).")
+    parser.add_argument("--schema-id", dest="schema_ids", type=int, action="append",
+                        help="Fit on this schema's embeddings; repeat for several. Defaults to all schemas.")
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help="Maximum number of embeddings used for fitting and the recall check.")
+    parser.add_argument("--recall-k", type=int, default=RECALL_K, help="k of the recall@k check.")
+    parser.add_argument("--min-recall", type=float, help="Do not store a projection whose recall@k is below this.")
+    args = parser.parse_args()
+
+    from app.factory import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        print(json.dumps(fit_projection(args.model_name, args.dimensions, args.method, args.schema_ids,
+                                        args.sample_size, args.recall_k, args.min_recall), indent=2))
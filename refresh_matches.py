@@ -0,0 +1,21 @@
+import argparse
+
+from app.refresh import MATCH_K, refresh_dirty_matches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Refresh cached field matches marked dirty by schema changes (e.g. after api_entity_extractor.py)."
+    )
+    parser.add_argument("--limit", type=int, help="Refresh at most this many cached matches.")
+    parser.add_argument("--k", type=int, default=MATCH_K, help="Matches per source field the results were cached with.")
+    args = parser.parse_args()
+
+    from app.factory import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        counts = refresh_dirty_matches(args.limit, args.k)
+    print(f"Refreshed {counts['refreshed']} cached matches, deleted {counts['deleted']} that could not be refreshed, "
+          f"left {counts['deferred']} that kept changing for the next run.")
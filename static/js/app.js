@@ -1,61 +1,48 @@
 $(document).ready(function() {
-    // Initialize select2 dropdowns
-    $('.select2').select2();
-    
-    let schemas = [];
-    let sourceEntities = [];
-    let targetEntities = [];
-
-    // Fetch schemas
-    $.get('/api/schemas/', function(data) {
-        schemas = data.sort((a,b) => (a.name<b.name?-1:(a.name>b.name?1:0)));
-        const sourceSchemaSelect = $('#sourceSchema');
-        data.forEach(schema => {
-            sourceSchemaSelect.append(new Option(schema.name, schema.id));
+    // Pickers search names on the server as the user types (/api/search-names/) instead of loading every schema.
+    function namePicker(selector, placeholder, kind, schemaId, excludedSchemaId) {
+        $(selector).select2({
+            placeholder: placeholder,
+            ajax: {
+                url: '/api/search-names/',
+                dataType: 'json',
+                delay: 200,
+                data: search => ({q: search.term || '', kind: kind, schema_id: schemaId(), page: search.page || 1}),
+                processResults: data => ({
+                    results: data.results
+                        .filter(result => result.schema_id != excludedSchemaId())
+                        .map(result => ({id: result.id, text: result.name})),
+                    pagination: {more: data.page * data.per_page < data.total}
+                })
+            }
         });
-    });
+    }
+
+    function reset(selector, disabled) {
+        $(selector).val(null).trigger('change.select2').prop('disabled', disabled);
+    }
+
+    const none = () => undefined;
+    namePicker('#sourceSchema', 'Select Source Schema', 'schema', none, none);
+    namePicker('#sourceEntity', 'Select Source Entity', 'entity', () => $('#sourceSchema').val(), none);
+    namePicker('#targetSchema', 'Select Target Schema', 'schema', none, () => $('#sourceSchema').val());
+    namePicker('#targetEntities', 'Select Target Entities', 'entity', () => $('#targetSchema').val(), none);
 
     // Source schema change handler
     $('#sourceSchema').on('change', function() {
-        const schemaId = $(this).val();
-        const schema = schemas.find(s => s.id == schemaId);
-        
+        const selected = !!$(this).val();
+
         // Reset dependent fields
-        $('#sourceEntity').empty().append(new Option('Select Source Entity', '')).prop('disabled', !schema);
-        $('#targetSchema').empty().append(new Option('Select Target Schema', '')).prop('disabled', !schema);
-        $('#targetEntities').empty().prop('disabled', true);
+        reset('#sourceEntity', !selected);
+        reset('#targetSchema', !selected);
+        reset('#targetEntities', true);
         $('#matchButton').prop('disabled', true);
-        
-        if (schema) {
-            sourceEntities = schema.entities.sort((a,b) => (a.name<b.name?-1:(a.name>b.name?1:0)));
-            sourceEntities.forEach(entity => {
-                $('#sourceEntity').append(new Option(entity.name, entity.id));
-            });
-            
-            // Update target schema options
-            const targetSchemaSelect = $('#targetSchema');
-            schemas
-                .filter(s => s.id != schemaId)
-                .forEach(schema => {
-                    targetSchemaSelect.append(new Option(schema.name, schema.id));
-                });
-        }
     });
 
     // Target schema change handler
     $('#targetSchema').on('change', function() {
-        const schemaId = $(this).val();
-        const schema = schemas.find(s => s.id == schemaId);
-        
-        $('#targetEntities').empty().prop('disabled', !schema);
+        reset('#targetEntities', !$(this).val());
         $('#matchButton').prop('disabled', true);
-        
-        if (schema) {
-            targetEntities = schema.entities.sort((a,b) => (a.name<b.name?-1:(a.name>b.name?1:0)));
-            targetEntities.forEach(entity => {
-                $('#targetEntities').append(new Option(entity.name, entity.id));
-            });
-        }
     });
 
     // Source entity change handler
@@ -0,0 +1,29 @@
+import pytest
+from flask import Flask
+
+from app import match
+from app.database import db
+from app.encoders import HashingEncoder
+from app.storage import init_storage
+
+# Name of the offline model registered by `stub_model` (test modules import it from here).
+MODEL_NAME = "hashing-test"
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    init_storage(app, db, 'sqlite://')
+
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """Register a `HashingEncoder` as the MODEL_NAME model and return its config."""
+    model_config = {"name": MODEL_NAME, "instance": HashingEncoder(64)}
+    monkeypatch.setitem(match.config, "models", match.config["models"] + [model_config])
+    return model_config
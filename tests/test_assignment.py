@@ -0,0 +1,124 @@
+import faiss
+import numpy as np
+import pytest
+
+from app import assignment, match
+from app.assignment import assign_fields, assignment_from_mappings, dense_score_matrix, solve_assignment
+from app.database import get_entity_by_id, insert_or_update_entity, insert_or_update_schema
+from app.reduction import Projection
+from conftest import MODEL_NAME
+
+
+def test_hungarian_beats_greedy_on_conflicting_rows():
+    scores = np.array([[0.9, 0.8], [0.85, 0.1]])
+
+    assert sorted(solve_assignment(scores, method="hungarian")) == [(0, 1), (1, 0)]
+    assert sorted(solve_assignment(scores, method="greedy")) == [(0, 0), (1, 1)]
+
+
+def test_capacity_and_forbidden_pairs():
+    scores = np.array([[0.9, -np.inf], [0.8, 0.1], [0.7, 0.2]])
+
+    assert sorted(solve_assignment(scores, capacity=2, method="hungarian")) == [(0, 0), (1, 0), (2, 1)]
+    assert sorted(solve_assignment(scores, capacity=2, method="greedy")) == [(0, 0), (1, 0), (2, 1)]
+    assert solve_assignment(np.array([[-np.inf]]), method="hungarian") == []
+    with pytest.raises(ValueError, match="capacity"):
+        solve_assignment(scores, capacity=0)
+
+
+def test_greedy_assignment_is_one_to_one_at_scale():
+    scores = np.random.default_rng(0).random((2000, 3000), dtype=np.float32)
+
+    pairs = solve_assignment(scores, method="greedy")
+
+    assert len(pairs) > 1900
+    assert len({col for _, col in pairs}) == len(pairs)
+
+
+def test_dense_score_matrix_matches_faiss():
+    rng = np.random.default_rng(1)
+    queries = rng.random((4, 8), dtype=np.float32)
+    targets = rng.random((6, 8), dtype=np.float32)
+    index = faiss.IndexFlatL2(8)
+    index.add(targets)
+    distances, indices = index.search(queries, 6)
+
+    scores = dense_score_matrix(queries, targets)
+
+    np.testing.assert_allclose(np.take_along_axis(scores, indices, axis=1), 1 - distances, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("options", [{}, {"method": "greedy"}, {"hybrid": True}])
+def test_assign_fields_assigns_each_target_once(app, stub_model, options):
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    customer = insert_or_update_entity(source_schema.id, "Customer", "Customer details", [
+        {"name": "email", "description": "Email address"},
+        {"name": "email_backup", "description": "Backup email address"},
+        {"name": "phone", "description": "Phone number"},
+    ])
+    client = insert_or_update_entity(target_schema.id, "Client", "Client info", [
+        {"name": "email", "description": "Email address"},
+        {"name": "secondary_email", "description": "Secondary email address"},
+        {"name": "phone_number", "description": "Phone number"},
+    ])
+
+    field_mappings = assign_fields(get_entity_by_id(customer.id), [get_entity_by_id(client.id)], MODEL_NAME,
+                                   k=3, **options)
+    assignment = assignment_from_mappings(field_mappings)
+
+    assert assignment["email"]["target_field_name"] == "email"
+    assert assignment["email_backup"]["target_field_name"] == "secondary_email"
+    assert assignment["phone"]["target_field_name"] == "phone_number"
+    assert all(matches[0].get("assigned") and len(matches) == 3 for matches in field_mappings.values())
+
+
+def test_assign_fields_min_score_leaves_fields_unassigned(app, stub_model):
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    customer = insert_or_update_entity(source_schema.id, "Customer", "Customer details", [
+        {"name": "email", "description": "Email address"},
+    ])
+    client = insert_or_update_entity(target_schema.id, "Client", "Client info", [
+        {"name": "warehouse_code", "description": "Code of the warehouse"},
+    ])
+
+    field_mappings = assign_fields(get_entity_by_id(customer.id), [get_entity_by_id(client.id)], MODEL_NAME,
+                                   min_score=0.99)
+
+    assert assignment_from_mappings(field_mappings) == {"email": None}
+    assert field_mappings["email"][0]["target_field_name"] == "warehouse_code"
+
+
+def test_hungarian_is_refused_rather_than_approximated(app, stub_model, monkeypatch):
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    customer = insert_or_update_entity(source_schema.id, "Customer", None, [{"name": "email", "description": "Email"}])
+    client = insert_or_update_entity(target_schema.id, "Client", None, [{"name": "mail", "description": "Mail"}])
+    source_entity, target_entities = get_entity_by_id(customer.id), [get_entity_by_id(client.id)]
+
+    with pytest.raises(ValueError, match="hybrid"):
+        assign_fields(source_entity, target_entities, MODEL_NAME, method="hungarian", hybrid=True)
+    monkeypatch.setattr(assignment, "DENSE_LIMIT", 0)
+    with pytest.raises(ValueError, match="limited"):
+        assign_fields(source_entity, target_entities, MODEL_NAME, method="hungarian")
+    assert assignment_from_mappings(assign_fields(source_entity, target_entities, MODEL_NAME))["email"] is not None
+
+
+def test_dense_assignment_scores_in_the_reduced_space(app, stub_model, monkeypatch):
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    customer = insert_or_update_entity(source_schema.id, "Customer", None, [{"name": "email", "description": "Email"}])
+    client = insert_or_update_entity(target_schema.id, "Client", None, [
+        {"name": "mail", "description": "Mail"},
+        {"name": "email_address", "description": "Email address"},
+    ])
+    monkeypatch.setattr(assignment, "get_projection", lambda model: Projection("truncate", 8))
+    monkeypatch.setattr(match, "get_projection", lambda model: Projection("truncate", 8))
+    source_entity, target_entities = get_entity_by_id(customer.id), [get_entity_by_id(client.id)]
+
+    expected = match.match_fields(source_entity, target_entities, MODEL_NAME, k=2)
+    assigned = assign_fields(source_entity, target_entities, MODEL_NAME, k=2)
+
+    assert [(m["target_field_id"], pytest.approx(m["score"], abs=1e-5)) for m in assigned["email"]] == [
+        (m["target_field_id"], m["score"]) for m in expected["email"]]
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+import embedding_backfill
+from app import database, match
+from app.database import Embedding, db, fetch_entity_embeddings, insert_or_update_entity, insert_or_update_schema
+from app.field_text import build_field_text
+from app.storage import vector_metadata
+from embedding_backfill import backfill_model
+from conftest import MODEL_NAME
+
+
+def _schemas():
+    first = insert_or_update_schema("First")
+    second = insert_or_update_schema("Second")
+    customer = insert_or_update_entity(first.id, "Customer", "Customer", [
+        {"name": f"field_{i}", "description": f"Customer field {i}"} for i in range(30)
+    ])
+    order = insert_or_update_entity(second.id, "Order", "Order", [
+        {"name": f"field_{i}", "description": f"Order field {i}"} for i in range(5)
+    ])
+    return first, customer, order
+
+
+def test_backfill_is_resumable_and_filters_schemas(app, stub_model):
+    first, customer, order = _schemas()
+    match.embed_fields(match.get_model_config(MODEL_NAME), [
+        {"id": field.id, "name": field.name, "description": field.description} for field in customer.fields[:4]
+    ])
+    output = io.StringIO()
+
+    written = backfill_model(MODEL_NAME, [first.id], workers=0, batch_size=8, output=output)
+
+    assert written == 26
+    assert len(fetch_entity_embeddings([customer.id], MODEL_NAME)) == 30
+    assert fetch_entity_embeddings([order.id], MODEL_NAME) == []
+    assert "26/26 fields" in output.getvalue()
+    assert backfill_model(MODEL_NAME, [first.id], workers=0, output=None) == 0
+
+
+def test_backfill_with_process_pool(app, stub_model):
+    _, customer, order = _schemas()
+
+    written = backfill_model(MODEL_NAME, workers=2, batch_size=10, output=None)
+
+    assert written == 35
+    assert Embedding.query.filter_by(model_name=MODEL_NAME).count() == 35
+    model_config = match.get_model_config(MODEL_NAME)
+    expected = match.embed_text(model_config, build_field_text(
+        model_config, {"name": customer.fields[0].name, "description": customer.fields[0].description}))
+    stored = {item["field"]["id"]: item["embedding"] for item in fetch_entity_embeddings([customer.id], MODEL_NAME)}
+    assert stored[customer.fields[0].id].tolist() == pytest.approx(expected.tolist())
+
+
+def test_backfill_unknown_model(app):
+    with pytest.raises(ValueError):
+        backfill_model("no-such-model", workers=0)
+
+
+def test_backfill_prepares_vector_search(app, stub_model, monkeypatch):
+    _, customer, order = _schemas()
+    match.embed_fields(match.get_model_config(MODEL_NAME), [
+        {"id": field.id, "name": field.name, "description": field.description} for field in customer.fields
+    ])
+    # pgvector itself needs Postgres (see tests/test_storage.py); record what would be written instead.
+    vector_metadata.create_all(db.engine)
+    upserted, indexes = [], []
+    monkeypatch.setattr(database, "upsert_vectors", lambda session, rows: upserted.extend(rows))
+    monkeypatch.setattr(database, "create_vector_index", lambda session, *args: indexes.append(args))
+    monkeypatch.setattr(embedding_backfill, "vector_search_enabled", lambda app: True)
+
+    assert backfill_model(MODEL_NAME, workers=0, output=None) == 5
+
+    assert sorted(row["field_id"] for row in upserted) == [embedding.field_id for embedding in
+                                                             Embedding.query.order_by(Embedding.field_id)]
+    assert {row["entity_id"] for row in upserted} == {customer.id, order.id}
+    assert indexes == [(MODEL_NAME, 64)]
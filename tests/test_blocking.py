@@ -0,0 +1,101 @@
+from app import blocking
+from app.blocking import block_entities, entity_text, match_schema
+from app.database import (
+    EntityEmbedding,
+    get_entities_by_schema,
+    insert_or_update_entity,
+    insert_or_update_schema,
+)
+from conftest import MODEL_NAME
+
+
+def _schema_pair():
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    insert_or_update_entity(source_schema.id, "Customer", "Customer account details", [
+        {"name": "customer_name", "description": "Name of the customer"},
+        {"name": "customer_email", "description": "Email address of the customer"},
+    ])
+    insert_or_update_entity(source_schema.id, "Invoice", "Invoice issued for an order", [
+        {"name": "invoice_total", "description": "Total amount of the invoice"},
+        {"name": "invoice_date", "description": "Date the invoice was issued"},
+    ])
+    insert_or_update_entity(target_schema.id, "CustomerAccount", "Customer account information", [
+        {"name": "customer_full_name", "description": "Full name of the customer"},
+        {"name": "email_address", "description": "Email address of the customer"},
+    ])
+    insert_or_update_entity(target_schema.id, "InvoiceHeader", "Invoice header for an order", [
+        {"name": "invoice_amount", "description": "Total amount of the invoice"},
+        {"name": "issue_date", "description": "Date the invoice was issued"},
+    ])
+    insert_or_update_entity(target_schema.id, "Warehouse", "Warehouse location", [
+        {"name": "warehouse_code", "description": "Code of the warehouse"},
+        {"name": "city", "description": "City where the warehouse is located"},
+    ])
+    return get_entities_by_schema(source_schema.id), get_entities_by_schema(target_schema.id)
+
+
+def test_block_entities_returns_most_similar_targets(app, stub_model):
+    source_entities, target_entities = _schema_pair()
+
+    candidates = block_entities(source_entities, target_entities, MODEL_NAME, top_entities=2)
+
+    customer, invoice = source_entities
+    assert [entity["name"] for entity, _ in candidates[customer["id"]]][0] == "CustomerAccount"
+    assert [entity["name"] for entity, _ in candidates[invoice["id"]]][0] == "InvoiceHeader"
+    assert all(len(entity_candidates) == 2 for entity_candidates in candidates.values())
+    assert EntityEmbedding.query.count() == 5
+
+
+def test_match_schema_only_matches_fields_of_candidate_entities(app, stub_model):
+    source_entities, target_entities = _schema_pair()
+
+    results = match_schema(source_entities, target_entities, MODEL_NAME, top_entities=1, k=2)
+
+    customer, invoice = source_entities
+    account, header, _ = target_entities
+    assert results[customer["id"]]["candidate_entities"][0]["target_entity_id"] == account["id"]
+    assert {m["target_entity_id"] for matches in results[customer["id"]]["field_mappings"].values()
+            for m in matches} == {account["id"]}
+    assert results[invoice["id"]]["field_mappings"]["invoice_total"][0]["target_field_name"] == "invoice_amount"
+    assert {m["target_entity_id"] for matches in results[invoice["id"]]["field_mappings"].values()
+            for m in matches} == {header["id"]}
+
+
+def test_updating_an_entity_drops_its_entity_embedding(app, stub_model):
+    source_entities, target_entities = _schema_pair()
+    block_entities(source_entities, target_entities, MODEL_NAME)
+
+    insert_or_update_entity(source_entities[0]["schema_id"], "Customer", "Changed description", [])
+
+    assert EntityEmbedding.query.filter_by(entity_id=source_entities[0]["id"]).count() == 0
+
+
+def test_entity_vectors_are_cached_per_schema_version(app, stub_model, monkeypatch):
+    source_entities, target_entities = _schema_pair()
+    block_entities(source_entities, target_entities, MODEL_NAME)
+    loaded = []
+    load_entity_embeddings = blocking.load_entity_embeddings
+    monkeypatch.setattr(blocking, "load_entity_embeddings",
+                        lambda model, entity: loaded.append(entity["id"]) or load_entity_embeddings(model, entity))
+
+    first = block_entities(source_entities, target_entities, MODEL_NAME)
+    assert loaded == []
+
+    # Any change to the target schema rebuilds its entity vectors, and only those.
+    insert_or_update_entity(target_entities[2]["schema_id"], "Warehouse", "Warehouse location", [
+        {"name": "warehouse_code", "description": "Code of the warehouse"},
+    ])
+    target_entities = get_entities_by_schema(target_entities[0]["schema_id"])
+    second = block_entities(source_entities, target_entities, MODEL_NAME)
+    assert sorted(loaded) == sorted(entity["id"] for entity in target_entities)
+    assert [entity["name"] for entity, _ in second[source_entities[0]["id"]]][0] == "CustomerAccount"
+    assert first[source_entities[1]["id"]][0][0]["name"] == second[source_entities[1]["id"]][0][0]["name"]
+
+
+def test_entity_text_uses_the_model_template(stub_model):
+    entity = {"name": "customerAccount", "description": "Account details"}
+
+    assert entity_text(stub_model, entity) == "Field: customer Account. Description: Account details"
+    assert entity_text({**stub_model, "text_template": "{entity}: {entity_description}"}, entity) == (
+        "customer Account: Account details")
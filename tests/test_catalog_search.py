@@ -0,0 +1,59 @@
+import pytest
+
+from app.catalog_search import CatalogSearch
+from app.database import insert_or_update_entity, insert_or_update_schema
+
+
+@pytest.fixture
+def catalog(app):
+    sales = insert_or_update_schema("Sales")
+    crm = insert_or_update_schema("CRM")
+    insert_or_update_entity(sales.id, "CustomerAccount", "A customer account", [
+        {"name": "customerId", "description": "Identifier"},
+        {"name": "email_address", "description": "Email of the customer"},
+    ])
+    insert_or_update_entity(crm.id, "Contact", None, [
+        {"name": "mail", "description": "Email"},
+        {"name": "cust_no", "description": "Customer number"},
+    ])
+    return sales.id, crm.id
+
+
+def _names(page):
+    return [(result["kind"], result["name"]) for result in page["results"]]
+
+
+def test_names_are_ranked_by_how_they_match(catalog):
+    search = CatalogSearch()
+
+    assert _names(search.search("customer id"))[0] == ("field", "customerId")
+    cust = search.search("cust", kinds=("entity", "field"))
+    assert {name for _, name in _names(cust)[:3]} == {"CustomerAccount", "customerId", "cust_no"}
+    assert _names(cust)[-1] == ("field", "email_address")  # only its description matches
+    assert _names(search.search("mail")) == [("field", "mail"), ("field", "email_address")]
+    assert search.search("zzz")["total"] == 0
+
+
+def test_filters_and_pagination(catalog):
+    sales_id, crm_id = catalog
+    search = CatalogSearch()
+
+    assert _names(search.search("", kinds=("schema",))) == [("schema", "CRM"), ("schema", "Sales")]
+    assert _names(search.search("c", kinds=("entity",), schema_ids=[crm_id])) == [("entity", "Contact")]
+    first, second = (search.search("", kinds=("field",), page=page, per_page=3) for page in (1, 2))
+    assert first["total"] == second["total"] == 4
+    assert len(first["results"]) == 3 and len(second["results"]) == 1
+    with pytest.raises(ValueError):
+        search.search("c", kinds=("column",))
+
+
+def test_indexes_follow_schema_writes(catalog):
+    sales_id, crm_id = catalog
+    search = CatalogSearch()
+    search.search("")
+    crm_index = search.indexes([crm_id])[0]
+
+    insert_or_update_entity(sales_id, "Invoice", None, [{"name": "invoice_total", "description": "Total"}])
+
+    assert _names(search.search("invoice")) == [("entity", "Invoice"), ("field", "invoice_total")]
+    assert search.indexes([crm_id])[0] is crm_index  # unchanged schemas are not rebuilt
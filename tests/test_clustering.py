@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from app import match, metrics
+from app.clustering import (
+    cluster_fields,
+    cluster_vectors,
+    clusters_key,
+    near_duplicate_pairs,
+    representative_groups,
+)
+from app.database import (
+    FieldCluster,
+    get_entity_by_id,
+    get_field_clusters,
+    insert_or_update_entity,
+    insert_or_update_schema,
+)
+from conftest import MODEL_NAME
+
+
+EMAIL = {"name": "email", "description": "Email address of the customer"}
+PHONE = {"name": "phone", "description": "Phone number of the customer"}
+
+
+@pytest.fixture
+def catalog(app):
+    source = insert_or_update_schema("Source")
+    sales = insert_or_update_schema("Sales")
+    crm = insert_or_update_schema("CRM")
+    customer = insert_or_update_entity(source.id, "Customer", None, [
+        {"name": "email_address", "description": "Where to email the customer"},
+        {"name": "mobile", "description": "Mobile phone number"},
+    ])
+    account = insert_or_update_entity(sales.id, "Account", None, [EMAIL, PHONE, {"name": "city", "description": "City"}])
+    buyer = insert_or_update_entity(sales.id, "Buyer", None, [EMAIL, {"name": "total", "description": "Total spent"}])
+    contact = insert_or_update_entity(crm.id, "Contact", None, [EMAIL, PHONE])
+    return source.id, get_entity_by_id(customer.id), [get_entity_by_id(entity.id) for entity in (account, buyer, contact)]
+
+
+def _field_id(entity, name):
+    return next(field["id"] for field in entity["fields"] if field["name"] == name)
+
+
+def test_near_duplicates_are_clustered_by_connected_component():
+    vectors = np.array([[1, 0, 0], [0.99, 0.14, 0], [0, 1, 0], [0.951, 0.309, 0], [0, 0, 1]], dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    pairs = near_duplicate_pairs(vectors, threshold=0.95, batch_size=2)
+    assert [(i, j) for i, j, _ in pairs] == [(0, 1), (1, 3)]
+    assert all(score >= 0.95 for _, _, score in pairs)
+    # 0 and 3 are not near-duplicates themselves but are chained through 1, which represents the cluster.
+    assert cluster_vectors(vectors, threshold=0.95, batch_size=2) == [(1, [0, 1, 3])]
+
+
+def test_cluster_fields_stores_clusters_and_reports_them(catalog, stub_model):
+    source_id, customer, (account, buyer, contact) = catalog
+
+    report = cluster_fields(MODEL_NAME, threshold=0.99)
+
+    assert report["fields"] == 9
+    assert [(cluster["size"], cluster["schemas"]) for cluster in report["clusters"]] == [(3, 2), (2, 2)]
+    emails = report["clusters"][0]
+    assert [(member["entity_name"], member["field_name"]) for member in emails["members"]] == [
+        ("Account", "email"), ("Buyer", "email"), ("Contact", "email")]
+    assert all(member["similarity"] == pytest.approx(1.0) for member in emails["members"])
+    assert report["clustered_fields"] == 5
+    clusters = get_field_clusters(MODEL_NAME, [_field_id(entity, "email") for entity in (account, buyer, contact)])
+    assert set(clusters.values()) == {_field_id(account, "email")}
+
+    # Re-clustering a subset replaces only that subset's memberships.
+    report = cluster_fields(MODEL_NAME, schema_ids=[source_id], threshold=0.99)
+    assert report == {"fields": 2, "clustered_fields": 0, "clusters": []}
+    assert FieldCluster.query.count() == 5
+    with pytest.raises(ValueError):
+        cluster_fields("no-such-model")
+
+
+def test_representative_groups_keep_type_categories_apart():
+    field_ids = [10, 11, 12, 13, 14]
+    clusters = {11: 12, 12: 12, 13: 12, 14: 20}
+
+    assert representative_groups(field_ids, clusters) == {0: [0], 2: [2, 1, 3], 4: [4]}
+    assert representative_groups(field_ids, clusters, np.array([0, 0, 0, 1, 0])) == {
+        0: [0], 2: [2, 1], 3: [3], 4: [4]}
+
+
+def test_clustered_matching_expands_representatives(catalog, stub_model):
+    source_id, customer, targets = catalog
+    metrics.reset()
+    expected = match.match_fields(customer, targets, MODEL_NAME, k=4)
+    cluster_fields(MODEL_NAME, threshold=0.99)
+
+    clustered = match.match_fields(customer, targets, MODEL_NAME, k=4, clustered=True)
+
+    def ranking(field_mappings):
+        return {name: [(m["target_field_id"], round(m["score"], 5)) for m in matches]
+                for name, matches in field_mappings.items()}
+
+    assert ranking(clustered) == ranking(expected)
+    # Two of the three emails and one of the two phones are not indexed.
+    assert f'entity_matcher_cluster_members_pruned_total{{model="{MODEL_NAME}"}} 3' in metrics.render_prometheus()
+
+
+def test_edits_drop_stale_clusters(catalog, stub_model):
+    source_id, customer, (account, buyer, contact) = catalog
+    cluster_fields(MODEL_NAME, threshold=0.99)
+    field_ids = [field["id"] for entity in (account, buyer, contact) for field in entity["fields"]]
+    clustered_key = clusters_key(MODEL_NAME, field_ids)
+
+    # Contact's phone is edited; Account's email, which represents the email cluster, is edited in place.
+    insert_or_update_entity(contact["schema_id"], "Contact", None, [EMAIL, {**PHONE, "description": "Fax number"}])
+    insert_or_update_entity(account["schema_id"], "Account", None, [
+        {**EMAIL, "description": "Billing email"}, PHONE, {"name": "city", "description": "City"}])
+
+    assert get_field_clusters(MODEL_NAME, field_ids) == {_field_id(account, "phone"): _field_id(account, "phone")}
+    assert clusters_key(MODEL_NAME, field_ids) != clustered_key
+    cluster_fields(MODEL_NAME, threshold=0.99)
+    assert len(get_field_clusters(MODEL_NAME, field_ids)) == 2  # Buyer's and Contact's emails
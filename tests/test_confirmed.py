@@ -0,0 +1,91 @@
+import pytest
+
+from app import match, metrics
+from app.confirmed import decisions_key, field_decisions, resolved_fields
+from app.database import (
+    confirm_mapping,
+    delete_confirmed_mapping,
+    get_confirmed_mappings,
+    get_entity_by_id,
+    insert_or_update_entity,
+    insert_or_update_schema,
+)
+from conftest import MODEL_NAME
+
+
+@pytest.fixture
+def schemas(app):
+    source = insert_or_update_schema("Source")
+    target = insert_or_update_schema("Target")
+    customer = insert_or_update_entity(source.id, "Customer", "Customer", [
+        {"name": "email", "description": "Email address of the customer"},
+        {"name": "phone", "description": "Phone number of the customer"},
+    ])
+    contact = insert_or_update_entity(target.id, "Contact", "Contact", [
+        {"name": "email_address", "description": "Email address of the contact"},
+        {"name": "phone_number", "description": "Phone number of the contact"},
+        {"name": "mobile", "description": "Mobile phone number of the contact"},
+    ])
+    return get_entity_by_id(customer.id), get_entity_by_id(contact.id)
+
+
+def _confirm(schemas, source_field, target_field, status):
+    customer, contact = schemas
+    return confirm_mapping(customer["schema_id"], "Customer", source_field, contact["schema_id"], "Contact",
+                           target_field, status)
+
+
+def test_decisions_are_upserted_and_deleted(schemas):
+    first = _confirm(schemas, "email", "email_address", "rejected")
+    second = _confirm(schemas, "email", "email_address", "accepted")
+
+    customer, contact = schemas
+    stored = get_confirmed_mappings(customer["schema_id"], [contact["schema_id"]])
+    assert first.id == second.id
+    assert [mapping["status"] for mapping in stored] == ["accepted"]
+    assert get_confirmed_mappings(customer["schema_id"], [customer["schema_id"]]) == []
+    with pytest.raises(ValueError):
+        _confirm(schemas, "email", "mobile", "maybe")
+    assert delete_confirmed_mapping(second.id)
+    assert not delete_confirmed_mapping(second.id)
+
+
+def test_field_decisions_resolve_targets_by_name(schemas):
+    customer, contact = schemas
+    _confirm(schemas, "email", "email_address", "accepted")
+    _confirm(schemas, "phone", "phone_number", "rejected")
+    _confirm(schemas, "phone", "fax", "rejected")  # not a field of the targets
+
+    decisions = field_decisions(customer, [contact])
+    assert [field["name"] for _, field in decisions["email"]["accepted"]] == ["email_address"]
+    assert len(decisions["phone"]["rejected"]) == 1
+    assert resolved_fields(customer, decisions) == {"email"}
+    assert decisions_key(decisions) != decisions_key(field_decisions(customer, []))
+    assert decisions_key({}) is None
+
+
+def test_match_fields_uses_decisions(schemas, stub_model):
+    customer, contact = schemas
+    baseline = match.match_fields(customer, [contact], MODEL_NAME, k=2)
+    _confirm(schemas, "email", "mobile", "accepted")
+    _confirm(schemas, "phone", baseline["phone"][0]["target_field_name"], "rejected")
+    metrics.reset()
+
+    mappings = match.match_fields(customer, [contact], MODEL_NAME, k=2, confirmed=field_decisions(customer, [contact]))
+
+    assert mappings["email"] == [{**match._match_entry(contact["id"], contact["fields"][2], 1.0),
+                                  "match_type": "confirmed"}]
+    assert baseline["phone"][0]["target_field_id"] not in [m["target_field_id"] for m in mappings["phone"]]
+    assert len(mappings["phone"]) == 2
+    assert f'entity_matcher_confirmed_mappings_total{{model="{MODEL_NAME}"}} 1' in metrics.render_prometheus()
+
+
+def test_fully_decided_entities_are_not_searched(schemas, stub_model, monkeypatch):
+    customer, contact = schemas
+    _confirm(schemas, "email", "email_address", "accepted")
+    _confirm(schemas, "phone", "phone_number", "accepted")
+    monkeypatch.setattr(match, "_dense_matches", lambda *args: pytest.fail("searched a decided field"))
+
+    mappings = match.match_fields(customer, [contact], MODEL_NAME, confirmed=field_decisions(customer, [contact]))
+    assert {name: matches[0]["target_field_name"] for name, matches in mappings.items()} == {
+        "email": "email_address", "phone": "phone_number"}
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.database import (
+    Embedding,
+    Entity,
+    Field,
+    FieldMatch,
+    Schema,
+    db,
+    delete_entity,
+    get_matching_data_from_db,
+    insert_or_update_entity,
+    insert_or_update_schema,
+    store_embedding,
+    store_matching_data_in_db,
+)
+
+
+def _entity_with_embeddings():
+    schema = insert_or_update_schema("Schema")
+    entity = insert_or_update_entity(schema.id, "Customer", None, [
+        {"name": "email", "description": "Email"},
+        {"name": "phone", "description": "Phone"},
+    ])
+    for field in entity.fields:
+        store_embedding(field.id, "model", [1.0, 0.0])
+    store_matching_data_in_db({"id": entity.id}, "model", {"email": []})
+    return schema, entity
+
+
+def test_delete_entity_cascades(app):
+    _, entity = _entity_with_embeddings()
+
+    assert delete_entity(entity.id)
+
+    assert Field.query.count() == 0
+    assert Embedding.query.count() == 0
+    assert FieldMatch.query.count() == 0
+
+
+def test_replacing_fields_removes_their_embeddings(app):
+    schema, entity = _entity_with_embeddings()
+
+    insert_or_update_entity(schema.id, "Customer", None, [{"name": "email", "description": "Email"}])
+
+    # The unchanged email field keeps its embedding; the removed phone field's is deleted with it.
+    assert Field.query.count() == 1
+    assert [embedding.field_id for embedding in Embedding.query] == [Field.query.one().id]
+
+
+def test_deleting_schema_cascades(app):
+    schema, _ = _entity_with_embeddings()
+
+    db.session.delete(db.session.get(Schema, schema.id))
+    db.session.commit()
+
+    assert Entity.query.count() == 0
+    assert Embedding.query.count() == 0
+
+
+def test_entity_names_are_unique_per_schema(app):
+    schema, _ = _entity_with_embeddings()
+
+    db.session.add(Entity(name="Customer", schema_id=schema.id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+
+
+def test_match_cache_is_per_model(app):
+    _, entity = _entity_with_embeddings()
+
+    store_matching_data_in_db({"id": entity.id}, "other-model", {"phone": []})
+
+    assert get_matching_data_from_db({"id": entity.id}, "model") == {"email": []}
+    assert get_matching_data_from_db({"id": entity.id}, "other-model") == {"phone": []}
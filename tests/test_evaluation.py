@@ -0,0 +1,65 @@
+import pytest
+
+from app.database import add_gold_mapping, get_gold_mappings, insert_or_update_entity, insert_or_update_schema
+from app.encoders import HashingEncoder
+from app.evaluation import evaluate, load_gold_set, rank_of
+from benchmarks.synthetic import generate_schema_pair
+from conftest import MODEL_NAME
+
+
+@pytest.fixture
+def gold_schemas(app, stub_model, monkeypatch):
+    monkeypatch.setitem(stub_model, "instance", HashingEncoder(256))
+
+    source_entities, target_entities, gold = generate_schema_pair(num_entities=3, fields_per_entity=8, seed=1)
+    source_schema = insert_or_update_schema("Source")
+    target_schema = insert_or_update_schema("Target")
+    for entity in source_entities:
+        insert_or_update_entity(source_schema.id, entity["name"], entity["description"], entity["fields"])
+    for entity in target_entities:
+        insert_or_update_entity(target_schema.id, entity["name"], entity["description"], entity["fields"])
+    for (source_entity, source_field), (target_entity, target_field) in gold:
+        add_gold_mapping(source_schema.id, source_entity, source_field, target_schema.id, target_entity, target_field)
+    return source_schema.id, target_schema.id, len(gold)
+
+
+def test_add_gold_mapping_is_idempotent(gold_schemas):
+    source_schema_id, target_schema_id, gold_count = gold_schemas
+    first = get_gold_mappings(source_schema_id, target_schema_id)[0]
+
+    add_gold_mapping(source_schema_id, first["source_entity_name"], first["source_field_name"],
+                     target_schema_id, first["target_entity_name"], first["target_field_name"])
+
+    assert len(get_gold_mappings(source_schema_id, target_schema_id)) == gold_count
+
+
+def test_load_gold_set_skips_missing_fields(gold_schemas):
+    source_schema_id, target_schema_id, gold_count = gold_schemas
+    add_gold_mapping(source_schema_id, "Customer", "no_such_field", target_schema_id, "Client", "email")
+
+    source_entities, target_entities, expected, unresolved = load_gold_set(source_schema_id, target_schema_id)
+
+    assert len(source_entities) == len(target_entities) == 3
+    assert sum(len(targets) for targets in expected.values()) == gold_count
+    assert unresolved == 1
+
+
+def test_rank_of():
+    matches = [{"target_entity_id": 1, "target_field_name": "a"}, {"target_entity_id": 2, "target_field_name": "b"}]
+
+    assert rank_of(matches, {(2, "b")}) == 2
+    assert rank_of(matches, {(1, "b")}) is None
+
+
+def test_evaluate_reports_recall_and_mrr(gold_schemas):
+    source_schema_id, target_schema_id, gold_count = gold_schemas
+
+    report = evaluate(source_schema_id, target_schema_id, [(MODEL_NAME, "Flat"), (MODEL_NAME, "HNSW16")], ks=(1, 5))
+
+    assert report["unresolved"] == 0
+    flat, hnsw = report["results"]
+    assert flat["queries"] == hnsw["queries"] == gold_count
+    assert 0 < flat["recall@1"] <= flat["recall@5"] <= 1
+    assert flat["recall@1"] <= flat["mrr"] <= flat["recall@5"]
+    assert flat["cold_seconds"] is not None
+    assert hnsw["index_spec"] == "HNSW16"
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+
+from app.blocking import DEFAULT_TOP_ENTITIES
+from app.database import (
+    FieldMatch,
+    confirm_mapping,
+    get_matching_data_from_db,
+    insert_or_update_entity,
+    insert_or_update_schema,
+    match_cache_key,
+    store_matching_data_in_db,
+)
+from app.export import EXPORT_COLUMNS, encode_rows, iter_match_rows
+from conftest import MODEL_NAME
+
+
+def _setup_schema_pair():
+    source_schema = insert_or_update_schema("Source")
+    target_schema = insert_or_update_schema("Target")
+    other_schema = insert_or_update_schema("Other")
+    customer = insert_or_update_entity(source_schema.id, "Customer", "Customer details", [
+        {"name": "email", "description": "Email address"},
+        {"name": "name", "description": "Full name"},
+    ])
+    client = insert_or_update_entity(target_schema.id, "Client", "Client info", [
+        {"name": "email_address", "description": "Email"},
+        {"name": "full_name", "description": "Name"},
+    ])
+    other = insert_or_update_entity(other_schema.id, "Person", "Person", [
+        {"name": "mail", "description": "Mail"},
+    ])
+    email_address, full_name = client.fields
+    store_matching_data_in_db({"id": customer.id}, "stub", {
+        "email": [
+            {"target_entity_id": client.id, "target_field_id": email_address.id,
+             "target_field_name": "email_address", "target_field_description": "Email", "score": 0.9},
+            {"target_entity_id": other.id, "target_field_id": other.fields[0].id,
+             "target_field_name": "mail", "target_field_description": "Mail", "score": 0.8},
+            {"target_entity_id": client.id, "target_field_id": full_name.id,
+             "target_field_name": "full_name", "target_field_description": "Name", "score": 0.1},
+        ],
+    })
+    return source_schema, target_schema
+
+
+def test_iter_match_rows_filters_target_schema_and_score(app):
+    source_schema, target_schema = _setup_schema_pair()
+
+    rows = list(iter_match_rows(source_schema.id, target_schema.id, min_score=0.5))
+
+    assert [(row["source_field_name"], row["target_field_name"], row["rank"]) for row in rows] == [
+        ("email", "email_address", 1)
+    ]
+    assert rows[0]["origin"] == "stored"
+    assert rows[0]["model_name"] == "stub"
+
+
+def test_iter_match_rows_filters_model(app):
+    source_schema, target_schema = _setup_schema_pair()
+
+    assert list(iter_match_rows(source_schema.id, target_schema.id, model_name="openai")) == []
+    assert len(list(iter_match_rows(source_schema.id, target_schema.id, model_name="stub"))) == 2
+
+
+def test_encode_rows_ndjson_and_csv(app):
+    source_schema, target_schema = _setup_schema_pair()
+
+    ndjson = "".join(encode_rows(iter_match_rows(source_schema.id, target_schema.id), "ndjson"))
+    lines = [json.loads(line) for line in ndjson.splitlines()]
+    assert [line["target_field_name"] for line in lines] == ["email_address", "full_name"]
+
+    exported = "".join(encode_rows(iter_match_rows(source_schema.id, target_schema.id), "csv"))
+    reader = csv.DictReader(io.StringIO(exported))
+    assert reader.fieldnames == EXPORT_COLUMNS
+    assert [row["target_field_name"] for row in reader] == ["email_address", "full_name"]
+
+
+def test_iter_match_rows_exports_the_newest_result_for_the_target_schema(app):
+    source_schema, target_schema = _setup_schema_pair()
+    third_schema = insert_or_update_schema("Third")
+    customer = source_schema.entities[0]
+    account = insert_or_update_entity(third_schema.id, "Account", None, [{"name": "email", "description": "Email"}])
+    store_matching_data_in_db({"id": customer.id}, "stub", {
+        "email": [{"target_entity_id": account.id, "target_field_id": account.fields[0].id,
+                   "target_field_name": "email", "target_field_description": "Email", "score": 0.95}],
+    }, "third", target_entity_ids=[account.id])
+
+    rows = list(iter_match_rows(source_schema.id, target_schema.id, model_name="stub", min_score=0.5))
+    assert [row["target_field_name"] for row in rows] == ["email_address"]
+    assert [row["target_field_name"] for row in iter_match_rows(source_schema.id, third_schema.id)] == ["email"]
+
+
+def test_fresh_matches_apply_confirmed_mappings(app, stub_model):
+    source_schema = insert_or_update_schema("Source")
+    target_schema = insert_or_update_schema("Target")
+    insert_or_update_entity(source_schema.id, "Customer", None, [{"name": "email", "description": "Email address"}])
+    insert_or_update_entity(target_schema.id, "Client", None, [
+        {"name": "email_address", "description": "Email address"},
+        {"name": "contact", "description": "Contact"},
+    ])
+    confirm_mapping(source_schema.id, "Customer", "email", target_schema.id, "Client", "contact", "accepted")
+
+    rows = list(iter_match_rows(source_schema.id, target_schema.id, model_name=MODEL_NAME, include_fresh=True))
+
+    assert [(row["target_field_name"], row["score"], row["origin"]) for row in rows] == [("contact", 1.0, "fresh")]
+    assert "confirmed" in FieldMatch.query.one().match_options
+
+
+def test_fresh_matches_are_cached_under_the_match_endpoint_key(app, stub_model):
+    source_schema = insert_or_update_schema("Source")
+    target_schema = insert_or_update_schema("Target")
+    customer = insert_or_update_entity(source_schema.id, "Customer", None, [{"name": "email", "description": "Email"}])
+    client = insert_or_update_entity(target_schema.id, "Client", None, [{"name": "email", "description": "Email"}])
+
+    rows = list(iter_match_rows(source_schema.id, target_schema.id, model_name=MODEL_NAME, include_fresh=True))
+
+    # The key /api/match-entities/ computes when it blocks against the whole target schema.
+    cache_key = match_cache_key([client.id], hybrid=False, short_circuit=False, type_filter=True,
+                                top_entities=DEFAULT_TOP_ENTITIES)
+    assert get_matching_data_from_db({"id": customer.id}, MODEL_NAME, cache_key)["email"][0]["score"] == (
+        rows[0]["score"])
@@ -0,0 +1,107 @@
+import pytest
+
+from app import match
+from app.database import Embedding, db, insert_or_update_entity, insert_or_update_schema, store_embedding
+from app.encoders import HashingEncoder
+from app.field_text import (
+    DETAILED_TEMPLATE,
+    build_field_text,
+    normalize_identifier,
+    render_template,
+    text_hash,
+    truncate_text,
+)
+from conftest import MODEL_NAME
+
+
+class CountingEncoder(HashingEncoder):
+    def __init__(self, dimension=64):
+        super().__init__(dimension)
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return super().encode(texts, **kwargs)
+
+
+@pytest.fixture
+def stub_model(stub_model, monkeypatch):
+    """The conftest model, recording the texts it embeds."""
+    monkeypatch.setitem(stub_model, "instance", CountingEncoder())
+    return stub_model
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("customer_name", "customer name"),
+    ("customerID", "customer ID"),
+    ("HTTPStatusCode", "HTTP Status Code"),
+    ("address_line2", "address line 2"),
+    ("kebab-case", "kebab case"),
+])
+def test_normalize_identifier(name, expected):
+    assert normalize_identifier(name) == expected
+
+
+def test_default_template_matches_legacy_text():
+    field = {"name": "customer_name", "description": "Name of the customer"}
+
+    assert build_field_text({}, field) == "Field: customer name. Description: Name of the customer"
+
+
+def test_detailed_template_skips_empty_parts():
+    model_config = {"text_template": DETAILED_TEMPLATE}
+    field = {"name": "orderStatus", "description": "Status of the order", "type": "string",
+             "enum": ["open", "closed"]}
+
+    assert build_field_text(model_config, field, {"name": "SalesOrder", "description": None}) == (
+        "Field: order Status. Type: string. Allowed values: open, closed. Entity: Sales Order. "
+        "Description: Status of the order"
+    )
+    assert build_field_text(model_config, {"name": "id", "description": ""}) == "Field: id."
+
+
+def test_unknown_placeholder():
+    with pytest.raises(ValueError):
+        render_template("Field: {name} {unit}", {"name": "x"})
+
+
+def test_truncate_text_to_token_limit():
+    text = "word " * 100
+
+    assert truncate_text({"provider": "openai", "max_tokens": 10}, text) != text
+    assert len(truncate_text({"provider": "openai", "max_tokens": 10}, text)) <= 40
+    assert truncate_text({"provider": "openai", "max_tokens": 1000}, text) == text
+    assert truncate_text({"name": "no-limit"}, text) == text
+
+
+def test_template_change_reembeds_only_changed_fields(app, stub_model):
+    schema = insert_or_update_schema("Schema")
+    entity = insert_or_update_entity(schema.id, "Customer", "Customer", [
+        {"name": "customer_name", "description": "Name"},
+        {"name": "customerId", "description": "Identifier"},
+    ])
+    snake, camel = entity.fields
+    # Embeddings stored before templates existed, with the hash of the text they were made from.
+    for field in (snake, camel):
+        legacy_text = f"Field: {field.name.replace('_', ' ')}. Description: {field.description}"
+        store_embedding(field.id, MODEL_NAME, [1.0] * 64, text_hash(legacy_text))
+    entity_dict = {"id": entity.id, "name": entity.name, "description": entity.description,
+                   "fields": [{"id": field.id, "name": field.name, "description": field.description}
+                              for field in (snake, camel)]}
+    model_config = match.get_model_config(MODEL_NAME)
+    encoder = model_config["instance"]
+
+    match.load_entity_embeddings(model_config, entity_dict)
+    assert encoder.texts == ["Field: customer Id. Description: Identifier"]
+
+    encoder.texts.clear()
+    assert match.stale_fields(model_config, [entity.id]) == []
+    match.load_entity_embeddings(model_config, entity_dict)
+    assert encoder.texts == []
+
+    stub_model["text_template"] = "{entity}: {name}"
+    assert {field["id"] for field in match.stale_fields(model_config, [entity.id])} == {snake.id, camel.id}
+    match.load_entity_embeddings(model_config, entity_dict)
+    assert sorted(encoder.texts) == ["Customer: customer Id", "Customer: customer name"]
+    stored = db.session.query(Embedding.field_id, Embedding.text_hash).filter_by(model_name=MODEL_NAME)
+    assert dict(stored) == {snake.id: text_hash("Customer: customer name"), camel.id: text_hash("Customer: customer Id")}
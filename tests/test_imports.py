@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ML_MODULES = ("torch", "faiss", "sentence_transformers", "transformers", "openai", "scipy")
+
+
+def _loaded_ml_modules(code):
+    """Run `code` in a fresh interpreter and return the ML modules it ended up importing."""
+    script = code + f"\nimport json, sys\nprint(json.dumps([m for m in {ML_MODULES!r} if m in sys.modules]))\n"
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=120,
+                            env={**os.environ, "DATABASE_URL": "sqlite://", "PGVECTOR": ""})
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_extractor_import_does_not_load_ml_dependencies():
+    assert _loaded_ml_modules(
+        "import api_entity_extractor\n"
+        "from app.factory import create_app\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        "    api_entity_extractor.insert_or_update_schema('Imported')\n"
+    ) == []
+
+
+def test_crud_endpoints_do_not_load_ml_dependencies():
+    assert _loaded_ml_modules(
+        "from main import app\n"
+        "client = app.test_client()\n"
+        "assert client.post('/api/schema', json={'schema_name': 'Crud'}).status_code == 201\n"
+        "assert client.get('/api/schemas/').status_code == 200\n"
+    ) == []
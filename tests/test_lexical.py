@@ -0,0 +1,94 @@
+import pytest
+
+from app import match
+from app.database import (
+    fetch_entity_embeddings,
+    get_entity_by_id,
+    insert_or_update_entity,
+    insert_or_update_schema,
+    match_cache_key,
+)
+from app.lexical import BM25Index, fuse, normalize_name, split_identifier, tokenize
+from conftest import MODEL_NAME
+
+
+def test_tokenize_splits_identifiers_and_expands_abbreviations():
+    assert split_identifier("customerID_v2") == ["customer", "id", "v", "2"]
+    assert split_identifier("HTTPResponseCode") == ["http", "response", "code"]
+    assert normalize_name("custId") == normalize_name("customer_id") == normalize_name("CUSTOMER-ID") == "customer id"
+    assert tokenize("The order qty of the txn") == ["order", "quantity", "transaction"]
+
+
+def test_bm25_ranks_name_matches_first():
+    index = BM25Index([
+        {"name": "email_address", "description": "Email address of the client"},
+        {"name": "client_name", "description": "Name of the client"},
+        {"name": "orderQty", "description": "Ordered items"},
+    ])
+
+    assert [doc_id for doc_id, _, _ in index.search("email", k=3)] == [0]
+    assert index.search("quantity", k=3)[0][0] == 2
+    assert index.search("name", k=3)[0][2] == 1.0
+    assert index.exact_matches("order_quantity") == [2]
+    assert index.search("unrelated") == []
+
+
+def test_fuse_combines_dense_and_lexical_candidates():
+    dense = [{"target_field_id": 1, "score": 0.8}, {"target_field_id": 2, "score": 0.6}]
+    lexical = [{"target_field_id": 3, "lexical_score": 1.0}, {"target_field_id": 2, "lexical_score": 0.5}]
+
+    fused = fuse(dense, lexical, lexical_weight=0.5, k=3)
+
+    assert [candidate["target_field_id"] for candidate in fused] == [3, 2, 1]
+    assert fused[0]["dense_score"] == 0.6
+    assert fused[1]["score"] == pytest.approx(0.55)
+
+
+def _customer_and_client():
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    customer = insert_or_update_entity(source_schema.id, "Customer", "Customer details", [
+        {"name": "customerId", "description": "Identifier of the customer"},
+        {"name": "email", "description": "Email address of the customer"},
+    ])
+    client = insert_or_update_entity(target_schema.id, "Client", "Client info", [
+        {"name": "customer_id", "description": "Identifier"},
+        {"name": "email_address", "description": "Email address of the client"},
+        {"name": "is_active", "description": "Whether the client is active"},
+    ])
+    return get_entity_by_id(customer.id), get_entity_by_id(client.id)
+
+
+def test_short_circuit_skips_embedding_exact_names(app, stub_model):
+    customer, client = _customer_and_client()
+
+    matches = match.match_fields(customer, [client], MODEL_NAME, short_circuit=True)
+
+    assert matches["customerId"] == [{
+        "target_entity_id": client["id"],
+        "target_field_id": client["fields"][0]["id"],
+        "target_field_name": "customer_id",
+        "target_field_description": "Identifier",
+        "score": 1.0,
+        "match_type": "exact_name",
+    }]
+    assert matches["email"][0]["target_field_name"] == "email_address"
+    embedded = {embedding["field"]["name"] for embedding in fetch_entity_embeddings([customer["id"]], MODEL_NAME)}
+    assert embedded == {"email"}
+
+
+def test_hybrid_returns_fused_scores(app, stub_model):
+    customer, client = _customer_and_client()
+
+    matches = match.match_fields(customer, [client], MODEL_NAME, k=2, hybrid=True)
+
+    assert matches["customerId"][0]["target_field_name"] == "customer_id"
+    assert matches["email"][0]["target_field_name"] == "email_address"
+    assert all(len(field_matches) == 2 for field_matches in matches.values())
+    assert all({"dense_score", "lexical_score"} <= set(m) for m in matches["email"])
+
+
+def test_match_cache_key_depends_on_targets_and_options():
+    assert match_cache_key([3, 1, 2]) == match_cache_key([1, 2, 3])
+    assert match_cache_key([1, 2]) != match_cache_key([1, 2, 3])
+    assert match_cache_key([1], hybrid=True) != match_cache_key([1], hybrid=False)
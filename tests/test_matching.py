@@ -1,9 +1,45 @@
-from app.matching import match_entities
-from app.database import add_schema, initialize_db
-
-def test_match_entities():
-    initialize_db()
-    source_schema_id = add_schema("Source Schema", {"Customer": {"description": "Customer details", "fields": ["name", "email"]}})
-    target_schema_id = add_schema("Target Schema", {"Client": {"description": "Client info", "fields": ["name", "email_address"]}})
-    matches = match_entities(source_schema_id, target_schema_id, "Customer")
-    assert len(matches) > 0
+import pytest
+
+from app import match
+from app.database import fetch_entity_embeddings, get_entity_by_id, insert_or_update_entity, insert_or_update_schema
+from benchmarks.synthetic import generate_schema_pair
+from conftest import MODEL_NAME
+
+
+def test_match_fields(app, stub_model):
+    source_schema = insert_or_update_schema("Source Schema")
+    target_schema = insert_or_update_schema("Target Schema")
+    customer = insert_or_update_entity(source_schema.id, "Customer", "Customer details", [
+        {"name": "customer_name", "description": "Name of the customer"},
+        {"name": "email", "description": "Email address of the customer"},
+    ])
+    client = insert_or_update_entity(target_schema.id, "Client", "Client info", [
+        {"name": "email_address", "description": "Email address of the client"},
+        {"name": "client_name", "description": "Name of the client"},
+        {"name": "is_active", "description": "Whether the client is active"},
+    ])
+
+    matches = match.match_fields(get_entity_by_id(customer.id), [get_entity_by_id(client.id)], MODEL_NAME)
+
+    assert set(matches) == {"customer_name", "email"}
+    assert matches["email"][0]["target_field_name"] == "email_address"
+    assert matches["customer_name"][0]["target_field_name"] == "client_name"
+    assert all(type(m["score"]) is float for m in matches["email"])
+    assert len(fetch_entity_embeddings([customer.id, client.id], MODEL_NAME)) == 5
+
+
+def test_match_fields_unknown_model(app):
+    with pytest.raises(ValueError):
+        match.match_fields({"id": 1, "fields": []}, [], "no-such-model")
+
+
+def test_generate_schema_pair_is_deterministic():
+    first = generate_schema_pair(num_entities=15, fields_per_entity=30, seed=7)
+    second = generate_schema_pair(num_entities=15, fields_per_entity=30, seed=7)
+
+    assert first == second
+    source_entities, target_entities, gold = first
+    assert len(source_entities) == len(target_entities) == 15
+    assert all(len(entity["fields"]) == 30 for entity in source_entities)
+    assert len(gold) == 15 * 30
+    assert len({entity["name"] for entity in source_entities}) == 15
@@ -0,0 +1,46 @@
+import pytest
+
+from app import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_and_histograms_render_as_prometheus_text():
+    metrics.increment("embedding_cache_hits_total", 3, model="openai")
+    metrics.increment("embedding_cache_hits_total", model="openai")
+    with metrics.timed("faiss_search"):
+        pass
+
+    text = metrics.render_prometheus()
+
+    assert "# TYPE entity_matcher_embedding_cache_hits_total counter" in text
+    assert 'entity_matcher_embedding_cache_hits_total{model="openai"} 4' in text
+    assert 'entity_matcher_stage_duration_seconds_bucket{stage="faiss_search",le="+Inf"} 1' in text
+    assert 'entity_matcher_stage_duration_seconds_count{stage="faiss_search"} 1' in text
+
+
+def test_unknown_metric_names_are_rejected():
+    with pytest.raises(ValueError):
+        metrics.increment("no_such_counter")
+    with pytest.raises(ValueError):
+        metrics.observe("no_such_histogram", 1.0)
+
+
+def test_request_timing_collects_stage_totals():
+    metrics.start_request_timing()
+    with metrics.timed("generate_embeddings"):
+        pass
+    with metrics.timed("generate_embeddings"):
+        pass
+    timings = metrics.stop_request_timing()
+
+    assert list(timings) == ["generate_embeddings"]
+    assert metrics.server_timing_header({"faiss_search": 0.0015}) == "faiss_search;dur=1.50"
+    with metrics.timed("faiss_build"):
+        pass
+    assert metrics.stop_request_timing() == {}
@@ -0,0 +1,97 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+torch = pytest.importorskip("torch")
+
+from sentence_transformers import SentenceTransformer, models
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+from app import match
+from app.database import Embedding, get_entity_by_id, insert_or_update_entity, insert_or_update_schema
+from app.encoders import (
+    ONNX_QUANTIZED_MODEL_FILE,
+    OnnxEncoder,
+    check_equivalence,
+    embedding_model_name,
+    export_onnx,
+)
+from conftest import MODEL_NAME
+
+TEXTS = ["Field: customer id. Description: Identifier of the customer", "Field: email", "Field: name. " * 20]
+
+
+@pytest.fixture(scope="module")
+def tiny_model_dir(tmp_path_factory):
+    """A small, randomly initialized BERT sentence-transformer saved to disk (no download needed)."""
+    model_dir = str(tmp_path_factory.mktemp("tiny-model"))
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab += [chr(c) for c in range(97, 123)] + ["##" + chr(c) for c in range(97, 123)]
+    vocab += ["field", "description", "customer", "email", "name", "id", "."]
+    with open(os.path.join(model_dir, "vocab.txt"), "w") as f:
+        f.write("\n".join(vocab))
+    torch.manual_seed(0)
+    bert_dir = os.path.join(model_dir, "bert")
+    BertModel(BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                         intermediate_size=64, max_position_embeddings=128)).save_pretrained(bert_dir)
+    BertTokenizerFast(vocab_file=os.path.join(model_dir, "vocab.txt")).save_pretrained(bert_dir)
+    SentenceTransformer(modules=[
+        models.Transformer(bert_dir, max_seq_length=64),
+        models.Pooling(32, "mean"),
+        models.Normalize(),
+    ]).save(os.path.join(model_dir, "sentence-transformer"))
+    return os.path.join(model_dir, "sentence-transformer")
+
+
+def test_export_matches_pytorch(tiny_model_dir, tmp_path):
+    reference = SentenceTransformer(tiny_model_dir, device="cpu")
+    export_onnx(reference, str(tmp_path), quantize=True)
+
+    encoder = OnnxEncoder(str(tmp_path), intra_op_threads=1, batch_size=2)
+    quantized = OnnxEncoder(str(tmp_path), quantized=True, intra_op_threads=1)
+
+    assert encoder.encode(TEXTS).shape == (3, 32)
+    assert check_equivalence(reference, encoder, TEXTS)["passed"]
+    assert check_equivalence(reference, quantized, TEXTS, min_cosine=0.9)["passed"]
+    assert os.path.getsize(tmp_path / ONNX_QUANTIZED_MODEL_FILE) < os.path.getsize(tmp_path / "model.onnx")
+
+
+def test_model_config_selects_onnx_backend(tiny_model_dir, tmp_path, monkeypatch):
+    model_config = {"name": "tiny-onnx", "path": tiny_model_dir, "backend": "onnx", "intra_op_threads": 1}
+    monkeypatch.setitem(match.config, "models", match.config["models"] + [model_config])
+    monkeypatch.setitem(match.config, "onnx_model_dir", str(tmp_path))
+
+    instance = match.get_model_config("tiny-onnx")["instance"]
+
+    assert isinstance(instance, OnnxEncoder)
+    assert os.path.exists(tmp_path / "tiny-onnx" / "model.onnx")
+    reference = SentenceTransformer(tiny_model_dir, device="cpu").encode(TEXTS)
+    np.testing.assert_allclose(instance.encode(TEXTS), reference, atol=1e-4)
+
+
+def test_cached_export_is_loaded_without_torch(tiny_model_dir, tmp_path, monkeypatch):
+    model_config = {"name": "tiny-onnx", "path": tiny_model_dir, "backend": "onnx", "quantize": True}
+    export_onnx(SentenceTransformer(tiny_model_dir, device="cpu"), str(tmp_path / "tiny-onnx"), quantize=True)
+    monkeypatch.setitem(match.config, "onnx_model_dir", str(tmp_path))
+    monkeypatch.setitem(sys.modules, "torch", None)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+
+    assert isinstance(match.load_local_model(model_config), OnnxEncoder)
+
+
+def test_onnx_embeddings_are_stored_apart(app, stub_model, monkeypatch):
+    schema = insert_or_update_schema("Schema")
+    entity = get_entity_by_id(insert_or_update_entity(schema.id, "Customer", None, [{"name": "email"}]).id)
+    match.load_entity_embeddings(stub_model, entity)
+
+    monkeypatch.setitem(stub_model, "backend", "onnx")
+    monkeypatch.setitem(stub_model, "quantize", True)
+    assert embedding_model_name(stub_model) == f"{MODEL_NAME}@onnx-int8"
+    assert match.stale_fields(stub_model, [entity["id"]])[0]["name"] == "email"
+    match.load_entity_embeddings(stub_model, entity)
+
+    assert sorted(name for (name,) in Embedding.query.with_entities(Embedding.model_name)) == [
+        MODEL_NAME, f"{MODEL_NAME}@onnx-int8"]
@@ -0,0 +1,147 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from openai import BadRequestError, InternalServerError
+
+from app import match
+from app.database import fetch_entity_embeddings, insert_or_update_entity, insert_or_update_schema
+from app.openai_client import EmbeddingClient, RateLimiter, batch_by_tokens
+
+
+class MockEmbeddingsServer(ThreadingHTTPServer):
+    """Minimal /v1/embeddings endpoint; `failures` is a list of status codes returned before succeeding."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MockEmbeddingsHandler)
+        self.requests = []
+        self.failures = []
+        self.lock = threading.Lock()
+
+
+class MockEmbeddingsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append(body)
+            status = self.server.failures.pop(0) if self.server.failures else 200
+        if status != 200:
+            self._send(status, {"error": {"message": "mock failure", "type": "mock"}}, [("Retry-After", "0")])
+            return
+
+        dimensions = body.get("dimensions", 4)
+        data = []
+        for index, text in enumerate(body["input"]):
+            vector = np.full(dimensions, len(text), dtype="float32")
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(text) // 4 + 1 for text in body["input"])
+        self._send(200, {"object": "list", "data": data, "model": body["model"],
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+
+@pytest.fixture
+def server():
+    server = MockEmbeddingsServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def _client(server, **kwargs):
+    return EmbeddingClient(api_key="test-key", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                           base_delay=0.01, **kwargs)
+
+
+def test_batch_by_tokens():
+    assert batch_by_tokens([3, 3, 3, 10, 1], max_request_tokens=6) == [[0, 1], [2], [3], [4]]
+    assert batch_by_tokens([1] * 5, max_batch_size=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_embed_batches_and_keeps_order(server):
+    texts = [f"text {'x' * i}" for i in range(50)]
+
+    embeddings = _client(server, dimensions=8, max_batch_size=8).embed(texts)
+
+    assert embeddings.shape == (50, 8)
+    np.testing.assert_array_equal(embeddings[:, 0], [len(text) for text in texts])
+    assert len(server.requests) == 7
+    assert all(request["dimensions"] == 8 and request["model"] == "text-embedding-3-small"
+               for request in server.requests)
+
+
+def test_embed_retries_rate_limits_and_server_errors(server):
+    server.failures = [429, 500, 503]
+
+    embeddings = _client(server).embed(["a", "bb"])
+
+    assert embeddings[:, 0].tolist() == [1.0, 2.0]
+    assert len(server.requests) == 4
+
+
+def test_embed_does_not_retry_client_errors(server):
+    server.failures = [400]
+
+    with pytest.raises(BadRequestError):
+        _client(server).embed(["a"])
+    assert len(server.requests) == 1
+
+
+def test_rate_limiter_waits_for_budget():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=6000)
+    limiter.available["tokens"] = 0
+
+    start = time.perf_counter()
+    asyncio.run(limiter.acquire(20))
+
+    assert time.perf_counter() - start >= 0.15
+    assert limiter.available["requests"] == pytest.approx(599, abs=1)
+
+
+def test_embed_fields_uses_one_request_per_batch(app, server, monkeypatch):
+    model = {"name": "openai-mock", "provider": "openai", "model": "text-embedding-3-small",
+             "instance": _client(server, dimensions=16)}
+    monkeypatch.setitem(match.config, "models", match.config["models"] + [model])
+    schema = insert_or_update_schema("Schema")
+    entity = insert_or_update_entity(schema.id, "Customer", "Customer", [
+        {"name": f"field_{i}", "description": f"Field number {i}"} for i in range(20)
+    ])
+
+    match.embed_fields(model, [{"id": field.id, "name": field.name, "description": field.description}
+                               for field in entity.fields])
+
+    assert len(server.requests) == 1
+    stored = fetch_entity_embeddings([entity.id], "openai-mock")
+    assert len(stored) == 20 and all(item["embedding"].shape == (16,) for item in stored)
+
+
+def test_exhausted_retries_are_logged_and_raised(server, caplog):
+    server.failures = [500, 500]
+    model = {"name": "openai-mock", "provider": "openai", "instance": _client(server, max_retries=1)}
+
+    with pytest.raises(InternalServerError):
+        match.embed_texts(model, ["a"])
+    assert "Embedding 1 text(s) with openai-mock failed" in caplog.text
+    assert len(server.requests) == 2
@@ -0,0 +1,103 @@
+import pytest
+
+from app import match, metrics, pivot
+from app.database import (
+    FieldMatch,
+    get_entity_by_id,
+    insert_or_update_entity,
+    insert_or_update_schema,
+    match_cache_key,
+    store_matching_data_in_db,
+)
+from app.pivot import compose_matches, pivot_entity_ids, pivot_mappings
+from app.refresh import refresh_dirty_matches
+from conftest import MODEL_NAME
+
+
+@pytest.fixture
+def schemas(app):
+    canonical = insert_or_update_schema("Canonical")
+    person = insert_or_update_entity(canonical.id, "Person", "Person", [
+        {"name": "email_address", "description": "Email address"},
+        {"name": "phone_number", "description": "Phone number"},
+    ])
+    customer = insert_or_update_entity(insert_or_update_schema("A").id, "Customer", "Customer", [
+        {"name": "email", "description": "Email of the customer"},
+        {"name": "phone", "description": "Phone of the customer"},
+        {"name": "loyalty", "description": "Loyalty points"},
+    ])
+    client = insert_or_update_entity(insert_or_update_schema("B").id, "Client", "Client", [
+        {"name": "mail", "description": "Mail of the client"},
+        {"name": "telephone", "description": "Telephone of the client"},
+    ])
+    return canonical, get_entity_by_id(person.id), get_entity_by_id(customer.id), get_entity_by_id(client.id)
+
+
+def _store(entity, person, edges):
+    """Store entity -> pivot matches given as {field name: [(pivot field index, score)]}."""
+    store_matching_data_in_db(entity, MODEL_NAME, {
+        field_name: [match._match_entry(person["id"], person["fields"][index], score) for index, score in matches]
+        for field_name, matches in edges.items()
+    }, "stored")
+
+
+def test_compose_matches_joins_through_the_pivot(schemas, stub_model):
+    canonical, person, customer, client = schemas
+    _store(customer, person, {"email": [(0, 0.9), (1, 0.2)], "phone": [(1, 0.8)], "loyalty": []})
+    _store(client, person, {"mail": [(0, 0.8)], "telephone": [(1, 0.5), (0, 0.1)]})
+    metrics.reset()
+
+    mappings = compose_matches(customer, [client], MODEL_NAME, canonical.id)
+
+    email = [(m["target_field_name"], round(m["score"], 4), m["pivot_field_id"]) for m in mappings["email"]]
+    assert email == [("mail", 0.72, person["fields"][0]["id"]), ("telephone", 0.1, person["fields"][1]["id"])]
+    assert [(m["target_field_name"], round(m["score"], 4)) for m in mappings["phone"]] == [("telephone", 0.4)]
+    assert mappings["loyalty"] and all(m.get("match_type") != "pivot" for m in mappings["loyalty"])
+    prometheus = metrics.render_prometheus()
+    assert f'entity_matcher_pivot_compositions_total{{model="{MODEL_NAME}"}} 2' in prometheus
+    assert f'entity_matcher_pivot_fallbacks_total{{model="{MODEL_NAME}"}} 1' in prometheus
+    assert "entity_matcher_pivot_mappings_computed_total{" not in prometheus
+
+    assert compose_matches(customer, [client], MODEL_NAME, canonical.id, combine="min")["email"][0]["score"] == 0.8
+
+
+def test_pivot_mappings_are_computed_once(schemas, stub_model, monkeypatch):
+    canonical, person, customer, client = schemas
+
+    first = pivot_mappings([customer, client], [person], MODEL_NAME)
+    monkeypatch.setattr(pivot, "match_fields", lambda *args, **kwargs: pytest.fail("matched against the pivot again"))
+    second = pivot_mappings([customer, client], [person], MODEL_NAME)
+
+    assert first == second
+    assert {m["target_entity_id"] for m in first[customer["id"]]["email"]} == {person["id"]}
+
+
+def test_compose_matches_validates_input(schemas, stub_model):
+    canonical, person, customer, client = schemas
+
+    with pytest.raises(ValueError):
+        compose_matches(person, [client], MODEL_NAME, canonical.id)
+    with pytest.raises(ValueError):
+        compose_matches(customer, [client], MODEL_NAME, canonical.id, combine="sum")
+
+
+def test_pivot_changes_invalidate_composed_results(schemas, stub_model):
+    canonical, person, customer, client = schemas
+    _store(customer, person, {"email": [(0, 0.9)], "phone": [(1, 0.8)], "loyalty": []})
+    _store(client, person, {"mail": [(0, 0.8)], "telephone": [(1, 0.5)]})
+    options = {"hybrid": False, "short_circuit": False, "type_filter": True, "pivot_schema_id": canonical.id,
+               "combine": "product"}
+    cache_key = match_cache_key([client["id"]], **options)
+    store_matching_data_in_db(customer, MODEL_NAME, compose_matches(customer, [client], MODEL_NAME, canonical.id),
+                              cache_key, target_entity_ids=[client["id"]] + pivot_entity_ids(canonical.id),
+                              match_options=options)
+
+    insert_or_update_entity(canonical.id, "Person", "Person", [
+        {"name": "email_address", "description": "Email address"},
+        {"name": "phone_number", "description": "Mobile phone number"},
+    ])
+    refresh_dirty_matches()
+
+    assert pivot_entity_ids(canonical.id) == [person["id"]]
+    # Composed results cannot be refreshed incrementally, so the stale one is dropped and recomputed on request.
+    assert [field_match.cache_key for field_match in FieldMatch.query] == ["stored", "stored"]
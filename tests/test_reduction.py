@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from app import match, metrics
+from app.database import EmbeddingProjection, insert_or_update_entity, insert_or_update_schema
+from app.reduction import Projection, fit_pca, fit_projection, get_projection, recall_at_k, reduction_key
+from app.sharded_search import search_fields
+from conftest import MODEL_NAME
+
+
+@pytest.fixture
+def stub_model(stub_model, monkeypatch):
+    """The conftest model, reduced to 8 dimensions with PCA."""
+    monkeypatch.setitem(stub_model, "reduction", {"method": "pca", "dimensions": 8})
+    return stub_model
+
+
+def _low_rank_vectors(count=500, rank=6, dimension=64, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, rank)) @ rng.normal(size=(rank, dimension))
+    vectors += 0.01 * rng.normal(size=vectors.shape)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32")
+
+
+def test_pca_keeps_neighbours_of_low_rank_data():
+    vectors = _low_rank_vectors()
+    mean, components, explained = fit_pca(vectors, 8)
+    projection = Projection("pca", 8, mean, components)
+
+    reduced = projection.apply(vectors)
+    assert reduced.shape == (500, 8)
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5)
+    assert explained > 0.99
+    assert recall_at_k(vectors, projection) > 0.9
+    assert recall_at_k(vectors, Projection("truncate", 2)) < 0.5
+
+
+def test_truncation_keeps_prefix():
+    vectors = np.array([[3.0, 4.0, 12.0]], dtype="float32")
+
+    assert Projection("truncate", 2).apply(vectors).tolist() == [[pytest.approx(0.6), pytest.approx(0.8)]]
+
+
+def _schemas():
+    source = insert_or_update_schema("Source")
+    target = insert_or_update_schema("Target")
+    customer = insert_or_update_entity(source.id, "Customer", "Customer", [
+        {"name": "email", "description": "Email address of the customer"},
+        {"name": "phone", "description": "Phone number of the customer"},
+    ])
+    insert_or_update_entity(target.id, "Contact", "Contact", [
+        {"name": f"field_{i}", "description": f"Unrelated attribute number {i}"} for i in range(20)
+    ] + [
+        {"name": "email_address", "description": "Email address of the contact"},
+        {"name": "phone_number", "description": "Phone number of the contact"},
+    ])
+    return source, target, customer
+
+
+def _embed_all(model_config, *schemas):
+    entity_ids = [entity.id for schema in schemas for entity in schema.entities]
+    match.embed_fields(model_config, match.stale_fields(model_config, entity_ids))
+
+
+def test_projections_are_versioned_and_used_for_matching(app, stub_model):
+    source, target, customer = _schemas()
+    _embed_all(stub_model, source, target)
+    metrics.reset()
+    source_entity = {"id": customer.id, "fields": [{"id": field.id, "name": field.name,
+                                                    "description": field.description} for field in customer.fields]}
+    target_entities = [{"id": entity.id, "fields": [{"id": field.id, "name": field.name,
+                                                     "description": field.description} for field in entity.fields]}
+                       for entity in target.entities]
+
+    # Not fitted yet: full-dimension search.
+    assert get_projection(stub_model) is None
+    assert f'entity_matcher_projection_missing_total{{model="{MODEL_NAME}"}}' in metrics.render_prometheus()
+    assert match.match_fields(source_entity, target_entities, MODEL_NAME, k=1)["email"][0]["target_field_name"] == (
+        "email_address")
+
+    first = fit_projection(MODEL_NAME, 8)
+    second = fit_projection(MODEL_NAME, 8, schema_ids=[target.id])
+    rejected = fit_projection(MODEL_NAME, 8, min_recall=1.1)
+
+    assert (first["version"], second["version"], rejected["version"]) == (1, 2, None)
+    assert EmbeddingProjection.query.count() == 2
+    assert 0 <= second["recall"] <= 1
+    assert get_projection(stub_model).version == 2
+    assert reduction_key(MODEL_NAME) == "pca8v2"
+
+    mappings = match.match_fields(source_entity, target_entities, MODEL_NAME, k=1)
+    assert mappings["email"][0]["target_field_name"] == "email_address"
+    assert mappings["phone"][0]["target_field_name"] == "phone_number"
+    [matches] = search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=1)
+    assert matches[0]["target_field_name"] == "email_address"
+
+
+def test_fit_projection_validates_dimensions(app, stub_model):
+    source, target, _ = _schemas()
+    _embed_all(stub_model, source, target)
+
+    with pytest.raises(ValueError):
+        fit_projection(MODEL_NAME, 64)
+    with pytest.raises(ValueError):
+        fit_projection(MODEL_NAME, 30)
+    assert fit_projection(MODEL_NAME, 16, method="truncate")["version"] is None
@@ -0,0 +1,173 @@
+import pytest
+
+from app import match, metrics, refresh
+from app.database import (
+    Embedding,
+    FieldMatch,
+    db,
+    delete_entity,
+    get_entity_by_id,
+    get_matching_data_from_db,
+    insert_or_update_entity,
+    insert_or_update_schema,
+    match_cache_key,
+    store_matching_data_in_db,
+)
+from app.refresh import refresh_dirty_matches, refreshable
+from conftest import MODEL_NAME
+
+OPTIONS = {"hybrid": False, "short_circuit": False, "type_filter": True}
+
+CUSTOMER_FIELDS = [
+    {"name": "email", "description": "Email address of the customer"},
+    {"name": "phone", "description": "Phone number of the customer"},
+    {"name": "city", "description": "City the customer lives in"},
+]
+CONTACT_FIELDS = [
+    {"name": "email_address", "description": "Email address of the contact"},
+    {"name": "phone_number", "description": "Phone number of the contact"},
+    {"name": "mobile", "description": "Mobile phone number of the contact"},
+    {"name": "town", "description": "Town of the contact"},
+]
+ORDER_FIELDS = [
+    {"name": "order_id", "description": "Identifier of the order"},
+    {"name": "total", "description": "Total amount of the order"},
+]
+
+
+@pytest.fixture
+def schemas(app):
+    source = insert_or_update_schema("Source")
+    target = insert_or_update_schema("Target")
+    customer = insert_or_update_entity(source.id, "Customer", "Customer", CUSTOMER_FIELDS)
+    contact = insert_or_update_entity(target.id, "Contact", "Contact", CONTACT_FIELDS)
+    order = insert_or_update_entity(target.id, "Order", "Order", ORDER_FIELDS)
+    return source.id, target.id, get_entity_by_id(customer.id), get_entity_by_id(contact.id), get_entity_by_id(order.id)
+
+
+def _store(source_entity, target_entities, options=OPTIONS, k=3):
+    """Match and cache like `/api/match-entities/` does; returns the cache key."""
+    target_ids = [entity["id"] for entity in target_entities]
+    cache_key = match_cache_key(target_ids, **options)
+    field_mappings = match.match_fields(source_entity, target_entities, MODEL_NAME, k=k)
+    store_matching_data_in_db(source_entity, MODEL_NAME, field_mappings, cache_key, target_entity_ids=target_ids,
+                              match_options=options)
+    return cache_key
+
+
+def _ranking(field_mappings):
+    return {name: [(m["target_field_id"], round(m["score"], 5)) for m in matches]
+            for name, matches in field_mappings.items()}
+
+
+def test_updates_keep_unchanged_fields_and_their_embeddings(schemas, stub_model):
+    source_id, target_id, customer, contact, order = schemas
+    match.load_entity_embeddings(stub_model, contact)
+    embeddings = Embedding.query.count()
+
+    fields = [dict(field) for field in CONTACT_FIELDS]
+    fields[3]["description"] = "Town or city of the contact"
+    insert_or_update_entity(target_id, "Contact", "Contact", fields[1:] + [{"name": "fax", "description": "Fax"}])
+
+    updated = {field["name"]: field["id"] for field in get_entity_by_id(contact["id"])["fields"]}
+    original = {field["name"]: field["id"] for field in contact["fields"]}
+    assert updated["phone_number"] == original["phone_number"]
+    assert updated["town"] == original["town"]
+    assert "email_address" not in updated and "fax" in updated
+    assert Embedding.query.count() == embeddings - 1  # the removed field's embedding is gone, the others are kept
+
+
+def test_changes_mark_only_dependent_matches_dirty(schemas, stub_model):
+    source_id, target_id, customer, contact, order = schemas
+    contact_key = _store(customer, [contact])
+    order_key = _store(customer, [order])
+
+    fields = [dict(field) for field in CONTACT_FIELDS]
+    fields[0]["description"] = "Primary email of the contact"
+    insert_or_update_entity(target_id, "Contact", "Contact", fields)
+
+    assert get_matching_data_from_db(customer, MODEL_NAME, contact_key) is None
+    assert get_matching_data_from_db(customer, MODEL_NAME, order_key) is not None
+    dirty = FieldMatch.query.filter_by(cache_key=contact_key).one()
+    assert dirty.pending_changes == {"leave": [contact["fields"][0]["id"]], "enter": [contact["fields"][0]["id"]],
+                                     "marks": 1}
+
+    # Re-submitting identical fields changes nothing.
+    insert_or_update_entity(target_id, "Order", "Order", ORDER_FIELDS)
+    assert get_matching_data_from_db(customer, MODEL_NAME, order_key) is not None
+
+
+def test_incremental_refresh_equals_a_full_recompute(schemas, stub_model):
+    source_id, target_id, customer, contact, order = schemas
+    cache_key = _store(customer, [contact, order], k=2)
+    stored = get_matching_data_from_db(customer, MODEL_NAME, cache_key)
+
+    contact_fields = [dict(field) for field in CONTACT_FIELDS]
+    contact_fields[1]["description"] = "Work phone or email alias of the contact"  # changed
+    contact_fields = contact_fields[1:] + [{"name": "post_code", "description": "City post code of the contact"}]
+    insert_or_update_entity(target_id, "Contact", "Contact", contact_fields)
+    insert_or_update_entity(source_id, "Customer", "Customer",
+                            CUSTOMER_FIELDS + [{"name": "zip", "description": "Zip code of the customer"}])
+    metrics.reset()
+
+    assert refresh_dirty_matches(k=2) == {"refreshed": 1, "deleted": 0, "deferred": 0}
+
+    refreshed = get_matching_data_from_db(customer, MODEL_NAME, cache_key)
+    targets = [get_entity_by_id(contact["id"]), get_entity_by_id(order["id"])]
+    expected = match.match_fields(get_entity_by_id(customer["id"]), targets, MODEL_NAME, k=2)
+    assert _ranking(refreshed) == _ranking(expected)
+    # Only the new "zip" and the lists that held the removed or changed fields were searched again.
+    leaving = {contact["fields"][0]["id"], contact["fields"][1]["id"]}
+    researched = 1 + sum(any(m["target_field_id"] in leaving for m in matches) for matches in stored.values())
+    assert researched < len(CUSTOMER_FIELDS) + 1
+    prometheus = metrics.render_prometheus()
+    assert f'entity_matcher_match_refreshes_total{{model="{MODEL_NAME}"}} 1' in prometheus
+    assert f'entity_matcher_match_refresh_researched_fields_total{{model="{MODEL_NAME}"}} {researched}' in prometheus
+
+
+def test_results_with_other_options_are_dropped(schemas, stub_model):
+    source_id, target_id, customer, contact, order = schemas
+    options = {**OPTIONS, "top_entities": 1}
+    assert not refreshable(options) and refreshable(OPTIONS) and not refreshable(None)
+    cache_key = _store(customer, [contact, order], options)
+
+    insert_or_update_entity(target_id, "Order", "Order", ORDER_FIELDS[:1])
+
+    assert refresh_dirty_matches() == {"refreshed": 0, "deleted": 1, "deferred": 0}
+    assert FieldMatch.query.filter_by(cache_key=cache_key).first() is None
+
+
+def test_deleting_a_target_deletes_dependent_matches(schemas, stub_model):
+    source_id, target_id, customer, contact, order = schemas
+    _store(customer, [contact, order])
+    order_key = _store(customer, [order])
+    contact_key = _store(customer, [contact])
+
+    delete_entity(order["id"])
+    db.session.expire_all()
+
+    assert [field_match.cache_key for field_match in FieldMatch.query] == [contact_key]
+    assert order_key != contact_key
+
+
+def test_changes_made_during_a_refresh_are_not_lost(schemas, stub_model, monkeypatch):
+    source_id, target_id, customer, contact, order = schemas
+    cache_key = _store(customer, [contact], k=2)
+    contact_fields = [dict(field) for field in CONTACT_FIELDS]
+    contact_fields[0]["description"] = "Primary email of the contact"
+    insert_or_update_entity(target_id, "Contact", "Contact", contact_fields)
+
+    def match_fields_during_an_edit(*args, **kwargs):
+        # Another request changes the contact again while the refresh is searching.
+        monkeypatch.setattr(refresh, "match_fields", match.match_fields)
+        insert_or_update_entity(target_id, "Contact", "Contact", contact_fields[:3] + [
+            {"name": "town", "description": "Email inbox town of the contact"}])
+        return match.match_fields(*args, **kwargs)
+
+    monkeypatch.setattr(refresh, "match_fields", match_fields_during_an_edit)
+    metrics.reset()
+
+    assert refresh_dirty_matches(k=2) == {"refreshed": 1, "deleted": 0, "deferred": 0}
+    expected = match.match_fields(get_entity_by_id(customer["id"]), [get_entity_by_id(contact["id"])], MODEL_NAME, k=2)
+    assert _ranking(get_matching_data_from_db(customer, MODEL_NAME, cache_key)) == _ranking(expected)
+    assert f'entity_matcher_match_refresh_conflicts_total{{model="{MODEL_NAME}"}} 1' in metrics.render_prometheus()
@@ -0,0 +1,73 @@
+from flask import Flask
+
+from app.database import (
+    add_field,
+    delete_entity,
+    get_entity_schema_version,
+    get_schema_version,
+    get_schema_versions,
+    insert_or_update_entity,
+    insert_or_update_schema,
+)
+from app.response_cache import ResponseCache, conditional_response
+
+FIELDS = [{"name": "email", "description": "Email"}]
+
+
+def test_writes_bump_the_schema_version(app):
+    schema = insert_or_update_schema("Schema", "A schema")
+    other = insert_or_update_schema("Other")
+    assert get_schema_version(schema.id) == 1
+
+    entity = insert_or_update_entity(schema.id, "Customer", None, FIELDS)
+    assert get_schema_version(schema.id) == 2
+    insert_or_update_entity(schema.id, "Customer", None, FIELDS)  # unchanged
+    insert_or_update_schema("Schema", "A schema")
+    assert get_schema_version(schema.id) == 2
+
+    insert_or_update_entity(schema.id, "Customer", None, [{"name": "email", "description": "Email address"}])
+    add_field(schema.id, "Customer", None, [{"name": "phone", "description": "Phone"}])
+    insert_or_update_schema("Schema", "Renamed description")
+    assert get_entity_schema_version(entity.id) == (schema.id, 5)
+
+    delete_entity(entity.id)
+    assert get_schema_versions() == [(schema.id, 6), (other.id, 1)]
+    assert get_entity_schema_version(entity.id) is None
+
+
+def test_conditional_response_serves_304_and_cached_bodies():
+    flask_app = Flask(__name__)
+    cache = ResponseCache(max_entries=2)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"id": 1}
+
+    with flask_app.test_request_context():
+        first = conditional_response("schema-1-v1", build, cache)
+        second = conditional_response("schema-1-v1", build, cache)
+    with flask_app.test_request_context(headers={"If-None-Match": first.headers["ETag"]}):
+        not_modified = conditional_response("schema-1-v1", build, cache)
+        changed = conditional_response("schema-1-v2", build, cache)
+    with flask_app.test_request_context():
+        missing = conditional_response("schema-2-v1", lambda: None, cache)
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json() == {"id": 1}
+    assert first.headers["ETag"] == '"schema-1-v1"'
+    assert not_modified.status_code == 304 and not_modified.data == b""
+    assert changed.status_code == 200 and changed.headers["ETag"] == '"schema-1-v2"'
+    assert missing is None
+    assert len(builds) == 2
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.get("a")
+    cache.put("c", b"3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1", b"3")
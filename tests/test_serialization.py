@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+import pytest
+
+from app import serialization
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+    return serialization.dumps
+
+
+def test_dumps_converts_numpy_values(encoder):
+    payload = {
+        "field_mappings": {
+            "email": [{"target_field_id": np.int64(3), "score": np.float32(0.5)}],
+        },
+        "vector": np.array([1.0, 2.0], dtype="float32"),
+    }
+
+    assert json.loads(encoder(payload)) == {
+        "field_mappings": {"email": [{"target_field_id": 3, "score": 0.5}]},
+        "vector": [1.0, 2.0],
+    }
+
+
+def test_dumps_rejects_unknown_types(encoder):
+    with pytest.raises(TypeError):
+        encoder({"value": object()})
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from app import match
+from app.database import fetch_entity_embeddings, get_entity_by_id, insert_or_update_entity, insert_or_update_schema
+from app.field_text import build_field_text
+from app.sharded_search import get_registry, search_fields
+from conftest import MODEL_NAME
+
+
+def _catalog():
+    crm = insert_or_update_schema("CRM")
+    billing = insert_or_update_schema("Billing")
+    warehouse = insert_or_update_schema("Warehouse")
+    customer = insert_or_update_entity(crm.id, "Customer", "Customer", [
+        {"name": "customer_email", "description": "Email address of the customer"},
+        {"name": "customer_name", "description": "Name of the customer"},
+    ])
+    insert_or_update_entity(billing.id, "Account", "Billing account", [
+        {"name": "email_address", "description": "Email address of the customer"},
+        {"name": "balance", "description": "Outstanding balance"},
+    ])
+    insert_or_update_entity(warehouse.id, "Site", "Warehouse site", [
+        {"name": "contact_email", "description": "Email address of the site contact"},
+        {"name": "city", "description": "City where the site is located"},
+    ])
+    return crm, billing, warehouse, customer
+
+
+def test_search_merges_shards_like_one_flat_index(app, stub_model):
+    crm, billing, warehouse, customer = _catalog()
+    query_field = customer.fields[0]
+
+    [matches] = search_fields(MODEL_NAME, field_ids=[query_field.id], k=3)
+
+    assert len(get_registry().shards) == 3
+    assert matches[0]["target_schema_id"] == billing.id
+    assert matches[0]["target_field_name"] == "email_address"
+    assert query_field.id not in [match_["target_field_id"] for match_ in matches]
+
+    # Same answer as brute force over every embedding in the catalog.
+    entity_ids = [entity.id for schema in (crm, billing, warehouse) for entity in schema.entities]
+    everything = [item for item in fetch_entity_embeddings(entity_ids, MODEL_NAME)
+                  if item["field"]["id"] != query_field.id]
+    model_config = match.get_model_config(MODEL_NAME)
+    query = match.embed_text(model_config, build_field_text(
+        model_config, {"name": query_field.name, "description": query_field.description}))
+    scores = sorted((1 - float(np.sum((item["embedding"] - query) ** 2)) for item in everything), reverse=True)
+    assert [match_["score"] for match_ in matches] == pytest.approx(scores[:3], abs=1e-5)
+
+
+def test_search_respects_schema_allow_list(app, stub_model):
+    _, billing, warehouse, _ = _catalog()
+
+    [matches] = search_fields(MODEL_NAME, fields=[{"name": "email", "description": "Email address"}],
+                              k=10, schema_ids=[warehouse.id])
+
+    assert {match_["target_schema_id"] for match_ in matches} == {warehouse.id}
+    assert len(matches) == 2
+
+
+def test_shards_are_rebuilt_when_a_schema_changes(app, stub_model):
+    _, billing, _, customer = _catalog()
+    search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=3)
+    registry = get_registry()
+    registry.refresh_seconds = 0
+    billing_shard = registry.shards[(billing.id, MODEL_NAME)]
+
+    insert_or_update_entity(billing.id, "Account", "Billing account", [
+        {"name": "customer_email", "description": "Email address of the customer"},
+    ])
+    [matches] = search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=1)
+
+    assert registry.shards[(billing.id, MODEL_NAME)] is not billing_shard
+    assert matches[0]["target_field_name"] == "customer_email"
+    assert matches[0]["target_schema_id"] == billing.id
+
+
+def test_search_unknown_model(app):
+    with pytest.raises(ValueError):
+        search_fields("no-such-model", field_ids=[1])
+
+
+def test_shards_follow_fields_edited_in_place(app, stub_model):
+    _, billing, _, customer = _catalog()
+    registry = get_registry()
+    registry.refresh_seconds = 0
+    search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=3)
+    balance_id = registry.shards[(billing.id, MODEL_NAME)].fields[1][1]["id"]
+
+    insert_or_update_entity(billing.id, "Account", "Billing account", [
+        {"name": "email_address", "description": "Email address of the customer"},
+        {"name": "balance", "description": "Email of the customer account"},
+    ])
+    match.load_entity_embeddings(match.get_model_config(MODEL_NAME), get_entity_by_id(billing.entities[0].id))
+    [matches] = search_fields(MODEL_NAME, fields=[{"name": "balance", "description": "Email of the customer account"}],
+                              k=1, schema_ids=[billing.id])
+
+    assert (matches[0]["target_field_id"], matches[0]["target_field_description"]) == (
+        balance_id, "Email of the customer account")
+    assert matches[0]["score"] == pytest.approx(1.0)
+
+
+def test_query_fields_are_embedded_from_their_current_text(app, stub_model):
+    _, billing, _, customer = _catalog()
+    search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=1)
+
+    # The query field is edited in place: its stored embedding no longer matches its text.
+    insert_or_update_entity(customer.schema_id, "Customer", "Customer", [
+        {"name": "customer_email", "description": "Outstanding balance"},
+        {"name": "customer_name", "description": "Name of the customer"},
+    ])
+    [matches] = search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=1, schema_ids=[billing.id])
+
+    assert matches[0]["target_field_name"] == "balance"
+
+
+def test_shards_are_built_outside_the_registry_lock(app, stub_model, monkeypatch):
+    _, _, _, customer = _catalog()
+    registry = get_registry()
+    build = registry._build
+    held = []
+    monkeypatch.setattr(registry, "_build", lambda *args: held.append(registry._lock.locked()) or build(*args))
+
+    search_fields(MODEL_NAME, field_ids=[customer.fields[0].id], k=1)
+
+    assert held == [False, False, False]
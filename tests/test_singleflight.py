@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import match, metrics
+from app.database import Embedding, WorkLock, acquire_work_lock, db, insert_or_update_entity, insert_or_update_schema
+from app.singleflight import SingleFlight, work_lock
+from conftest import MODEL_NAME
+
+
+def _run_concurrently(fn, count):
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return [future.result() for future in [executor.submit(fn) for _ in range(count)]]
+
+
+def _wait_for_waiters(flight, count):
+    """Block the leader until `count` other callers joined its call (or give up after a second)."""
+    shared = f'entity_matcher_singleflight_shared_total{{flight="{flight.name}"}} {count}'
+    for _ in range(200):
+        if shared in metrics.render_prometheus():
+            return
+        threading.Event().wait(0.005)
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight("test")
+    calls = []
+    metrics.reset()
+
+    def compute():
+        calls.append(1)
+        _wait_for_waiters(flight, 3)
+        return {"value": 42}
+
+    results = _run_concurrently(lambda: flight.do("key", compute), 4)
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert 'entity_matcher_singleflight_shared_total{flight="test"} 3' in metrics.render_prometheus()
+    assert flight._calls == {}
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight("test")
+    metrics.reset()
+
+    def compute():
+        _wait_for_waiters(flight, 2)
+        raise ValueError("boom")
+
+    def call():
+        with pytest.raises(ValueError, match="boom"):
+            flight.do("key", compute)
+        return True
+
+    assert _run_concurrently(call, 3) == [True] * 3
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_do_many_leads_only_keys_not_in_flight():
+    flight = SingleFlight("test")
+    led = []
+
+    def outer(keys):
+        led.append(keys)
+        return {key: key * 10 for key in keys}
+
+    # "b" is in flight for another caller, who finishes it after this one asked.
+    inner_started = threading.Event()
+    inner_done = threading.Event()
+
+    def compute_b(keys):
+        inner_started.set()
+        inner_done.wait()
+        return {"b": "shared"}
+
+    def inner():
+        return flight.do_many(["b"], compute_b)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(inner)
+        inner_started.wait()
+        threading.Timer(0.05, inner_done.set).start()
+        assert flight.do_many(["a", "b", "a"], outer) == {"a": "a" * 10, "b": "shared"}
+        assert pending.result() == {"b": "shared"}
+    assert led == [["a"]]
+
+
+def test_identical_texts_are_embedded_once(app, stub_model, monkeypatch):
+    schema = insert_or_update_schema("Schema")
+    fields = []
+    for name in ("Customer", "Supplier"):
+        entity = insert_or_update_entity(schema.id, name, name, [{"name": "email", "description": "Email address"}])
+        fields += [{"id": field.id, "entity_id": entity.id, "name": field.name, "description": field.description}
+                   for field in entity.fields]
+    embedded = []
+    embed_texts = match.embed_texts
+    monkeypatch.setattr(match, "embed_texts", lambda config, texts: embedded.append(texts) or embed_texts(config, texts))
+
+    embeddings = match.embed_fields(stub_model, fields)
+
+    assert len(embedded) == 1 and len(embedded[0]) == 1
+    assert len(embeddings) == 2 and (embeddings[0] == embeddings[1]).all()
+    assert Embedding.query.filter_by(model_name=MODEL_NAME).count() == 2
+
+
+def test_work_lock_is_exclusive_until_it_expires(app):
+    assert acquire_work_lock("match:1", "worker-a", ttl=60)
+    assert not acquire_work_lock("match:1", "worker-b", ttl=60)
+
+    with work_lock("match:1", wait=0.05, poll=0.01) as acquired:
+        assert not acquired  # held by worker-a; the work runs anyway after waiting
+
+    db.session.get(WorkLock, "match:1").expires_at = 0
+    db.session.commit()
+    with work_lock("match:1") as acquired:
+        assert acquired
+        assert db.session.get(WorkLock, "match:1").owner != "worker-a"
+    assert db.session.get(WorkLock, "match:1") is None
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from app.database import db, insert_or_update_entity, insert_or_update_schema, store_embedding
+from app.storage import init_storage, search_vectors, storage_config
+
+
+def test_storage_config_sqlite_file_uses_pool():
+    config = storage_config('sqlite:////tmp/schemas.db')
+
+    assert config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] > 0
+    assert config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args']['timeout'] > 0
+    assert config['PGVECTOR'] is False
+
+
+def test_storage_config_reads_database_url(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+
+    config = storage_config()
+
+    assert config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://'
+    assert 'pool_size' not in config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+def test_init_storage_tunes_sqlite(tmp_path):
+    app = Flask(__name__)
+    init_storage(app, db, f"sqlite:///{tmp_path / 'schemas.db'}")
+
+    with app.app_context():
+        pragmas = {name: db.session.execute(text(f"PRAGMA {name}")).scalar()
+                   for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+        db.session.remove()
+
+    assert pragmas == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000}
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'),
+                    reason="Set TEST_POSTGRES_URL to a Postgres database with the pgvector extension available")
+def test_pgvector_search(monkeypatch):
+    monkeypatch.setenv('PGVECTOR', '1')
+    app = Flask(__name__)
+    init_storage(app, db, os.environ['TEST_POSTGRES_URL'])
+
+    with app.app_context():
+        try:
+            schema = insert_or_update_schema("pgvector-test")
+            entity = insert_or_update_entity(schema.id, "Client", None, [
+                {"name": "email", "description": "Email"},
+                {"name": "phone", "description": "Phone"},
+            ])
+            email, phone = entity.fields
+            store_embedding(email.id, "test", np.array([1.0, 0.0, 0.0]))
+            store_embedding(phone.id, "test", np.array([0.0, 1.0, 0.0]))
+
+            results = search_vectors(db.session, np.array([[0.9, 0.1, 0.0]]), [entity.id], "test", k=2)
+
+            assert [field_id for field_id, _, _ in results[0]] == [email.id, phone.id]
+            assert results[0][0][2] == pytest.approx(0.02, abs=1e-5)
+            filtered = search_vectors(db.session, np.array([[0.9, 0.1, 0.0]]), [entity.id], "test", k=2,
+                                      field_ids=[phone.id])
+            assert [field_id for field_id, _, _ in filtered[0]] == [phone.id]
+        finally:
+            db.session.rollback()
+            db.session.execute(text("DROP TABLE IF EXISTS embedding_vectors"))
+            db.session.commit()
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from app import match
+from app.assignment import assign_fields
+from app.database import get_entity_by_id, insert_or_update_entity, insert_or_update_schema
+from app.match import build_index, search_index
+from app.sharded_search import search_fields
+from app.type_compat import category_groups, category_indices, compatibility_mask, type_category
+from conftest import MODEL_NAME
+
+
+@pytest.mark.parametrize("raw_type, enum, category", [
+    ("VARCHAR(50)", None, "string"),
+    ("string", None, "string"),
+    ("INT", None, "integer"),
+    ("bigint", None, "integer"),
+    ("DECIMAL(10,2)", None, "number"),
+    ("TIMESTAMP", None, "datetime"),
+    ("date-time", None, "datetime"),
+    ("DATE", None, "date"),
+    ("BOOLEAN", None, "boolean"),
+    ("string", ["open", "closed"], "enum"),
+    ("GEOMETRY", None, "unknown"),
+    (None, None, "unknown"),
+])
+def test_type_category(raw_type, enum, category):
+    assert type_category(raw_type, enum) == category
+
+
+def test_compatibility_mask():
+    sources = [{"type": "date"}, {"type": "VARCHAR(20)"}, {}]
+    targets = [{"type": "boolean"}, {"type": "TIMESTAMP"}, {"type": "integer"}]
+
+    assert compatibility_mask(sources, targets).tolist() == [
+        [False, True, False],
+        [True, True, True],
+        [True, True, True],
+    ]
+
+
+def test_category_groups_share_one_unrestricted_search():
+    source_categories = category_indices([{"type": "string"}, {"type": "date"}, {}, {"type": "date-time"}])
+    target_categories = category_indices([{"type": "boolean"}, {"type": "date"}, {"type": "text"}])
+
+    groups = [(rows.tolist(), None if allowed is None else allowed.tolist())
+              for rows, allowed in category_groups(source_categories, target_categories)]
+    assert groups == [([0, 2], None), ([1], [1, 2]), ([3], [1, 2])]
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "HNSW16", "IVF4,Flat"])
+def test_search_index_never_returns_disallowed_vectors(index_spec):
+    vectors = np.random.default_rng(0).normal(size=(400, 16)).astype("float32")
+    faiss_index = build_index(vectors, index_spec)
+    allowed = np.arange(0, 400, 7)
+
+    _, indices = search_index(faiss_index, vectors[:5], 10, allowed)
+    found = indices[indices != -1]
+    assert len(found) and set(found.tolist()) <= set(allowed.tolist())
+    _, indices = search_index(faiss_index, vectors[:5], 10, np.array([], dtype="int64"))
+    assert (indices == -1).all()
+
+
+def _schemas():
+    source = insert_or_update_schema("Source")
+    target = insert_or_update_schema("Target")
+    order = insert_or_update_entity(source.id, "Order", "Order", [
+        {"name": "shipped", "description": "Date the order was shipped", "type": "date"},
+        {"name": "note", "description": "Free text note", "type": "VARCHAR(200)"},
+    ])
+    shipment = insert_or_update_entity(target.id, "Shipment", "Shipment", [
+        {"name": "shipped", "description": "Whether the order was shipped", "type": "BOOLEAN"},
+        {"name": "dispatched_at", "description": "Time the parcel left the warehouse", "type": "TIMESTAMP",
+         "nullable": True},
+        {"name": "status", "description": "Shipment status", "type": "string", "enum": ["open", "closed"]},
+    ])
+    return get_entity_by_id(order.id), get_entity_by_id(shipment.id)
+
+
+def test_field_type_metadata_is_persisted(app):
+    _, shipment = _schemas()
+
+    dispatched_at = next(field for field in shipment["fields"] if field["name"] == "dispatched_at")
+    status = next(field for field in shipment["fields"] if field["name"] == "status")
+    assert (dispatched_at["type"], dispatched_at["nullable"]) == ("TIMESTAMP", True)
+    assert status["enum"] == ["open", "closed"]
+
+
+@pytest.mark.parametrize("hybrid, short_circuit", [(False, False), (True, True)])
+def test_incompatible_targets_are_never_matched(app, stub_model, hybrid, short_circuit):
+    order, shipment = _schemas()
+
+    mappings = match.match_fields(order, [shipment], MODEL_NAME, k=3, hybrid=hybrid, short_circuit=short_circuit)
+    assert [m["target_field_name"] for m in mappings["shipped"]] == ["dispatched_at"]
+    assert len(mappings["note"]) == 3
+
+    unfiltered = match.match_fields(order, [shipment], MODEL_NAME, k=3, hybrid=hybrid, short_circuit=short_circuit,
+                                    type_filter=False)
+    assert unfiltered["shipped"][0]["target_field_name"] == "shipped"
+
+
+def test_assignment_skips_incompatible_pairs(app, stub_model):
+    order, shipment = _schemas()
+
+    mappings = assign_fields(order, [shipment], MODEL_NAME, k=3)
+    assert [m["target_field_name"] for m in mappings["shipped"]] == ["dispatched_at"]
+    assert mappings["shipped"][0]["assigned"]
+
+
+def test_search_fields_filters_by_type(app, stub_model):
+    order, shipment = _schemas()
+    shipped = next(field for field in order["fields"] if field["name"] == "shipped")
+
+    [matches] = search_fields(MODEL_NAME, field_ids=[shipped["id"]], k=5, schema_ids=[shipment["schema_id"]])
+    assert {m["target_field_name"] for m in matches} == {"dispatched_at"}
+    [matches] = search_fields(MODEL_NAME, fields=[{"name": "shipped", "description": "Shipped", "type": "bool"}], k=5,
+                              schema_ids=[shipment["schema_id"]])
+    assert "dispatched_at" not in {m["target_field_name"] for m in matches}